@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class SalesappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'SalesApp'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from . import metrics
+        metrics.install()
+        from . import columnar
+        if columnar.CONFIG['ENABLED'] and columnar.CONFIG['PRELOAD']:
+            columnar.preload()
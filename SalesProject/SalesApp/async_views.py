@@ -0,0 +1,83 @@
+"""
+Async versions of the dashboard endpoints, for deployments served through
+``SalesProject/asgi.py`` (e.g. ``uvicorn SalesProject.asgi:application``).
+
+The independent parts of a response (see ``dashboard.py``) are queried at
+the same time, so a request takes about as long as its slowest query
+instead of the sum of them. Django's async ORM methods (``aaggregate``,
+``async for``) all run on one shared thread, one query after another, so
+the fan-out runs each part on its own worker thread and therefore its own
+database connection; a single query uses the async ORM directly.
+
+DRF has no async views: these are plain Django views. They render with the
+same renderer and share the response cache (and its entries) with the DRF
+views of the same name, and like them need no authentication.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.views.decorators.http import require_GET
+
+from . import columnar, dashboard
+from .cache import cached_response
+from .renderers import JSONResponse
+
+
+def _own_connection(part):
+    def run():
+        try:
+            return part()
+        finally:
+            # Worker threads are reused: give the connection back (or keep
+            # it for reuse, as CONN_MAX_AGE says) like the end of a request
+            close_old_connections()
+    return run
+
+
+async def gather(parts):
+    """Run ``{key: callable}`` concurrently, each on its own thread and connection; ``{key: result}``."""
+    results = await asyncio.gather(*(
+        sync_to_async(_own_connection(part), thread_sensitive=False)()
+        for part in parts.values()
+    ))
+    return dict(zip(parts, results))
+
+
+@require_GET
+@cached_response
+async def get_dashboard_stats(request):
+    """Get aggregated statistics for dashboard"""
+    snapshot = await sync_to_async(columnar.get_snapshot)()
+    if snapshot is not None:
+        return JSONResponse(dashboard.snapshot_stats(snapshot))
+    return JSONResponse(dashboard.stats(await gather(dashboard.STATS_PARTS)))
+
+
+@require_GET
+@cached_response
+async def get_sales_trends(request):
+    """Get sales trends by month and week, bucketed from the daily rollup"""
+    return JSONResponse(await gather(dashboard.TRENDS_PARTS))
+
+
+@require_GET
+@cached_response
+async def get_quick_insights(request):
+    try:
+        yesterday = dashboard.yesterday()
+        snapshot = await sync_to_async(columnar.get_snapshot)()
+        if snapshot is not None:
+            totals = dashboard.snapshot_day_totals(snapshot, yesterday)
+        else:
+            totals = await dashboard.day_orders(yesterday).aaggregate(**dashboard.DAY_TOTALS)
+
+        return JSONResponse({
+            'status': 'success',
+            'data': dashboard.insights(yesterday, totals)
+        })
+    except Exception as e:
+        return JSONResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=500)
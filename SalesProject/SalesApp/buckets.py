@@ -0,0 +1,169 @@
+"""
+Maintenance of the denormalized bucket columns of new_sales_data.
+
+Every sales row carries the totals of its buckets:
+
+- ``day_sales``: sales of its order date
+- ``week_sales``: sales of its ISO week (Monday to Sunday)
+- ``month_sales``: sales of its calendar month
+- ``avg_for_week`` / ``avg_for_month``: ``week_sales / 7`` and
+  ``month_sales / 30``, the convention of the sales CSV export
+
+A write on one day changes the week and the month around it, so
+``refresh`` recomputes the rows of exactly those weeks and months. The
+totals come from the ``daily_sales_summary`` rollup (refreshed first by
+``rollups.sales_changed``), and each chunk of days is written with one
+set-based UPDATE joined to a VALUES list, so the cost depends on the
+touched buckets and not on the table size. Only rows whose values
+actually change are written (a write that leaves the day's sales as they
+were touches nothing), and on PostgreSQL they are locked in id order
+first, as every other bucket refresh does, rather than in whatever order
+the join happens to produce.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+
+from .models import DailySalesSummary, NewSalesData
+
+DAYS_PER_WEEK = 7
+DAYS_PER_MONTH = 30
+
+BUCKET_FIELDS = ['day_sales', 'week_sales', 'avg_for_week', 'month_sales', 'avg_for_month']
+
+# Days per UPDATE statement (six parameters each)
+UPDATE_CHUNK_SIZE = 500
+
+_EXPONENT = Decimal('0.0001')
+
+
+def week_bounds(day):
+    start = day - timedelta(days=day.weekday())
+    return start, start + timedelta(days=6)
+
+
+def month_bounds(day):
+    start = day.replace(day=1)
+    end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return start, end
+
+
+def affected_ranges(dates):
+    """Merged, sorted ``(first, last)`` day ranges of the weeks and months of ``dates``."""
+    ranges = []
+    for day in set(dates):
+        ranges.append(week_bounds(day))
+        ranges.append(month_bounds(day))
+    ranges.sort()
+
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _daily_sales(start, end):
+    return dict(
+        DailySalesSummary.objects
+        .filter(date__range=(start, end))
+        .values_list('date', 'total_sales')
+    )
+
+
+def bucket_values(daily, days):
+    """
+    ``{day: (day_sales, week_sales, avg_for_week, month_sales, avg_for_month)}``
+    for ``days``, from ``daily`` (``{date: total sales}``), which must cover
+    the full weeks and months of those days.
+    """
+    week_totals = {}
+    month_totals = {}
+    for day, total in daily.items():
+        week = week_bounds(day)[0]
+        month = (day.year, day.month)
+        week_totals[week] = week_totals.get(week, 0) + total
+        month_totals[month] = month_totals.get(month, 0) + total
+
+    values = {}
+    for day in days:
+        week_sales = Decimal(week_totals[week_bounds(day)[0]])
+        month_sales = Decimal(month_totals[(day.year, day.month)])
+        values[day] = (
+            Decimal(daily[day]).quantize(_EXPONENT),
+            week_sales.quantize(_EXPONENT),
+            (week_sales / DAYS_PER_WEEK).quantize(_EXPONENT),
+            month_sales.quantize(_EXPONENT),
+            (month_sales / DAYS_PER_MONTH).quantize(_EXPONENT),
+        )
+    return values
+
+
+def _update(values):
+    """Write ``{day: bucket values}`` to the sales rows of those days; the number of rows changed."""
+    days = sorted(values)
+    table = connection.ops.quote_name(NewSalesData._meta.db_table)
+    columns = [connection.ops.quote_name(field) for field in BUCKET_FIELDS]
+    updated = 0
+    for i in range(0, len(days), UPDATE_CHUNK_SIZE):
+        chunk = days[i:i + UPDATE_CHUNK_SIZE]
+        if connection.vendor in ('postgresql', 'sqlite'):
+            # VALUES columns are named column1, column2, ... on both
+            rows = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(chunk))
+            params = [param for day in chunk for param in (day, *values[day])]
+            distinct_from = 'IS DISTINCT FROM' if connection.vendor == 'postgresql' else 'IS NOT'
+            changed = ' OR '.join(
+                f"t.{column} {distinct_from} v.column{n}" for n, column in enumerate(columns, start=2)
+            )
+            if connection.vendor == 'postgresql':
+                assignments = ', '.join(f"{column} = c.column{n}" for n, column in enumerate(columns, start=2))
+                sql = (
+                    f"WITH v AS (VALUES {rows}), c AS ("
+                    f"SELECT t.id, v.* FROM {table} t JOIN v ON t.order_date = v.column1 "
+                    f"WHERE {changed} ORDER BY t.id FOR UPDATE OF t) "
+                    f"UPDATE {table} SET {assignments} FROM c WHERE {table}.id = c.id"
+                )
+            else:
+                assignments = ', '.join(f"{column} = v.column{n}" for n, column in enumerate(columns, start=2))
+                sql = (
+                    f"UPDATE {table} AS t SET {assignments} FROM (VALUES {rows}) AS v "
+                    f"WHERE t.order_date = v.column1 AND ({changed})"
+                )
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                updated += cursor.rowcount
+        else:
+            for day in chunk:
+                bucket = dict(zip(BUCKET_FIELDS, values[day]))
+                updated += NewSalesData.objects.filter(order_date=day).exclude(**bucket).update(**bucket)
+    return updated
+
+
+def refresh(dates):
+    """
+    Recompute the bucket columns of every row in the weeks and months of
+    ``dates``; the number of rows changed. Expects the daily rollup to be
+    up to date for those days.
+    """
+    updated = 0
+    with transaction.atomic():
+        for start, end in affected_ranges(dates):
+            # Every day in the range needs the totals of its whole week and
+            # whole month, which may reach past the range on either side
+            daily = _daily_sales(
+                min(week_bounds(start)[0], month_bounds(start)[0]),
+                max(week_bounds(end)[1], month_bounds(end)[1]),
+            )
+            updated += _update(bucket_values(daily, [day for day in daily if start <= day <= end]))
+    return updated
+
+
+def rebuild():
+    """Recompute the bucket columns of the whole table from the daily rollup."""
+    daily = dict(DailySalesSummary.objects.values_list('date', 'total_sales'))
+    with transaction.atomic():
+        _update(bucket_values(daily, list(daily)))
+    return len(daily)
@@ -0,0 +1,212 @@
+"""
+Response cache for the read-only analytics endpoints.
+
+Entries are keyed by endpoint, query parameters, the current date and a
+data-version counter. Any write to NewSalesData or Product bumps the
+counter, so entries computed before the write are simply never looked up
+again and expire on their own. The counter is a row in the database
+(DataVersion), bumped once the write commits, so a write from any worker
+or management command moves every process to the new version. Responses
+and hit/miss statistics live in the configured Django cache: per process
+with the local-memory backend, shared with Redis or Memcached.
+
+Requests that read from the read replica (SalesApp.routers) read the
+version there too, before the data. A replica that has not replayed a
+write yet returns the version from before it, so its response is never
+stored under the newer version.
+"""
+import hashlib
+import inspect
+import json
+import time
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import renderers
+from .models import DataVersion
+
+CACHE_ALIAS = getattr(settings, 'SALESAPP_CACHE_ALIAS', 'default')
+CACHE_TIMEOUT = getattr(settings, 'SALESAPP_CACHE_TIMEOUT', 60 * 60)
+
+KEY_PREFIX = 'salesapp'
+# Primary key of the DataVersion row
+VERSION_ROW = 1
+HITS_KEY = f'{KEY_PREFIX}:cache-hits'
+MISSES_KEY = f'{KEY_PREFIX}:cache-misses'
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _initial_version():
+    # Millisecond clock: if the row is ever lost (e.g. a flushed database),
+    # a re-created one cannot collide with a version handed out before.
+    return int(time.time() * 1000)
+
+
+def get_data_version():
+    version = DataVersion.objects.filter(pk=VERSION_ROW).values_list('version', flat=True).first()
+    if version is None:
+        # Only without the row that migration 0015 creates
+        version = bump_data_version()
+    return version
+
+
+def bump_data_version():
+    """Invalidate every cached response by moving to a new data version."""
+    with transaction.atomic():
+        rows = DataVersion.objects.filter(pk=VERSION_ROW)
+        if not rows.update(version=F('version') + 1):
+            DataVersion.objects.bulk_create(
+                [DataVersion(pk=VERSION_ROW, version=_initial_version())], ignore_conflicts=True,
+            )
+        return rows.values_list('version', flat=True).get()
+
+
+def data_changed():
+    """
+    Bump the data version once the current transaction (if any) commits.
+    Bumping inside it would hold the lock on the version row until then,
+    serializing every write.
+    """
+    transaction.on_commit(bump_data_version)
+
+
+def _count(key):
+    cache = _cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def get_stats():
+    cache = _cache()
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'backend': settings.CACHES[CACHE_ALIAS]['BACKEND'],
+        'data_version': get_data_version(),
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else 0.0,
+    }
+
+
+def _cache_key(name, request):
+    # DRF requests carry query_params, plain (async) Django requests GET
+    params = sorted(getattr(request, 'query_params', request.GET).lists())
+    digest = hashlib.md5(json.dumps(params).encode()).hexdigest()
+    today = timezone.now().date().isoformat()
+    return f'{KEY_PREFIX}:response:{name}:{get_data_version()}:{today}:{digest}'
+
+
+def _etag(data):
+    return quote_etag(hashlib.md5(renderers.dumps(data, sort_keys=True)).hexdigest())
+
+
+def _not_modified(request, etag):
+    return etag in parse_etags(request.headers.get('If-None-Match', ''))
+
+
+def _respond(request, data, etag):
+    if _not_modified(request, etag):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(data)
+    response['ETag'] = etag
+    return response
+
+
+def _respond_json(request, data, etag):
+    """``_respond`` for plain Django (async) views."""
+    if _not_modified(request, etag):
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = renderers.JSONResponse(data)
+    response['ETag'] = etag
+    return response
+
+
+def _lookup(name, request):
+    """``(key, (data, etag) or None)``, counting the hit or miss."""
+    cache = _cache()
+    key = _cache_key(name, request)
+    cached = cache.get(key)
+    _count(HITS_KEY if cached is not None else MISSES_KEY)
+    return key, cached
+
+
+def _store(key, data):
+    etag = _etag(data)
+    _cache().set(key, (data, etag), CACHE_TIMEOUT)
+    return etag
+
+
+def cached_response(view):
+    """
+    Cache successful GET responses of a function-based API view.
+
+    Apply below ``@api_view`` so the wrapped function receives the DRF
+    request. Clients get an ``ETag`` and may revalidate with
+    ``If-None-Match`` to receive ``304 Not Modified``.
+
+    Async views are plain Django views (DRF has no async support); they
+    return a ``renderers.JSONResponse``, which keeps ``data`` like a DRF
+    ``Response`` does.
+    """
+    if inspect.iscoroutinefunction(view):
+        return _cached_async_response(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return view(request, *args, **kwargs)
+
+        key, cached = _lookup(view.__name__, request)
+        if cached is not None:
+            data, etag = cached
+            return _respond(request, data, etag)
+
+        response = view(request, *args, **kwargs)
+        if response.status_code != status.HTTP_200_OK:
+            return response
+
+        etag = _store(key, response.data)
+        return _respond(request, response.data, etag)
+
+    return wrapper
+
+
+def _cached_async_response(view):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return await view(request, *args, **kwargs)
+
+        key, cached = await sync_to_async(_lookup)(view.__name__, request)
+        if cached is not None:
+            data, etag = cached
+            return _respond_json(request, data, etag)
+
+        response = await view(request, *args, **kwargs)
+        if response.status_code != status.HTTP_200_OK:
+            return response
+
+        etag = await sync_to_async(_store)(key, response.data)
+        return _respond_json(request, response.data, etag)
+
+    return wrapper
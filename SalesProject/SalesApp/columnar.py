@@ -0,0 +1,360 @@
+"""
+In-process columnar snapshot of new_sales_data for the analytics views.
+
+The snapshot keeps the columns the dashboard aggregates over as NumPy
+arrays sorted by ``(order_date, id)``: dictionary-encoded string columns
+(int32 codes into a list of distinct values), dates as int32 days since
+1970-01-01, quantity as int32 and money as int64 cents, so sums are exact
+and match the Decimal results of the ORM. A group-by becomes a
+``np.bincount`` and a date filter a ``np.searchsorted`` on the date index.
+
+It is optional (``SALESAPP_COLUMNAR['ENABLED']``) and kept fresh lazily:
+when the response cache's data version has moved on, rows with an id above
+the snapshot's maximum are fetched and appended; updates and deletes bump a
+separate mutation counter and make the next use rebuild the snapshot.
+Ids are handed out when rows are inserted, not when they commit, so the
+last ``RECHECK_IDS`` ids below the maximum are checked again on each append
+for rows that committed after a higher id had been loaded.
+Both counters live in the Django cache, so with a shared backend every
+server process sees writes made by the others.
+"""
+import copy
+import logging
+import sys
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Q
+
+from . import cache, dimensions
+from .models import NewSalesData
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    # Build in a background thread when the app starts
+    'PRELOAD': False,
+    # Ids below the snapshot's maximum looked up again on every append
+    'RECHECK_IDS': 10000,
+}
+
+CONFIG = {**DEFAULTS, **getattr(settings, 'SALESAPP_COLUMNAR', {})}
+
+MUTATIONS_KEY = f'{cache.KEY_PREFIX}:columnar-mutations'
+
+STRING_COLUMNS = ['customer_name', 'product_name', 'region', 'category', 'segment']
+
+# Column -> ORM path; the string columns come from the dimension tables
+FIELD_PATHS = {
+    'id': 'id',
+    'order_date': 'order_date',
+    'quantity': 'quantity',
+    'sales': 'sales',
+    'profit': 'profit',
+    **{column: dimensions.FLAT_FIELDS[column] for column in STRING_COLUMNS},
+}
+MONEY_COLUMNS = ['sales', 'profit']
+
+CHUNK_SIZE = 50000
+
+EPOCH = date(1970, 1, 1)
+
+
+def _day(value):
+    return (value - EPOCH).days
+
+
+def _cents_to_decimal(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def get_mutation_count():
+    return caches[cache.CACHE_ALIAS].get(MUTATIONS_KEY, 0)
+
+
+def _bump_mutations():
+    store = caches[cache.CACHE_ALIAS]
+    try:
+        store.incr(MUTATIONS_KEY)
+    except ValueError:
+        store.set(MUTATIONS_KEY, 1, timeout=None)
+
+
+def sales_mutated():
+    """Record that existing rows changed or disappeared (not just appended)."""
+    transaction.on_commit(_bump_mutations)
+
+
+class Dictionary:
+    """Distinct values of a string column; a value's code is its position."""
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+        self._ranks = None
+
+    def encode(self, values):
+        codes = self.codes
+        out = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(self.values)
+                self.values.append(value)
+                self._ranks = None
+            out[i] = code
+        return out
+
+    def ranks(self):
+        """Position of every code in alphabetical order of the values."""
+        if self._ranks is None:
+            order = sorted(range(len(self.values)), key=self.values.__getitem__)
+            ranks = np.empty(len(order), dtype=np.int64)
+            ranks[order] = np.arange(len(order))
+            self._ranks = ranks
+        return self._ranks
+
+    def nbytes(self):
+        return (
+            sys.getsizeof(self.values) + sys.getsizeof(self.codes)
+            + sum(sys.getsizeof(value) for value in self.values)
+        )
+
+
+class ColumnarSnapshot:
+    def __init__(self):
+        self.dictionaries = {column: Dictionary() for column in STRING_COLUMNS}
+        self.columns = {
+            'id': np.empty(0, dtype=np.int64),
+            'order_date': np.empty(0, dtype=np.int32),
+            'quantity': np.empty(0, dtype=np.int32),
+            **{column: np.empty(0, dtype=np.int64) for column in MONEY_COLUMNS},
+            **{column: np.empty(0, dtype=np.int32) for column in STRING_COLUMNS},
+        }
+        self.max_id = 0
+        self.data_version = None
+        self.mutations = None
+        self.built_at = None
+        self.build_seconds = 0.0
+        self.appended_rows = 0
+        self.appends = 0
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    # Loading
+
+    def load(self, queryset):
+        """Append the rows of ``queryset``; returns the number of rows added."""
+        fields = ['id', 'order_date', 'quantity'] + MONEY_COLUMNS + STRING_COLUMNS
+        chunks = {name: [] for name in fields}
+        added = 0
+        batch = []
+        paths = [FIELD_PATHS[name] for name in fields]
+        for row in queryset.values_list(*paths).iterator(chunk_size=CHUNK_SIZE):
+            batch.append(row)
+            if len(batch) >= CHUNK_SIZE:
+                added += self._encode(batch, fields, chunks)
+                batch = []
+        if batch:
+            added += self._encode(batch, fields, chunks)
+        if not added:
+            return 0
+
+        sorted_before = len(self) == 0 or chunks['order_date'][0][0] >= self.columns['order_date'][-1]
+        for name in fields:
+            self.columns[name] = np.concatenate([self.columns[name]] + chunks[name])
+        if not sorted_before:
+            order = np.lexsort((self.columns['id'], self.columns['order_date']))
+            for name in fields:
+                self.columns[name] = self.columns[name][order]
+        self.max_id = int(self.columns['id'].max())
+        return added
+
+    def _encode(self, rows, fields, chunks):
+        values = list(zip(*rows))
+        for name, column in zip(fields, values):
+            if name == 'order_date':
+                array = np.fromiter((_day(value) for value in column), dtype=np.int32, count=len(column))
+            elif name in MONEY_COLUMNS:
+                array = np.fromiter((int(value.scaleb(2)) for value in column), dtype=np.int64, count=len(column))
+            elif name in self.dictionaries:
+                array = self.dictionaries[name].encode(column)
+            else:
+                array = np.asarray(column, dtype=self.columns[name].dtype)
+            chunks[name].append(array)
+        return len(rows)
+
+    # Queries
+
+    def date_slice(self, start=None, end=None):
+        """Row positions with ``start <= order_date <= end`` (both optional)."""
+        dates = self.columns['order_date']
+        lo = 0 if start is None else int(np.searchsorted(dates, _day(start), side='left'))
+        hi = len(dates) if end is None else int(np.searchsorted(dates, _day(end), side='right'))
+        return slice(lo, hi)
+
+    def totals(self, start=None, end=None):
+        """``{'sales', 'profit', 'quantity', 'orders'}`` for a date range."""
+        rows = self.date_slice(start, end)
+        return {
+            'sales': _cents_to_decimal(self.columns['sales'][rows].sum()),
+            'profit': _cents_to_decimal(self.columns['profit'][rows].sum()),
+            'quantity': int(self.columns['quantity'][rows].sum()),
+            'orders': rows.stop - rows.start,
+        }
+
+    def sum_by(self, column, value='sales', limit=None, order='-total', start=None, end=None):
+        """
+        ``[(group, Decimal total), ...]`` of ``value`` summed per distinct
+        ``column`` value, ordered by ``-total`` (largest first) or ``name``.
+        """
+        rows = self.date_slice(start, end)
+        dictionary = self.dictionaries[column]
+        codes = self.columns[column][rows]
+        sums = np.bincount(codes, weights=self.columns[value][rows], minlength=len(dictionary.values))
+        present = np.flatnonzero(np.bincount(codes, minlength=len(dictionary.values)))
+
+        if order == 'name':
+            keys = dictionary.ranks()[present]
+        else:
+            keys = -sums[present]
+        if limit is not None and limit < len(present):
+            picked = np.argpartition(keys, limit - 1)[:limit]
+            picked = picked[np.argsort(keys[picked], kind='stable')]
+        else:
+            picked = np.argsort(keys, kind='stable')
+        return [
+            (dictionary.values[code], _cents_to_decimal(round(sums[code])))
+            for code in present[picked]
+        ]
+
+    def memory(self):
+        columns = {name: int(array.nbytes) for name, array in self.columns.items()}
+        dictionaries = {name: d.nbytes() for name, d in self.dictionaries.items()}
+        return {
+            'columns': columns,
+            'dictionaries': dictionaries,
+            'total': sum(columns.values()) + sum(dictionaries.values()),
+        }
+
+    def stats(self):
+        return {
+            'rows': len(self),
+            'max_id': self.max_id,
+            'data_version': self.data_version,
+            'built_at': self.built_at,
+            'build_seconds': round(self.build_seconds, 4),
+            'appends': self.appends,
+            'appended_rows': self.appended_rows,
+            'distinct': {name: len(d.values) for name, d in self.dictionaries.items()},
+            'memory_bytes': self.memory(),
+        }
+
+
+_snapshot = None
+_lock = threading.Lock()
+_rebuilds = 0
+
+
+def build():
+    """Build a new snapshot from the database and make it the current one."""
+    global _snapshot, _rebuilds
+    with _lock:
+        _snapshot = _build()
+        _rebuilds += 1
+        return _snapshot
+
+
+def _build():
+    # Read the counters first: a write during the build triggers a refresh
+    version = cache.get_data_version()
+    mutations = get_mutation_count()
+    started = time.perf_counter()
+    snapshot = ColumnarSnapshot()
+    snapshot.load(NewSalesData.objects.order_by('order_date', 'id'))
+    snapshot.build_seconds = time.perf_counter() - started
+    snapshot.built_at = time.time()
+    snapshot.data_version = version
+    snapshot.mutations = mutations
+    logger.info("Built columnar snapshot of %d rows in %.2fs", len(snapshot), snapshot.build_seconds)
+    return snapshot
+
+
+def _late_ids(snapshot):
+    """Ids up to ``snapshot.max_id`` that committed after the snapshot loaded past them."""
+    low = max(snapshot.max_id - CONFIG['RECHECK_IDS'], 0)
+    ids = np.fromiter(
+        NewSalesData.objects.filter(id__gt=low, id__lte=snapshot.max_id).values_list('id', flat=True).order_by(),
+        dtype=np.int64,
+    )
+    known = snapshot.columns['id']
+    known = known[known > low]
+    return ids[~np.isin(ids, known)].tolist()
+
+
+def _refresh(snapshot):
+    global _snapshot, _rebuilds
+    with _lock:
+        if _snapshot is not snapshot:
+            return _snapshot  # refreshed by another thread meanwhile
+        version = cache.get_data_version()
+        if snapshot.mutations != get_mutation_count():
+            _snapshot = _build()
+            _rebuilds += 1
+            return _snapshot
+        # Append into a copy so readers of the current snapshot never see
+        # columns of different lengths; the dictionaries only ever grow and
+        # are shared.
+        fresh = copy.copy(snapshot)
+        fresh.columns = dict(snapshot.columns)
+        late = _late_ids(snapshot)
+        added = fresh.load(
+            NewSalesData.objects.filter(Q(id__gt=snapshot.max_id) | Q(id__in=late)).order_by('order_date', 'id')
+        )
+        if added:
+            fresh.appends += 1
+            fresh.appended_rows += added
+        fresh.data_version = version
+        _snapshot = fresh
+        return fresh
+
+
+def get_snapshot():
+    """
+    The current snapshot, refreshed if the data changed since it was built,
+    or None when the columnar cache is disabled.
+    """
+    if not CONFIG['ENABLED']:
+        return None
+    snapshot = _snapshot or build()
+    if snapshot.data_version != cache.get_data_version() or snapshot.mutations != get_mutation_count():
+        snapshot = _refresh(snapshot)
+    return snapshot
+
+
+def preload():
+    """Build the snapshot in a background thread (used at app start-up)."""
+    def run():
+        try:
+            build()
+        except Exception:
+            logger.exception("Could not build the columnar snapshot")
+    threading.Thread(target=run, name='columnar-preload', daemon=True).start()
+
+
+def stats():
+    snapshot = _snapshot
+    return {
+        'enabled': CONFIG['ENABLED'],
+        'built': snapshot is not None,
+        'rebuilds': _rebuilds,
+        **(snapshot.stats() if snapshot is not None else {}),
+    }
@@ -0,0 +1,149 @@
+"""
+Queries behind the dashboard endpoints.
+
+Each response is assembled from parts that do not depend on one another.
+The views in ``views.py`` run the parts one after another; those in
+``async_views.py`` run them concurrently. Aggregates over the same rows
+(sales and profit, order counts) are computed together in one query.
+"""
+from datetime import timedelta
+
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils import timezone
+
+from . import dimensions, sketches
+from .models import DailySalesSummary, NewSalesData
+
+TOP_LIMIT = 5
+
+# Totals of the orders of one day, in one query
+DAY_TOTALS = {
+    'total_sales': Sum('sales'),
+    'total_orders': Count('id'),
+    'total_profit': Sum('profit'),
+}
+
+
+def run(parts):
+    """Call each part of ``{key: callable}`` in turn; ``{key: result}``."""
+    return {key: part() for key, part in parts.items()}
+
+
+# Dashboard stats
+
+def grand_totals():
+    # From the daily rollup rather than a full fact-table scan
+    return DailySalesSummary.objects.aggregate(
+        total_sales=Sum('total_sales'),
+        total_profit=Sum('total_profit'),
+    )
+
+
+def _ranked(dimension):
+    """
+    ``[(name, sales), ...]`` of the ``TOP_LIMIT`` customers or products of
+    all time, from the sales sketches when they can answer and from a
+    group-by over the fact table otherwise.
+    """
+    span = DailySalesSummary.objects.aggregate(start=Min('date'), end=Max('date'))
+    if span['start'] is not None:
+        answer = sketches.top(dimension, TOP_LIMIT, span['start'], span['end'])
+        if answer is not None:
+            return answer[0]
+    return dimensions.ranked_by_name(dimension, limit=TOP_LIMIT)
+
+
+def top_products():
+    return [{'product_name': name, 'total_sales': total} for name, total in _ranked('product')]
+
+
+def top_customers():
+    return [{'customer_name': name, 'total_purchases': total} for name, total in _ranked('customer')]
+
+
+STATS_PARTS = {
+    'totals': grand_totals,
+    'top_products': top_products,
+    'top_customers': top_customers,
+}
+
+
+def stats(parts):
+    """The dashboard-stats response from the results of ``STATS_PARTS``."""
+    return {
+        'total_sales': parts['totals']['total_sales'],
+        'total_profit': parts['totals']['total_profit'],
+        'top_products': parts['top_products'],
+        'top_customers': parts['top_customers'],
+    }
+
+
+def snapshot_stats(snapshot):
+    """The dashboard-stats response computed from a columnar snapshot."""
+    totals = snapshot.totals()
+    return {
+        'total_sales': totals['sales'],
+        'total_profit': totals['profit'],
+        'top_products': [
+            {'product_name': name, 'total_sales': total}
+            for name, total in snapshot.sum_by('product_name', limit=TOP_LIMIT)
+        ],
+        'top_customers': [
+            {'customer_name': name, 'total_purchases': total}
+            for name, total in snapshot.sum_by('customer_name', limit=TOP_LIMIT)
+        ],
+    }
+
+
+# Sales trends, bucketed from the daily rollup
+
+def monthly_trends():
+    return list(
+        DailySalesSummary.objects.annotate(month=TruncMonth('date'))
+        .values('month').annotate(total_sales=Sum('total_sales')).order_by('month')
+    )
+
+
+def weekly_trends():
+    return list(
+        DailySalesSummary.objects.annotate(week=TruncWeek('date'))
+        .values('week').annotate(total_sales=Sum('total_sales')).order_by('week')
+    )
+
+
+TRENDS_PARTS = {
+    'monthly_trends': monthly_trends,
+    'weekly_trends': weekly_trends,
+}
+
+
+# Quick insights
+
+def yesterday():
+    return timezone.now().date() - timedelta(days=1)
+
+
+def day_orders(day):
+    # order_date is a DateField: plain equality, served by its index
+    return NewSalesData.objects.filter(order_date=day)
+
+
+def snapshot_day_totals(snapshot, day):
+    totals = snapshot.totals(day, day)
+    return {'total_sales': totals['sales'], 'total_orders': totals['orders'], 'total_profit': totals['profit']}
+
+
+def insights(day, totals):
+    """The quick-insights data for ``day`` from its ``DAY_TOTALS``."""
+    total_sales = totals['total_sales'] or 0
+    total_orders = totals['total_orders']
+    total_profit = totals['total_profit'] or 0
+    avg_order_value = total_sales / total_orders if total_orders > 0 else 0
+    return {
+        'date': day.strftime('%Y-%m-%d'),
+        'total_sales': float(total_sales),
+        'total_orders': total_orders,
+        'avg_order_value': float(avg_order_value),
+        'total_profit': float(total_profit),
+    }
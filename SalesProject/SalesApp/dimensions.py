@@ -0,0 +1,218 @@
+"""
+Customer, location and product dimensions of the sales fact table.
+
+Sales rows arrive flat (the CSV export, API payloads and the synthetic
+generator all carry ``customer_id``, ``customer_name``, ..., ``product_name``
+on every row). ``resolve`` turns a batch of such rows into NewSalesData
+field values with integer foreign keys, creating the dimension rows that
+do not exist yet. Products of sales live in their own table (SalesProduct),
+linked to the user-facing Product catalogue when it lists the same id;
+recording a sale never adds to the catalogue. Loads never modify existing dimension rows: the first
+name seen for a customer or product id is the one that is kept. Editing a
+sale through the API cannot rename its customer or product either, as
+that would rename them on every other sale; ``conflicting_attributes``
+lists such edits so they are rejected.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Count, Q, Sum
+
+from .models import Customer, Location, NewSalesData, Product, SalesProduct
+
+CUSTOMER_FIELDS = ['customer_id', 'customer_name', 'segment']
+LOCATION_FIELDS = ['country', 'city', 'state', 'postal_code', 'region']
+PRODUCT_FIELDS = ['product_id', 'product_name', 'category', 'sub_category']
+
+# Flat field name -> ORM path from NewSalesData, in API field order
+FLAT_FIELDS = {
+    **{field: f'customer__{field}' for field in CUSTOMER_FIELDS},
+    **{field: f'location__{field}' for field in LOCATION_FIELDS},
+    **{field: f'product__{field}' for field in PRODUCT_FIELDS},
+}
+
+# Display name of each dimension the analytics endpoints group by
+NAME_FIELDS = {
+    'customer': (Customer, 'customer_name'),
+    'product': (SalesProduct, 'product_name'),
+}
+
+
+def _resolve_customers(rows):
+    keys = {}
+    for row in rows:
+        keys.setdefault(row['customer_id'], row)
+    found = dict(Customer.objects.filter(customer_id__in=keys).values_list('customer_id', 'pk'))
+    missing = [key for key in keys if key not in found]
+    if missing:
+        Customer.objects.bulk_create(
+            [Customer(**{field: keys[key][field] for field in CUSTOMER_FIELDS}) for key in missing],
+            ignore_conflicts=True,
+        )
+        found.update(Customer.objects.filter(customer_id__in=missing).values_list('customer_id', 'pk'))
+    return found
+
+
+def _location_key(row):
+    return tuple(row[field] for field in LOCATION_FIELDS)
+
+
+def _find_locations(keys):
+    query = Q()
+    for key in keys:
+        query |= Q(**dict(zip(LOCATION_FIELDS, key)))
+    return {
+        tuple(values[:-1]): values[-1]
+        for values in Location.objects.filter(query).values_list(*LOCATION_FIELDS, 'pk')
+    }
+
+
+def _resolve_locations(rows):
+    keys = {_location_key(row) for row in rows}
+    # Narrow by postal code in SQL, match the full key in Python
+    postal_codes = {key[LOCATION_FIELDS.index('postal_code')] for key in keys}
+    found = {
+        tuple(values[:-1]): values[-1]
+        for values in Location.objects.filter(postal_code__in=postal_codes).values_list(*LOCATION_FIELDS, 'pk')
+    }
+    missing = [key for key in keys if key not in found]
+    if missing:
+        Location.objects.bulk_create(
+            [Location(**dict(zip(LOCATION_FIELDS, key))) for key in missing],
+            ignore_conflicts=True,
+        )
+        found.update(_find_locations(missing))
+    return found
+
+
+def _resolve_products(rows):
+    keys = {}
+    for row in rows:
+        keys.setdefault(row['product_id'], row)
+    found = dict(SalesProduct.objects.filter(product_id__in=keys).values_list('product_id', 'pk'))
+    missing = [key for key in keys if key not in found]
+    if missing:
+        catalogue = dict(Product.objects.filter(product_id__in=missing).values_list('product_id', 'pk'))
+        SalesProduct.objects.bulk_create(
+            [
+                SalesProduct(**{field: keys[key][field] for field in PRODUCT_FIELDS}, catalogue_id=catalogue.get(key))
+                for key in missing
+            ],
+            ignore_conflicts=True,
+        )
+        found.update(SalesProduct.objects.filter(product_id__in=missing).values_list('product_id', 'pk'))
+    return found
+
+
+def resolve(rows):
+    """
+    Convert flat sales rows into NewSalesData field values, with
+    ``customer_id``, ``location_id`` and ``product_id`` set to the primary
+    keys of the (possibly new) dimension rows.
+    """
+    if not rows:
+        return []
+    customers = _resolve_customers(rows)
+    locations = _resolve_locations(rows)
+    products = _resolve_products(rows)
+
+    facts = []
+    for row in rows:
+        values = {field: value for field, value in row.items() if field not in FLAT_FIELDS}
+        values['customer_id'] = customers[row['customer_id']]
+        values['location_id'] = locations[_location_key(row)]
+        values['product_id'] = products[row['product_id']]
+        facts.append(values)
+    return facts
+
+
+def conflicting_attributes(row, fields):
+    """
+    ``{field: message}`` for the customer and product attributes among
+    ``fields`` of a flat row that differ from those stored for its
+    ``customer_id`` or ``product_id``. A new id has nothing to conflict with.
+    """
+    errors = {}
+    for dimension, model, fields_of in (
+        ('customer', Customer, CUSTOMER_FIELDS),
+        ('product', SalesProduct, PRODUCT_FIELDS),
+    ):
+        key, *attributes = fields_of
+        given = [field for field in attributes if field in fields]
+        current = model.objects.filter(**{key: row[key]}).values(*given).first() if given else None
+        for field in given if current else []:
+            if current[field] != row[field]:
+                errors[field] = (
+                    f"{dimension.capitalize()} {row[key]} has {field} {current[field]!r}; "
+                    f"set another {key} to move the sale"
+                )
+    return errors
+
+
+def flatten(validated_data):
+    """Turn serializer data with nested customer/location/product dicts into a flat row."""
+    row = dict(validated_data)
+    for dimension in ('customer', 'location', 'product'):
+        row.update(row.pop(dimension, {}))
+    return row
+
+
+def _shared_names(dimension):
+    """``{pk: name}`` of the customers or products whose name another one has too."""
+    model, name_field = NAME_FIELDS[dimension]
+    shared = model.objects.values(name_field).annotate(ids=Count('pk')).filter(ids__gt=1).values(name_field)
+    return dict(model.objects.filter(**{f'{name_field}__in': shared}).values_list('pk', name_field))
+
+
+def totals_by_name(dimension, value='sales', queryset=None):
+    """
+    ``{name: total}`` of ``value`` per customer or product name.
+
+    The sum is grouped by the integer foreign key in SQL and merged per
+    name afterwards, since a few product names belong to several ids.
+    """
+    model, name_field = NAME_FIELDS[dimension]
+    if queryset is None:
+        queryset = NewSalesData.objects.all()
+    sums = queryset.values_list(dimension).annotate(total=Sum(value)).order_by()
+    sums = dict(sums)
+    names = dict(model.objects.filter(pk__in=sums).values_list('pk', name_field))
+
+    totals = defaultdict(Decimal)
+    for pk, total in sums.items():
+        totals[names[pk]] += total
+    return totals
+
+
+def ranked_by_name(dimension, value='sales', limit=None, order='-total', queryset=None):
+    """
+    ``[(name, total), ...]`` ordered by ``-total`` (largest first) or ``name``.
+
+    The ids with a name of their own are summed, ordered and cut to
+    ``limit`` in SQL. The few that share a name are summed separately and
+    merged per name; only they can displace a row of the SQL result.
+    """
+    model, name_field = NAME_FIELDS[dimension]
+    if queryset is None:
+        queryset = NewSalesData.objects.all()
+    shared = _shared_names(dimension)
+
+    sums = queryset.values_list(dimension).annotate(total=Sum(value))
+    unique = sums.exclude(**{f'{dimension}__in': shared}) if shared else sums
+    unique = unique.order_by(f'{dimension}__{name_field}' if order == 'name' else '-total')
+    if limit is not None:
+        unique = unique[:limit]
+    unique = list(unique)
+    names = dict(model.objects.filter(pk__in=[pk for pk, _ in unique]).values_list('pk', name_field))
+    ranked = [(names[pk], total) for pk, total in unique]
+
+    if shared:
+        merged = defaultdict(Decimal)
+        for pk, total in sums.filter(**{f'{dimension}__in': shared}).order_by():
+            merged[shared[pk]] += total
+        ranked += merged.items()
+        if order == 'name':
+            ranked.sort(key=lambda item: item[0])
+        else:
+            ranked.sort(key=lambda item: item[1], reverse=True)
+    return ranked if limit is None else ranked[:limit]
@@ -0,0 +1,216 @@
+"""
+Streaming exports of new_sales_data as CSV, Parquet or Arrow IPC.
+
+Rows are read with ``QuerySet.iterator(chunk_size=...)``, which uses a
+server-side cursor on PostgreSQL, and written out one chunk at a time, so
+an export of any size runs in constant memory and the first bytes are sent
+as soon as the first chunk has been fetched. Under ASGI the chunks are
+handed to the server through ``aiterate``, since Django reads a plain
+iterator to the end before an async response sends anything.
+"""
+import csv
+import io
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.db import models, router, transaction
+from rest_framework.exceptions import ValidationError
+
+from . import dimensions
+from .models import NewSalesData
+
+CHUNK_SIZE = 5000
+
+# Column -> ORM path, in the field order of the sales API
+EXPORT_PATHS = {
+    'id': 'id',
+    'order_date': 'order_date',
+    **dimensions.FLAT_FIELDS,
+    **{
+        f.name: f.name for f in NewSalesData._meta.concrete_fields
+        if f.name not in ('id', 'order_date') and not f.is_relation
+    },
+}
+
+EXPORT_FIELDS = list(EXPORT_PATHS)
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+
+def _parse_date(request, name):
+    value = request.query_params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValidationError({name: 'Must be a date in YYYY-MM-DD format.'})
+
+
+def parse_export_params(request):
+    """
+    Read ``start``, ``end`` (inclusive, YYYY-MM-DD), ``columns``
+    (comma-separated field names) and ``output`` (csv, parquet or arrow)
+    from the query string.
+    """
+    start = _parse_date(request, 'start')
+    end = _parse_date(request, 'end')
+    if start and end and end < start:
+        raise ValidationError({'end': 'Must not be before start.'})
+
+    columns = request.query_params.get('columns')
+    if columns:
+        columns = [column.strip() for column in columns.split(',') if column.strip()]
+        unknown = [column for column in columns if column not in EXPORT_FIELDS]
+        if unknown:
+            raise ValidationError({'columns': f"Unknown columns: {', '.join(unknown)}"})
+    else:
+        columns = list(EXPORT_FIELDS)
+
+    output = request.query_params.get('output', 'csv').lower()
+    if output not in CONTENT_TYPES:
+        raise ValidationError({'output': f"Must be one of: {', '.join(CONTENT_TYPES)}."})
+    return start, end, columns, output
+
+
+def export_queryset(start=None, end=None):
+    # Bound to its database now: the rows are read while the response
+    # streams, after the request's read routing (see routers.py) has ended
+    queryset = NewSalesData.objects.using(router.db_for_read(NewSalesData)).order_by('order_date', 'id')
+    if start:
+        queryset = queryset.filter(order_date__gte=start)
+    if end:
+        queryset = queryset.filter(order_date__lte=end)
+    return queryset
+
+
+def _chunks(queryset, columns, chunk_size):
+    # In autocommit mode PostgreSQL declares the cursor WITH HOLD, which
+    # materializes the whole result before the first row is returned;
+    # inside a transaction the rows really are fetched chunk by chunk.
+    with transaction.atomic(using=queryset.db):
+        chunk = []
+        paths = [EXPORT_PATHS[column] for column in columns]
+        for row in queryset.values_list(*paths).iterator(chunk_size=chunk_size):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def stream_csv(queryset, columns, chunk_size=CHUNK_SIZE):
+    """
+    Yield the CSV text chunk by chunk. The header uses the model field names,
+    so an export can be posted back to the bulk ingest endpoint as is.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    for chunk in _chunks(queryset, columns, chunk_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+
+
+def _arrow_type(pa, field):
+    if isinstance(field, models.DateField):
+        return pa.date32()
+    if isinstance(field, models.DecimalField):
+        return pa.decimal128(field.max_digits, field.decimal_places)
+    if isinstance(field, models.BigAutoField):
+        return pa.int64()
+    if isinstance(field, (models.IntegerField, models.AutoField)):
+        return pa.int32()
+    return pa.string()
+
+
+def _model_field(column):
+    model = NewSalesData
+    *relations, name = EXPORT_PATHS[column].split('__')
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    return model._meta.get_field(name)
+
+
+def arrow_schema(columns):
+    import pyarrow as pa
+    return pa.schema([(column, _arrow_type(pa, _model_field(column))) for column in columns])
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file that hands out what was written since the last drain."""
+
+    def __init__(self):
+        self._parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def stream_arrow(queryset, columns, output='parquet', chunk_size=CHUNK_SIZE):
+    """
+    Yield a Parquet file (one row group per chunk) or an Arrow IPC stream
+    (one record batch per chunk). Requires pyarrow.
+    """
+    import pyarrow as pa
+
+    schema = arrow_schema(columns)
+    sink = _Sink()
+    if output == 'parquet':
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(sink, schema)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    for chunk in _chunks(queryset, columns, chunk_size):
+        batch = pa.RecordBatch.from_arrays(
+            [pa.array(values, type=schema.field(i).type) for i, values in enumerate(zip(*chunk))],
+            schema=schema,
+        )
+        writer.write_batch(batch)
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    yield sink.drain()
+
+
+async def aiterate(iterator):
+    """
+    Async iterator over a ``stream_*`` generator, for a StreamingHttpResponse
+    served through ASGI. Every chunk is produced on the request's sync
+    thread, which holds the transaction and cursor of the export.
+    """
+    done = object()
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    try:
+        while (chunk := await next_chunk(iterator, done)) is not done:
+            yield chunk
+    finally:
+        # Ends the export transaction when the client goes away early
+        await sync_to_async(iterator.close, thread_sensitive=True)()
+
+
+def arrow_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
@@ -0,0 +1,292 @@
+"""
+Precomputed forecasts in the ``forecast_points`` table.
+
+``materialize`` runs a model out to a configurable horizon and stores every
+step with its interval, tagged with the model version (the content hash of
+its artifact). The prediction endpoints look the requested date up for the
+version currently on disk with one indexed query and only run the model
+when the answer is not in the table: dates beyond the horizon, a model
+that changed since it was last materialized, and requests the model
+rejects, whose error then comes from the live path as before.
+
+Steps are counted from the model's last training date (``origin``) the same
+way the live tasks count them: days for the daily model, months for the
+SARIMA models.
+"""
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+
+from . import forecast_tasks, forecasting
+from .forecast_tasks import PredictionError
+from .model_registry import registry
+from .models import ForecastPoint
+
+GRANULARITIES = {
+    'daily': 'daily_prophet',
+    'weekly': 'weekly_sarima',
+    'monthly': 'monthly_sarima',
+}
+
+DEFAULTS = {
+    'ENABLED': True,
+    # Steps materialized per granularity
+    'HORIZON': {'daily': 365, 'weekly': 104, 'monthly': 36},
+}
+
+_configured = getattr(settings, 'SALESAPP_FORECASTS', {})
+CONFIG = {
+    **DEFAULTS,
+    **_configured,
+    'HORIZON': {**DEFAULTS['HORIZON'], **_configured.get('HORIZON', {})},
+}
+
+BATCH_SIZE = 1000
+
+# Most dates one batch prediction request may ask for
+MAX_BATCH_DATES = 1000
+
+# Dates a start/end range expands to: every day, every Monday (like the
+# weekly range endpoint) or every month end
+RANGE_FREQUENCIES = {'daily': 'D', 'weekly': 'W-MON', 'monthly': 'ME'}
+
+# (granularity, version) -> origin of a materialized version
+_origins = {}
+_counters = {'hits': 0, 'misses': 0}
+_counters_lock = threading.Lock()
+
+
+def _count(outcome):
+    with _counters_lock:
+        _counters[outcome] += 1
+
+
+# Writing
+
+def materialize(granularity, horizon=None, force=False):
+    """
+    Store the forecasts of the current model of ``granularity`` for steps
+    ``1..horizon`` and drop those of other versions. Does nothing when this
+    version is already stored that far out, unless ``force``.
+    """
+    name = GRANULARITIES[granularity]
+    horizon = horizon or CONFIG['HORIZON'][granularity]
+    started = time.perf_counter()
+    result = {'granularity': granularity, 'model': name, 'horizon': horizon}
+
+    version = registry.artifact_version(name)
+    if version is None:
+        return {**result, 'action': 'skipped', 'reason': 'no model artifact'}
+    stored = (
+        ForecastPoint.objects.filter(granularity=granularity, model_version=version)
+        .aggregate(steps=Max('step'))['steps']
+    )
+    if stored is not None and stored >= horizon and not force:
+        return {**result, 'action': 'unchanged', 'version': version, 'points': stored}
+
+    if granularity == 'daily':
+        version, origin, points = forecast_tasks.prophet_points(horizon)
+    else:
+        version, origin, points = forecast_tasks.sarima_points(name, horizon)
+    computed = time.perf_counter()
+
+    origin = date.fromisoformat(origin)
+    with transaction.atomic():
+        ForecastPoint.objects.filter(granularity=granularity).delete()
+        ForecastPoint.objects.bulk_create(
+            [
+                ForecastPoint(
+                    granularity=granularity, model_version=version, origin=origin, step=step,
+                    target_date=date.fromisoformat(target), yhat=yhat, yhat_lower=lower, yhat_upper=upper,
+                )
+                for step, target, yhat, lower, upper in points
+            ],
+            batch_size=BATCH_SIZE,
+        )
+    return {
+        **result,
+        'action': 'materialized',
+        'version': version,
+        'origin': str(origin),
+        'points': len(points),
+        'seconds': {
+            'forecast': round(computed - started, 4),
+            'write': round(time.perf_counter() - computed, 4),
+        },
+    }
+
+
+# Reading
+
+def _current(granularity):
+    """``(version, origin)`` of the model on disk; origin is None if it is not materialized."""
+    if not CONFIG['ENABLED']:
+        return None, None
+    version = registry.artifact_version(GRANULARITIES[granularity])
+    if version is None:
+        return None, None
+    key = (granularity, version)
+    if key not in _origins:
+        origin = (
+            ForecastPoint.objects.filter(granularity=granularity, model_version=version)
+            .values_list('origin', flat=True).first()
+        )
+        if origin is None:
+            return version, None
+        _origins[key] = origin
+    return version, _origins[key]
+
+
+def _step(granularity, origin, day):
+    if granularity == 'daily':
+        return (day - origin).days
+    return forecasting.months_ahead(day, origin)
+
+
+def _parse(value):
+    try:
+        value = pd.to_datetime(value)
+    except (ValueError, TypeError):
+        return None
+    return None if pd.isna(value) else value.date()
+
+
+def forecast(granularity, value):
+    """
+    ``(date 'YYYY-MM-DD', predicted sales)`` for a requested date, as the
+    live forecast tasks return it, or None if it is not in the table.
+    """
+    day = _parse(value)
+    version, origin = _current(granularity)
+    if day is None or origin is None or day <= origin:
+        _count('misses')
+        return None
+    yhat = (
+        ForecastPoint.objects
+        .filter(granularity=granularity, model_version=version, step=_step(granularity, origin, day))
+        .values_list('yhat', flat=True).first()
+    )
+    if yhat is None:
+        _count('misses')
+        return None
+    _count('hits')
+    return day.strftime('%Y-%m-%d'), round(yhat, 2)
+
+
+def daily_window(selected_date, days=30):
+    """Table counterpart of ``forecast_tasks.prophet_window``, or None if any day is missing."""
+    day = _parse(selected_date)
+    version, origin = _current('daily')
+    if day is None or origin is None:
+        _count('misses')
+        return None
+    first = _step('daily', origin, day - timedelta(days=days))
+    last = _step('daily', origin, day)
+    if first < 1:
+        _count('misses')
+        return None
+    points = list(
+        ForecastPoint.objects
+        .filter(granularity='daily', model_version=version, step__range=(first, last))
+        .order_by('step')
+        .values_list('target_date', 'yhat')
+    )
+    if len(points) != last - first + 1:
+        _count('misses')
+        return None
+    _count('hits')
+    return [{"date": str(target), "predicted_sales": round(yhat, 2)} for target, yhat in points]
+
+
+def parse_batch(data):
+    """
+    Read a batch prediction request: ``granularity``, then either ``dates``
+    (a list) or ``start_date`` and ``end_date``, and an optional
+    ``intervals`` flag. Returns ``(granularity, dates as 'YYYY-MM-DD', intervals)``.
+    """
+    granularity = data.get('granularity')
+    if granularity not in GRANULARITIES:
+        raise PredictionError(f"granularity must be one of: {', '.join(GRANULARITIES)}")
+
+    dates = data.get('dates')
+    if dates is not None:
+        if not isinstance(dates, list) or not dates:
+            raise PredictionError("dates must be a non-empty list")
+        parsed = [_parse(value) for value in dates]
+        invalid = [str(value) for value, day in zip(dates, parsed) if day is None]
+        if invalid:
+            raise PredictionError(f"Invalid dates: {', '.join(invalid[:5])}")
+        dates = pd.DatetimeIndex(parsed)
+    else:
+        start, end = _parse(data.get('start_date')), _parse(data.get('end_date'))
+        if start is None or end is None:
+            raise PredictionError("Provide either dates or both start_date and end_date")
+        if end < start:
+            raise PredictionError("End date must not be before start date")
+        dates = pd.date_range(start, end, freq=RANGE_FREQUENCIES[granularity])
+        if dates.empty:
+            raise PredictionError("No dates in the requested range")
+
+    if len(dates) > MAX_BATCH_DATES:
+        raise PredictionError(f"At most {MAX_BATCH_DATES} dates per request")
+    return granularity, dates.strftime('%Y-%m-%d').tolist(), bool(data.get('intervals', False))
+
+
+def batch(granularity, dates, intervals=False):
+    """Table counterpart of the batch forecast tasks, or None if any date is missing."""
+    days = pd.DatetimeIndex(dates)
+    version, origin = _current(granularity)
+    if origin is None or (days.date <= origin).any():
+        _count('misses')
+        return None
+    if granularity == 'daily':
+        steps = np.asarray((days - pd.Timestamp(origin)).days)
+    else:
+        steps = np.asarray((days.year - origin.year) * 12 + (days.month - origin.month))
+    if (steps < 1).any():
+        _count('misses')
+        return None
+
+    rows = (
+        ForecastPoint.objects
+        .filter(granularity=granularity, model_version=version, step__in=np.unique(steps).tolist())
+        .order_by('step')
+        .values_list('step', 'yhat', 'yhat_lower', 'yhat_upper')
+    )
+    table = np.array(list(rows), dtype=float).reshape(-1, 4)
+    if len(table) != len(np.unique(steps)):
+        _count('misses')
+        return None
+    _count('hits')
+    # Rows come back ordered by step, so each step's row is found by bisection
+    values = table[np.searchsorted(table[:, 0], steps)]
+    return forecast_tasks.batch_columns(days, values[:, 1], values[:, 2:] if intervals else None)
+
+
+def stats():
+    """Lookup outcomes and the version materialized per granularity."""
+    stored = {
+        row['granularity']: row
+        for row in ForecastPoint.objects.values('granularity', 'model_version')
+        .annotate(steps=Max('step')).order_by()
+    }
+    with _counters_lock:
+        counters = dict(_counters)
+    return {
+        'enabled': CONFIG['ENABLED'],
+        **counters,
+        'granularities': {
+            granularity: {
+                'current_version': registry.artifact_version(name),
+                'materialized_version': stored.get(granularity, {}).get('model_version'),
+                'steps': stored.get(granularity, {}).get('steps', 0),
+            }
+            for granularity, name in GRANULARITIES.items()
+        },
+    }
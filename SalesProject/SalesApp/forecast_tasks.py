@@ -0,0 +1,232 @@
+"""
+Forecast computations run by the inference pool (see SalesApp.inference).
+
+Every task takes and returns plain picklable values and does not depend on
+Django, so it can run in a worker process. Models come from the process's
+own model registry, which loads them once and hot-reloads them when the
+artifacts change. Requests the models cannot answer raise
+``PredictionError`` with the message and HTTP status the endpoint returns.
+"""
+import os
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from . import forecasting
+from .model_registry import registry
+
+
+class PredictionError(Exception):
+    status_code = 400
+
+    def __init__(self, message, status_code=None):
+        if status_code is None:
+            status_code = self.status_code
+        # Both values go into args so the exception survives pickling
+        super().__init__(message, status_code)
+        self.message = message
+        self.status_code = status_code
+
+    def __str__(self):
+        return self.message
+
+
+def preload(names=None):
+    """Pool initializer: load the models before the first task arrives."""
+    for name in names or registry.files:
+        registry.get(name)
+
+
+def model_stats():
+    """Load statistics of the models in this process's registry."""
+    return registry.stats()
+
+
+def execute(task, args):
+    """Run ``task(*args)`` and return ``(result, seconds, pid)``."""
+    started = time.perf_counter()
+    result = task(*args)
+    return result, time.perf_counter() - started, os.getpid()
+
+
+def _sarima(name):
+    model, version = registry.get_with_version(name)
+    if model is None:
+        raise PredictionError("SARIMA model not loaded", 500)
+    return model, version
+
+
+def _last_train_date(model):
+    if hasattr(model, "model") and hasattr(model.model, "data"):
+        return model.model.data.dates[-1]
+    raise PredictionError("SARIMA model missing training data", 500)
+
+
+def sarima_forecast(name, date):
+    """Forecast for the month containing ``date``: ``(date 'YYYY-MM-DD', sales)``."""
+    model, version = _sarima(name)
+    date = pd.to_datetime(date)
+    last_train_date = _last_train_date(model)
+
+    if date <= last_train_date:
+        raise PredictionError("Date must be in the future")
+
+    forecast_steps = forecasting.months_ahead(date, last_train_date)
+    if forecast_steps <= 0:
+        raise PredictionError("Invalid forecast steps")
+
+    predicted_sales = forecasting.predicted_mean(model, forecast_steps, version=version).iloc[forecast_steps - 1]
+    return date.strftime('%Y-%m-%d'), round(float(predicted_sales), 2)
+
+
+def sarima_range(name, start_date, end_date):
+    """Forecasts for every Monday between ``start_date`` and ``end_date``."""
+    model, version = _sarima(name)
+    start_date = pd.to_datetime(start_date)
+    end_date = pd.to_datetime(end_date)
+
+    if end_date <= start_date:
+        raise PredictionError("End date must be after start date")
+
+    last_train_date = _last_train_date(model)
+    if start_date <= last_train_date:
+        raise PredictionError("Start date must be after the last training date")
+
+    date_range = pd.date_range(start=start_date, end=end_date, freq='W-MON')
+
+    dates = []
+    steps_list = []
+    for date in date_range:
+        forecast_steps = forecasting.months_ahead(date, last_train_date)
+        if forecast_steps > 0:
+            dates.append(date)
+            steps_list.append(forecast_steps)
+    if not steps_list:
+        raise PredictionError("No predictions could be generated.")
+
+    # One forecast out to the furthest date, sliced for every requested date
+    forecasts = forecasting.forecast_at(model, steps_list, version=version)
+    return [
+        {"date": date.strftime('%Y-%m-%d'), "predicted_sales": round(float(predicted_sales), 2)}
+        for date, predicted_sales in zip(dates, forecasts)
+    ]
+
+
+def sarima_points(name, steps):
+    """
+    Forecast steps ``1..steps`` with 95% intervals, for the forecast table:
+    ``(version, origin, [(step, target_date, yhat, lower, upper), ...])``
+    with dates as 'YYYY-MM-DD'.
+    """
+    model, version = _sarima(name)
+    origin = _last_train_date(model)
+    forecast = forecasting.get_forecast(model, steps, version=version)
+    mean = forecast.predicted_mean.iloc[:steps]
+    bounds = forecast.conf_int().iloc[:steps]
+    points = [
+        (step, target.strftime('%Y-%m-%d'), float(yhat), float(lower), float(upper))
+        for step, (target, yhat, lower, upper) in enumerate(
+            zip(mean.index, mean, bounds.iloc[:, 0], bounds.iloc[:, 1]), start=1
+        )
+    ]
+    return version, origin.strftime('%Y-%m-%d'), points
+
+
+def batch_columns(dates, mean, bounds=None):
+    """Batch response columns, rounded like the single-date endpoints."""
+    columns = {
+        "dates": dates.strftime('%Y-%m-%d').tolist(),
+        "predicted_sales": np.round(mean, 2).tolist(),
+    }
+    if bounds is not None:
+        columns["yhat_lower"] = np.round(bounds[:, 0], 2).tolist()
+        columns["yhat_upper"] = np.round(bounds[:, 1], 2).tolist()
+    return columns
+
+
+def sarima_batch(name, dates, intervals=False):
+    """
+    Forecasts for a list of dates from one forecast out to the furthest of
+    them, as columns; each date gets the step ``sarima_forecast`` gives it.
+    """
+    model, version = _sarima(name)
+    dates = pd.DatetimeIndex(pd.to_datetime(dates))
+    last_train_date = _last_train_date(model)
+    if (dates <= last_train_date).any():
+        raise PredictionError(f"All dates must be after the last training date ({last_train_date:%Y-%m-%d})")
+
+    steps = np.asarray((dates.year - last_train_date.year) * 12 + (dates.month - last_train_date.month))
+    if (steps <= 0).any():
+        raise PredictionError("Invalid forecast steps")
+
+    forecast = forecasting.get_forecast(model, int(steps.max()), version=version)
+    mean = forecast.predicted_mean.to_numpy()[steps - 1]
+    bounds = forecast.conf_int().to_numpy()[steps - 1] if intervals else None
+    return batch_columns(dates, mean, bounds)
+
+
+def _prophet():
+    model = registry.get('daily_prophet')
+    if model is None:
+        raise PredictionError("Prophet model not loaded", 500)
+    return model
+
+
+def prophet_forecast(date):
+    """Daily forecast for a single future date: ``(date 'YYYY-MM-DD', sales)``."""
+    model = _prophet()
+    date = pd.to_datetime(date)
+
+    last_train_date = model.history['ds'].max()
+    if date <= last_train_date:
+        raise PredictionError("Date must be in the future")
+
+    forecast = model.predict(pd.DataFrame({"ds": [date]}))
+    return date.strftime('%Y-%m-%d'), round(float(forecast['yhat'].iloc[0]), 2)
+
+
+def prophet_window(selected_date, days=30):
+    """Daily forecasts for ``selected_date`` and the ``days`` days before it."""
+    model = _prophet()
+    end_date = datetime.strptime(selected_date, "%Y-%m-%d")
+    date_range = pd.date_range(start=end_date - timedelta(days=days), end=end_date)
+
+    forecast = model.predict(pd.DataFrame({"ds": date_range}))
+    return [
+        {"date": str(ds.date()), "predicted_sales": round(float(yhat), 2)}
+        for ds, yhat in zip(forecast['ds'], forecast['yhat'])
+    ]
+
+
+def prophet_batch(dates, intervals=False):
+    """Daily forecasts for a list of dates with a single ``predict`` call, as columns."""
+    model = _prophet()
+    dates = pd.DatetimeIndex(pd.to_datetime(dates))
+    last_train_date = model.history['ds'].max()
+    if (dates <= last_train_date).any():
+        raise PredictionError(f"All dates must be after the last training date ({last_train_date:%Y-%m-%d})")
+
+    forecast = model.predict(pd.DataFrame({"ds": dates.unique().sort_values()})).set_index('ds')
+    forecast = forecast.reindex(dates)
+    bounds = forecast[['yhat_lower', 'yhat_upper']].to_numpy() if intervals else None
+    return batch_columns(dates, forecast['yhat'].to_numpy(), bounds)
+
+
+def prophet_points(steps):
+    """Daily counterpart of ``sarima_points``, with the model's own uncertainty interval."""
+    model, version = registry.get_with_version('daily_prophet')
+    if model is None:
+        raise PredictionError("Prophet model not loaded", 500)
+    origin = model.history['ds'].max()
+    dates = pd.date_range(start=origin + timedelta(days=1), periods=steps)
+
+    forecast = model.predict(pd.DataFrame({"ds": dates}))
+    points = [
+        (step, str(ds.date()), float(yhat), float(lower), float(upper))
+        for step, (ds, yhat, lower, upper) in enumerate(
+            zip(forecast['ds'], forecast['yhat'], forecast['yhat_lower'], forecast['yhat_upper']), start=1
+        )
+    ]
+    return version, origin.strftime('%Y-%m-%d'), points
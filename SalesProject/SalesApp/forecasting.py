@@ -0,0 +1,73 @@
+"""
+Shared SARIMA forecasting engine for the prediction endpoints.
+
+A SARIMA forecast for ``n`` steps contains the forecasts for every shorter
+horizon as its prefix, so one forecast out to the furthest requested date
+answers every date before it. Forecasts are memoized per
+``(model version, horizon)``; a request for a shorter horizon is sliced from
+any longer forecast already computed for the same model version.
+"""
+import threading
+from collections import OrderedDict
+
+MEMO_SIZE = 32
+
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def model_version(model):
+    """Version key for a loaded results object (it is loaded once per process)."""
+    return id(model)
+
+
+def months_ahead(date, last_train_date):
+    """Number of monthly steps from the training cutoff to ``date``."""
+    return (date.year - last_train_date.year) * 12 + (date.month - last_train_date.month)
+
+
+def _lookup(version, steps):
+    for (cached_version, horizon), forecast in reversed(_memo.items()):
+        if cached_version == version and horizon >= steps:
+            _memo.move_to_end((cached_version, horizon))
+            return forecast
+    return None
+
+
+def get_forecast(model, steps, version=None):
+    """
+    Return prediction results covering at least ``steps`` steps ahead.
+
+    Callers slice what they need; ``predicted_mean.iloc[k - 1]`` is the
+    forecast ``k`` steps ahead for any ``k <= steps``.
+    """
+    if version is None:
+        version = model_version(model)
+
+    with _memo_lock:
+        forecast = _lookup(version, steps)
+    if forecast is not None:
+        return forecast
+
+    forecast = model.get_forecast(steps=steps)
+    with _memo_lock:
+        _memo[(version, steps)] = forecast
+        while len(_memo) > MEMO_SIZE:
+            _memo.popitem(last=False)
+    return forecast
+
+
+def predicted_mean(model, steps, version=None):
+    """Forecast means for horizons ``1..steps`` as a pandas Series."""
+    return get_forecast(model, steps, version=version).predicted_mean.iloc[:steps]
+
+
+def forecast_at(model, steps_list, version=None):
+    """Forecast means for each horizon in ``steps_list`` from a single forecast."""
+    mean = predicted_mean(model, max(steps_list), version=version)
+    return [mean.iloc[steps - 1] for steps in steps_list]
+
+
+def clear():
+    with _memo_lock:
+        _memo.clear()
@@ -0,0 +1,218 @@
+"""
+Process pool for forecasting inference.
+
+statsmodels and Prophet hold the GIL for hundreds of milliseconds per
+forecast, which stalls every other request served by the same worker. The
+prediction endpoints therefore hand their forecasts (SalesApp.forecast_tasks)
+to a small pool of processes that load the models once at start-up.
+
+The pool is bounded: at most ``WORKERS + MAX_QUEUE`` forecasts are in
+flight per server process and further requests are rejected straight away
+with 503 instead of piling up. Each request waits at most ``TIMEOUT``
+seconds for its result (504 after that). Configure it with the
+``SALESAPP_INFERENCE`` setting; with ``ENABLED`` false forecasts run inline
+on the request thread, with the same limits and statistics.
+"""
+import logging
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from . import forecast_tasks, metrics
+from .forecast_tasks import PredictionError
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'WORKERS': 2,
+    'MAX_QUEUE': 8,
+    'TIMEOUT': 30,
+    # 'spawn' keeps the workers clear of the server's threads and sockets
+    'START_METHOD': 'spawn',
+}
+
+# Execution times kept for the percentiles in stats()
+SAMPLE_SIZE = 1000
+
+
+class InferenceOverloaded(PredictionError):
+    status_code = 503
+
+
+class InferenceTimeout(PredictionError):
+    status_code = 504
+
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+class InferencePool:
+    def __init__(self, workers=2, max_queue=8, timeout=30, start_method='spawn', enabled=True):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.start_method = start_method
+        self.enabled = enabled
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._counts = {
+            'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0, 'timed_out': 0,
+            'max_in_flight': 0,
+        }
+        self._exec_times = deque(maxlen=SAMPLE_SIZE)
+        self._wait_times = deque(maxlen=SAMPLE_SIZE)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=forecast_tasks.preload,
+                )
+                logger.info("Started inference pool with %d workers", self.workers)
+            return self._executor
+
+    def _acquire(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._counts['rejected'] += 1
+            raise InferenceOverloaded("Prediction service is busy, please retry shortly")
+        with self._lock:
+            self._in_flight += 1
+            self._counts['submitted'] += 1
+            self._counts['max_in_flight'] = max(self._counts['max_in_flight'], self._in_flight)
+
+    def _release(self, *args):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def _record(self, task, outcome, started, exec_seconds=None):
+        total_seconds = time.perf_counter() - started
+        with self._lock:
+            self._counts[outcome] += 1
+            if exec_seconds is not None:
+                self._exec_times.append(exec_seconds)
+                self._wait_times.append(max(total_seconds - exec_seconds, 0.0))
+        metrics.observe_inference(task.__name__, exec_seconds, total_seconds)
+
+    def run(self, task, *args, timeout=None):
+        """
+        Run ``task(*args)`` (a function from SalesApp.forecast_tasks) and
+        return its result. Raises ``InferenceOverloaded`` when the queue is
+        full, ``InferenceTimeout`` when the result takes longer than
+        ``timeout`` seconds, and re-raises whatever the task raised.
+        """
+        self._acquire()
+        started = time.perf_counter()
+        if not self.enabled:
+            try:
+                result, exec_seconds, _ = forecast_tasks.execute(task, args)
+            except Exception:
+                self._record(task, 'failed', started)
+                raise
+            finally:
+                self._release()
+            self._record(task, 'completed', started, exec_seconds)
+            return result
+
+        try:
+            future = self._get_executor().submit(forecast_tasks.execute, task, args)
+        except Exception:
+            self._release()
+            self._record(task, 'failed', started)
+            raise
+        # The slot is held until the work is really finished, even when
+        # this request has given up waiting for it
+        future.add_done_callback(self._release)
+
+        try:
+            result, exec_seconds, _ = future.result(timeout=self.timeout if timeout is None else timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            self._record(task, 'timed_out', started)
+            raise InferenceTimeout("Prediction timed out")
+        except BrokenProcessPool:
+            self._record(task, 'failed', started)
+            self._reset()
+            raise InferenceOverloaded("Prediction service restarted, please retry")
+        except Exception:
+            self._record(task, 'failed', started)
+            raise
+        self._record(task, 'completed', started, exec_seconds)
+        return result
+
+    def _reset(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            logger.error("Inference pool broke, starting a new one")
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            exec_times = list(self._exec_times)
+            wait_times = list(self._wait_times)
+            in_flight = self._in_flight
+            counts = dict(self._counts)
+            started = self._executor is not None
+
+        queue_depth = max(in_flight - self.workers, 0) if self.enabled else 0
+
+        def ms(seconds):
+            return None if seconds is None else round(seconds * 1000, 2)
+
+        return {
+            'mode': 'process_pool' if self.enabled else 'inline',
+            'started': started,
+            'workers': self.workers,
+            'max_queue': self.max_queue,
+            'timeout_seconds': self.timeout,
+            'in_flight': in_flight,
+            # Requests waiting for a free worker
+            'queue_depth': queue_depth,
+            **counts,
+            'exec_ms': {
+                'mean': ms(sum(exec_times) / len(exec_times)) if exec_times else None,
+                'p50': ms(_percentile(exec_times, 50)),
+                'p95': ms(_percentile(exec_times, 95)),
+                'max': ms(max(exec_times)) if exec_times else None,
+            },
+            'queue_wait_ms': {
+                'p50': ms(_percentile(wait_times, 50)),
+                'p95': ms(_percentile(wait_times, 95)),
+            },
+        }
+
+
+def _from_settings():
+    config = {**DEFAULTS, **getattr(settings, 'SALESAPP_INFERENCE', {})}
+    return InferencePool(
+        workers=config['WORKERS'],
+        max_queue=config['MAX_QUEUE'],
+        timeout=config['TIMEOUT'],
+        start_method=config['START_METHOD'],
+        enabled=config['ENABLED'],
+    )
+
+
+pool = _from_settings()
@@ -0,0 +1,152 @@
+"""
+Period-over-period KPIs.
+
+Each period runs from its start up to and including the requested day
+(day, week-to-date from Monday, month-to-date, year-to-date) and is
+compared with the same span of the period before: yesterday, the same
+weekdays of last week, the same days of last month and of last year (the
+last day clamped to the shorter month, e.g. 31 March compares with 1-28
+February).
+
+All periods and their comparisons are summed in one query over the daily
+rollup: a single ``date BETWEEN`` range covering every window, with one
+``SUM(...) FILTER (WHERE date BETWEEN ...)`` per window and measure (a
+``CASE`` expression on databases without ``FILTER``). The rollup holds one
+row per day, so the query reads at most about two years of rows whatever
+periods are asked for. The SQL is written out directly: building the same
+query from ORM aggregates costs more than running it.
+"""
+import calendar
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connections, router
+
+from .models import DailySalesSummary
+
+PERIODS = ('day', 'week', 'month', 'year')
+
+# Measure -> rollup column
+MEASURES = {
+    'sales': 'total_sales',
+    'profit': 'total_profit',
+    'orders': 'order_count',
+    'quantity': 'total_quantity',
+}
+
+
+def _same_day(year, month, day):
+    """``day`` of ``month``, or the month's last day if it is shorter."""
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def windows(period, day):
+    """``((start, end), (previous start, previous end))`` of ``period`` up to ``day``."""
+    if period == 'day':
+        previous = day - timedelta(days=1)
+        return (day, day), (previous, previous)
+    if period == 'week':
+        start = day - timedelta(days=day.weekday())
+        return (start, day), (start - timedelta(days=7), day - timedelta(days=7))
+    if period == 'month':
+        year, month = (day.year, day.month - 1) if day.month > 1 else (day.year - 1, 12)
+        return (day.replace(day=1), day), (day.replace(year=year, month=month, day=1), _same_day(year, month, day))
+    if period == 'year':
+        return (day.replace(month=1, day=1), day), (day.replace(year=day.year - 1, month=1, day=1),
+                                                    _same_day(day.year - 1, day.month, day))
+    raise ValueError(f"Unknown period: {period}")
+
+
+def parse_periods(value):
+    """Comma-separated period names (default: all), in ``PERIODS`` order."""
+    if not value:
+        return list(PERIODS)
+    names = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = names - set(PERIODS)
+    if unknown or not names:
+        raise ValueError(f"periods must be a comma-separated list of: {', '.join(PERIODS)}")
+    return [period for period in PERIODS if period in names]
+
+
+def _sum(value):
+    # PostgreSQL sums decimals as numeric, SQLite as float
+    if value is None:
+        return Decimal(0)
+    return value if isinstance(value, Decimal) else Decimal(str(round(value, 2)))
+
+
+def _values(sums):
+    sales, profit, orders, quantity = sums
+    sales, profit = _sum(sales), _sum(profit)
+    orders, quantity = orders or 0, quantity or 0
+    return {
+        'sales': sales,
+        'profit': profit,
+        'orders': orders,
+        'quantity': quantity,
+        'avg_order_value': sales / orders if orders else Decimal(0),
+    }
+
+
+def _query(spans):
+    """One row of ``MEASURES`` sums per span, in order, from a single scan."""
+    connection = connections[router.db_for_read(DailySalesSummary)]
+    table = connection.ops.quote_name(DailySalesSummary._meta.db_table)
+    date_column = connection.ops.quote_name('date')
+    columns, params = [], []
+    for start, end in spans:
+        for column in MEASURES.values():
+            column = connection.ops.quote_name(column)
+            if connection.features.supports_aggregate_filter_clause:
+                columns.append(f"SUM({column}) FILTER (WHERE {date_column} BETWEEN %s AND %s)")
+            else:
+                columns.append(f"SUM(CASE WHEN {date_column} BETWEEN %s AND %s THEN {column} END)")
+            params += [connection.ops.adapt_datefield_value(start), connection.ops.adapt_datefield_value(end)]
+    params += [
+        connection.ops.adapt_datefield_value(min(start for start, _ in spans)),
+        connection.ops.adapt_datefield_value(max(end for _, end in spans)),
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT {', '.join(columns)} FROM {table} WHERE {date_column} BETWEEN %s AND %s",
+            params,
+        )
+        row = cursor.fetchone()
+    size = len(MEASURES)
+    return [row[i:i + size] for i in range(0, len(row), size)]
+
+
+def _change(current, previous):
+    delta = current - previous
+    return {
+        'delta': _as_number(delta),
+        # No percentage from a zero base
+        'percent': round(float(delta / previous * 100), 2) if previous else None,
+    }
+
+
+def _as_number(value):
+    return round(float(value), 2) if isinstance(value, Decimal) else value
+
+
+def compute(day, periods=PERIODS):
+    """KPIs of ``periods`` up to ``day`` with their comparisons, from one query."""
+    spans = [span for period in periods for span in windows(period, day)]
+    sums = iter(_query(spans))
+    result = {}
+    for period, (current_span, previous_span) in zip(periods, zip(spans[::2], spans[1::2])):
+        current, previous = _values(next(sums)), _values(next(sums))
+        result[period] = {
+            'current': {
+                'start': current_span[0].isoformat(),
+                'end': current_span[1].isoformat(),
+                **{measure: _as_number(value) for measure, value in current.items()},
+            },
+            'previous': {
+                'start': previous_span[0].isoformat(),
+                'end': previous_span[1].isoformat(),
+                **{measure: _as_number(value) for measure, value in previous.items()},
+            },
+            'change': {measure: _change(current[measure], previous[measure]) for measure in current},
+        }
+    return result
@@ -0,0 +1,194 @@
+"""
+Streaming loader for sales CSV exports (the format of data/sales_data.csv).
+
+Rows are parsed lazily and handed out in fixed-size batches so memory stays
+flat regardless of the file size.
+"""
+import csv
+import io
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction
+
+from . import columnar, dimensions, rollups
+from .models import NewSalesData
+
+# CSV header -> NewSalesData field
+CSV_COLUMNS = {
+    'Order Date': 'order_date',
+    'Customer ID': 'customer_id',
+    'Customer Name': 'customer_name',
+    'Segment': 'segment',
+    'Country': 'country',
+    'City': 'city',
+    'State': 'state',
+    'Postal Code': 'postal_code',
+    'Region': 'region',
+    'Product ID': 'product_id',
+    'Category': 'category',
+    'Sub-Category': 'sub_category',
+    'Product Name': 'product_name',
+    'Sales': 'sales',
+    'Quantity': 'quantity',
+    'Discount': 'discount',
+    'Profit': 'profit',
+    'Avg for Week': 'avg_for_week',
+    'Avg for Month': 'avg_for_month',
+    'Week Sales': 'week_sales',
+    'Month Sales': 'month_sales',
+    'Day Sales': 'day_sales',
+}
+
+DATE_FORMAT = '%d/%m/%Y'
+
+DECIMAL_FIELDS = {
+    f.name: Decimal(1).scaleb(-f.decimal_places)
+    for f in NewSalesData._meta.concrete_fields
+    if f.get_internal_type() == 'DecimalField'
+}
+
+
+class CSVRowError(ValueError):
+    """Raised when a CSV row cannot be converted into a NewSalesData row."""
+
+    def __init__(self, line, message):
+        super().__init__(f"line {line}: {message}")
+        self.line = line
+
+
+def parse_row(row, line=None):
+    """Convert one CSV dict (keyed by the CSV headers) into model field values."""
+    try:
+        values = {field: row[header].strip() for header, field in CSV_COLUMNS.items()}
+    except KeyError as e:
+        raise CSVRowError(line, f"missing column {e}")
+
+    try:
+        values['order_date'] = datetime.strptime(values['order_date'], DATE_FORMAT).date()
+        values['quantity'] = int(values['quantity'])
+        for field, exponent in DECIMAL_FIELDS.items():
+            values[field] = Decimal(values[field]).quantize(exponent)
+    except (ValueError, InvalidOperation) as e:
+        raise CSVRowError(line, str(e))
+    return values
+
+
+def iter_batches(fileobj, batch_size=5000, errors=None):
+    """
+    Yield lists of parsed rows of at most ``batch_size`` entries.
+
+    Rows that fail to parse raise ``CSVRowError`` unless an ``errors`` list is
+    given, in which case they are appended to it and skipped.
+    """
+    reader = csv.DictReader(fileobj)
+    batch = []
+    for row in reader:
+        try:
+            batch.append(parse_row(row, reader.line_num))
+        except CSVRowError as e:
+            if errors is None:
+                raise
+            errors.append(e)
+            continue
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def insert_batch(batch, method='bulk'):
+    """
+    Write one parsed batch with either ``bulk_create`` or PostgreSQL ``COPY``,
+    after resolving its customers, locations and products to foreign keys.
+    """
+    facts = dimensions.resolve(batch)
+    if method == 'copy':
+        _copy_batch(facts)
+    else:
+        NewSalesData.objects.bulk_create(
+            [NewSalesData(**values) for values in facts],
+            batch_size=len(facts),
+        )
+
+
+COPY_FIELDS = [
+    f.attname for f in NewSalesData._meta.concrete_fields if not f.primary_key
+]
+
+
+def _copy_batch(batch):
+    if connection.vendor != 'postgresql':
+        raise ValueError("COPY is only available on PostgreSQL")
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for values in batch:
+        writer.writerow([values[field] for field in COPY_FIELDS])
+    buffer.seek(0)
+
+    sql = "COPY {} ({}) FROM STDIN WITH (FORMAT csv)".format(
+        connection.ops.quote_name(NewSalesData._meta.db_table),
+        ', '.join(connection.ops.quote_name(f) for f in COPY_FIELDS),
+    )
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, 'copy'):  # psycopg 3
+            with raw.copy(sql) as copy:
+                copy.write(buffer.read())
+        else:  # psycopg2
+            raw.copy_expert(sql, buffer)
+
+
+def truncate_sales():
+    """
+    Remove every sales row with a single statement. Going through
+    ``QuerySet.delete()`` would fetch each row to fire delete signals.
+    """
+    table = connection.ops.quote_name(NewSalesData._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f"TRUNCATE {table}")
+        else:
+            cursor.execute(f"DELETE FROM {table}")
+    columnar.sales_mutated()
+    rollups.rebuild_daily_summary()
+
+
+def load_csv(fileobj, batch_size=5000, method='bulk', errors=None, progress=None):
+    """
+    Stream a sales CSV into ``new_sales_data``.
+
+    Each batch is committed in its own transaction. The daily rollup and
+    everything derived from it (bucket columns, sketches, cached responses)
+    are refreshed once, for all the days loaded, after the last batch (or
+    after the one that failed). ``progress`` is called after every batch
+    with ``(rows_loaded, elapsed_seconds)``. Returns the total number of
+    rows written and the elapsed time.
+    """
+    batches = iter_batches(fileobj, batch_size=batch_size, errors=errors)
+    return load_batches(batches, method=method, progress=progress)
+
+
+def load_batches(batches, method='bulk', progress=None):
+    """Write an iterable of parsed batches; see ``load_csv``."""
+    loaded = 0
+    dates = set()
+    started = time.perf_counter()
+    try:
+        for batch in batches:
+            with transaction.atomic():
+                insert_batch(batch, method=method)
+            dates.update(values['order_date'] for values in batch)
+            loaded += len(batch)
+            if progress is not None:
+                progress(loaded, time.perf_counter() - started)
+    finally:
+        # One pass over every day loaded rather than one per batch, which
+        # would recompute the same weeks, months and sketches again and again
+        if dates:
+            with transaction.atomic():
+                rollups.sales_changed(dates)
+    return loaded, time.perf_counter() - started
@@ -0,0 +1,243 @@
+import contextlib
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from SalesApp import cache, routers
+from SalesApp.loaders import load_batches, truncate_sales
+from SalesApp.models import NewSalesData, Product
+from SalesApp.synthetic import SAMPLE_PATH, SalesGenerator, SalesProfile
+from SalesApp.urls import urlpatterns
+
+# Routes that write or authenticate are not benchmarked
+SKIP_ROUTES = {'register', 'login', 'sales-bulk-create'}
+
+# Method and payload/query for routes that need more than a bare GET
+REQUESTS = {
+    'sales-list-create': ('get', {'page_size': 100}),
+    'predict-monthly-sales': ('post', {'date': '2018-06-01'}),
+    'predict-weekly-sales': ('post', {'date': '2018-06-01'}),
+    'predict-daily-sales': ('post', {'date': '2018-06-01'}),
+    'predict-sales-in-range': ('post', {'start_date': '2018-01-05', 'end_date': '2018-12-31'}),
+    'predict-batch': ('post', {'granularity': 'daily', 'start_date': '2018-01-05', 'end_date': '2018-12-31'}),
+    'daily-sales-prediction': ('get', {'date': '2018-06-01'}),
+}
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class QueryCounter:
+    """
+    Count queries with an execute wrapper; CaptureQueriesContext does not
+    work across a full request because request_started resets the log.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    index = max(0, min(len(values) - 1, round(percent / 100 * len(values) + 0.5) - 1))
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = ("Load synthetic datasets of increasing size and record p50/p95 latency, "
+            "query count and peak memory for every route in SalesApp/urls.py")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000',
+                            help="Comma-separated dataset sizes in rows (default: 10000,100000)")
+        parser.add_argument('--repeat', type=int, default=20, help="Timed requests per route")
+        parser.add_argument('--routes', help="Comma-separated route names to run (default: all)")
+        parser.add_argument('--output', help="Result file (default: benchmark-<commit>.json)")
+        parser.add_argument('--sample', default=SAMPLE_PATH)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--method', choices=['bulk', 'copy'], default='bulk')
+        parser.add_argument('--warm', action='store_true',
+                            help="Let the response cache serve repeated requests")
+        parser.add_argument('--in-place', action='store_true',
+                            help="Run against the configured database instead of a throwaway "
+                                 "test database; its sales and products are replaced")
+        parser.add_argument('--force', action='store_true',
+                            help="Confirm replacing the data of the configured database (with --in-place)")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError("--sizes must be a comma-separated list of integers")
+        if options['in_place'] and not options['force']:
+            raise CommandError(
+                f"--in-place deletes every sale and product in {connection.settings_dict['NAME']}; "
+                "pass --force to confirm"
+            )
+
+        routes = self._routes(options['routes'])
+        profile = SalesProfile.from_csv(options['sample'])
+        commit = _commit()
+        report = {
+            'commit': commit,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'repeat': options['repeat'],
+            'warm_cache': options['warm'],
+            'results': {},
+        }
+
+        old_name = None if options['in_place'] else self._create_test_db()
+        try:
+            with override_settings(ALLOWED_HOSTS=['*']):
+                for size in sizes:
+                    self._load(profile, size, options)
+                    report['results'][str(size)] = self._run(routes, options)
+        finally:
+            if old_name is not None:
+                self._destroy_test_db(old_name)
+
+        output = options['output'] or f"benchmark-{commit or 'local'}.json"
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {output}"))
+
+    def _routes(self, selected):
+        names = [p.name for p in urlpatterns if p.name and p.name not in SKIP_ROUTES]
+        if selected:
+            wanted = set(selected.split(','))
+            unknown = wanted - set(names)
+            if unknown:
+                raise CommandError(f"Unknown routes: {', '.join(sorted(unknown))}")
+            names = [name for name in names if name in wanted]
+        return names
+
+    def _create_test_db(self):
+        """Switch to a fresh test database, as the test runner does; the old database name."""
+        old_name = connection.settings_dict['NAME']
+        self.stdout.write("Creating a test database")
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        # Replica reads must see the test data too
+        alias = routers.replica()
+        if alias:
+            connections[alias].close()
+            connections[alias].creation.set_as_test_mirror(connection.settings_dict)
+        # The async views' worker threads cannot be reached to close their
+        # connections before the database is dropped; do not keep them open
+        connection.settings_dict['CONN_MAX_AGE'] = 0
+        return old_name
+
+    def _destroy_test_db(self, old_name):
+        connections.close_all()
+        for alias in connections:
+            # Pooled connections (Django 5.1+) stay open until the pool closes
+            close_pool = getattr(connections[alias], 'close_pool', None)
+            if close_pool is not None:
+                close_pool()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _load(self, profile, size, options):
+        self.stdout.write(f"Loading {size} rows")
+        truncate_sales()
+        Product.objects.all().delete()
+        generator = SalesGenerator(profile, size, seed=options['seed'])
+        Product.objects.bulk_create(
+            [Product(**values) for values in generator.product_rows()], batch_size=5000,
+        )
+        loaded, elapsed = load_batches(generator.iter_batches(), method=options['method'])
+        self.stdout.write(f"Loaded {loaded} rows in {elapsed:.1f}s")
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def _is_async(self, name):
+        pattern = next(p for p in urlpatterns if p.name == name)
+        return iscoroutinefunction(pattern.callback)
+
+    def _request(self, client, name):
+        method, payload = REQUESTS.get(name, ('get', None))
+        pattern = next(p for p in urlpatterns if p.name == name)
+        kwargs = {}
+        if 'pk' in str(pattern.pattern):
+            model = Product if name.startswith('product') else NewSalesData
+            kwargs['pk'] = model.objects.values_list('pk', flat=True).first()
+        path = reverse(name, kwargs=kwargs)
+        if method == 'post':
+            return client.post(path, json.dumps(payload), content_type='application/json')
+        response = client.get(path, payload or {})
+        if response.streaming:
+            # Time the whole export, not just the headers
+            for _ in response.streaming_content:
+                pass
+        return response
+
+    def _run(self, routes, options):
+        client = Client(HTTP_HOST='localhost')
+        results = {}
+        for name in routes:
+            # Untimed warm-up: imports, model loading, connection setup
+            response = self._request(client, name)
+
+            if not options['warm']:
+                cache.bump_data_version()
+            counter = QueryCounter()
+            with contextlib.ExitStack() as stack:
+                # Reads may go to the replica
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(counter))
+                self._request(client, name)
+            # Async views query from worker threads, on connections the
+            # wrapper does not see
+            queries = None if self._is_async(name) else counter.count
+
+            if not options['warm']:
+                cache.bump_data_version()
+            tracemalloc.start()
+            self._request(client, name)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            timings = []
+            for _ in range(options['repeat']):
+                if not options['warm']:
+                    cache.bump_data_version()
+                started = time.perf_counter()
+                self._request(client, name)
+                timings.append((time.perf_counter() - started) * 1000)
+
+            results[name] = {
+                'status': response.status_code,
+                'p50_ms': round(statistics.median(timings), 3),
+                'p95_ms': round(_percentile(timings, 95), 3),
+                'queries': queries,
+                'peak_memory_kb': round(peak / 1024, 1),
+            }
+            self.stdout.write(
+                f"  {name:<28} p50 {results[name]['p50_ms']:>9.2f}ms  "
+                f"p95 {results[name]['p95_ms']:>9.2f}ms  "
+                f"{'n/a' if queries is None else queries:>3} queries  {results[name]['peak_memory_kb']:>9.1f} KiB"
+            )
+        return results
@@ -0,0 +1,83 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework import viewsets
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from SalesApp import cache, renderers, views
+from SalesApp.models import NewSalesData
+
+
+class SerializerSalesList(views.SalesDataViewSet):
+    """The sales list as it was built before, through SalesDataSerializer."""
+
+    def list(self, request, *args, **kwargs):
+        return viewsets.ModelViewSet.list(self, request, *args, **kwargs)
+
+
+def _time(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, result
+
+
+class Command(BaseCommand):
+    help = ("Compare building and rendering get_top_customers and the sales list with "
+            "DRF's JSONRenderer and serializers against the orjson renderer and the fast view paths")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help="Timed runs per variant (median reported)")
+        parser.add_argument('--page-size', type=int, default=1000, help="Rows per sales list page")
+
+    def handle(self, *args, **options):
+        if renderers.orjson is None:
+            raise CommandError("orjson is not installed; ORJSONRenderer falls back to JSONRenderer")
+        if not NewSalesData.objects.exists():
+            raise CommandError("new_sales_data is empty; load or generate some sales first")
+
+        repeat = options['repeat']
+        factory = APIRequestFactory(SERVER_NAME='localhost')
+        drf, fast = JSONRenderer(), renderers.ORJSONRenderer()
+
+        def top_customers(layout):
+            def build():
+                cache.bump_data_version()
+                return views.get_top_customers(factory.get('/api/get-top-customers/', {'layout': layout})).data
+            return build
+
+        sales_path = '/api/sales/'
+        page = {'page_size': options['page_size']}
+        serializer_list = SerializerSalesList.as_view({'get': 'list'})
+        fast_list = views.SalesDataViewSet.as_view({'get': 'list'})
+
+        variants = [
+            ('get_top_customers', 'before: JSONRenderer', top_customers('rows'), drf),
+            ('get_top_customers', 'after: orjson', top_customers('rows'), fast),
+            ('get_top_customers', 'after: orjson, layout=columns', top_customers('columns'), fast),
+            ('SalesDataViewSet.list', 'before: serializer + JSONRenderer',
+             lambda: serializer_list(factory.get(sales_path, page)).data, drf),
+            ('SalesDataViewSet.list', 'after: values() + orjson',
+             lambda: fast_list(factory.get(sales_path, page)).data, fast),
+        ]
+
+        self.stdout.write(
+            f"{'endpoint':<24}{'variant':<36}{'build ms':>10}{'render ms':>11}{'total ms':>10}{'bytes':>10}"
+        )
+        baseline = {}
+        for endpoint, variant, build, renderer in variants:
+            build_ms, data = _time(build, repeat)
+            render_ms, body = _time(lambda: renderer.render(data, 'application/json', {}), repeat)
+            total = build_ms + render_ms
+            line = f"{endpoint:<24}{variant:<36}{build_ms:>10.2f}{render_ms:>11.2f}{total:>10.2f}{len(body):>10}"
+            if endpoint in baseline:
+                line += f"  {baseline[endpoint][0] / total:.1f}x"
+                if 'columns' not in variant and body != baseline[endpoint][1]:
+                    line += "  (output differs)"
+            else:
+                baseline[endpoint] = (total, body)
+            self.stdout.write(line)
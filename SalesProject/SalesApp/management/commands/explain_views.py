@@ -0,0 +1,161 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from SalesApp import cache, rollups
+from SalesApp.models import NewSalesData
+
+TABLE = NewSalesData._meta.db_table
+
+# GET endpoints in SalesApp/urls.py that read new_sales_data
+ROUTES = [
+    ('sales-list-create', ''),
+    ('dashboard-stats', ''),
+    ('quick-insights', ''),
+    ('product-data', ''),
+    ('customer-data', '?limit=50'),
+    ('get-top-customers', '?limit=10'),
+    ('get-top-products', '?limit=10'),
+]
+
+INDEX_NODES = {'Index Scan', 'Index Only Scan', 'Bitmap Index Scan', 'Bitmap Heap Scan'}
+
+
+def _is_sales_table(name):
+    # Partitions (new_sales_data_p2017_03, see SalesApp.partitions) and
+    # their indexes carry the table's name
+    return name == TABLE or name.startswith(f'{TABLE}_')
+
+
+def _pg_scans(plan):
+    """Yield (node type, index name) for every scan of the sales table (or its partitions) in a plan tree."""
+    if _is_sales_table(plan.get('Relation Name', '')) or (
+        plan.get('Node Type') == 'Bitmap Index Scan'
+        and (plan.get('Index Name', '').startswith('nsd_') or _is_sales_table(plan.get('Index Name', '')))
+    ):
+        yield plan['Node Type'], plan.get('Index Name')
+    for child in plan.get('Plans', []):
+        yield from _pg_scans(child)
+
+
+def explain(sql):
+    """Return ``[(scan type, index or None), ...]`` for the sales table in ``sql``."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return list(_pg_scans(plan[0]['Plan']))
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            scans = []
+            for row in cursor.fetchall():
+                detail = row[-1]
+                if f' {TABLE}' not in detail:
+                    continue
+                if 'INDEX' in detail:
+                    index = detail.split('INDEX', 1)[1].split()[0]
+                    kind = 'Index Only Scan' if 'COVERING INDEX' in detail else 'Index Scan'
+                    scans.append((kind, index))
+                else:
+                    scans.append(('Seq Scan', None))
+            return scans
+    raise CommandError(f"EXPLAIN is not supported for {connection.vendor}")
+
+
+def seed(target_rows, stdout):
+    """
+    Grow new_sales_data to ``target_rows`` by copying the existing rows with
+    their dates shifted back a year per copy, so the table keeps realistic
+    value distributions at a larger size.
+    """
+    existing = NewSalesData.objects.count()
+    if existing == 0:
+        raise CommandError("new_sales_data is empty; load data/sales_data.csv first")
+    if existing >= target_rows:
+        return
+
+    fields = [f.attname for f in NewSalesData._meta.concrete_fields if f.name != 'id']
+    source = list(NewSalesData.objects.values_list(*fields))
+    date_index = fields.index('order_date')
+    copies = 0
+    while existing < target_rows:
+        copies += 1
+        shift = timedelta(days=365 * copies)
+        batch = []
+        for row in source[:target_rows - existing]:
+            values = dict(zip(fields, row))
+            values['order_date'] = row[date_index] - shift
+            batch.append(NewSalesData(**values))
+        with transaction.atomic():
+            NewSalesData.objects.bulk_create(batch, batch_size=5000)
+        existing += len(batch)
+        stdout.write(f"Seeded {existing} rows")
+
+    rollups.rebuild_daily_summary()
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'VACUUM ANALYZE {TABLE}')
+    elif connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+
+class Command(BaseCommand):
+    help = ("Run every sales analytics view, EXPLAIN the queries it issues against "
+            "new_sales_data and report whether each one uses an index")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed-rows', type=int, default=0,
+                            help="First grow new_sales_data to this many rows")
+        parser.add_argument('--strict', action='store_true',
+                            help="Exit with an error if any query scans the table sequentially")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        if options['seed_rows']:
+            seed(options['seed_rows'], self.stdout)
+
+        factory = RequestFactory(SERVER_NAME='localhost')
+        report = []
+        for name, query in ROUTES:
+            path = reverse(name) + query
+            match = resolve(reverse(name))
+            cache.bump_data_version()  # make sure the view really hits the database
+            with CaptureQueriesContext(connection) as captured:
+                response = match.func(factory.get(path), *match.args, **match.kwargs)
+            if response.status_code != 200:
+                raise CommandError(f"{path} returned {response.status_code}")
+
+            for query_info in captured.captured_queries:
+                sql = query_info['sql']
+                if TABLE not in sql or not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                scans = explain(sql)
+                report.append({
+                    'view': name,
+                    'path': path,
+                    'sql': sql,
+                    'scans': [{'type': kind, 'index': index} for kind, index in scans],
+                    'uses_index': bool(scans) and all(kind in INDEX_NODES for kind, _ in scans),
+                })
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            for entry in report:
+                scans = ', '.join(
+                    f"{scan['type']}" + (f" using {scan['index']}" if scan['index'] else '')
+                    for scan in entry['scans']
+                )
+                style = self.style.SUCCESS if entry['uses_index'] else self.style.WARNING
+                self.stdout.write(style(f"{entry['view']:<20} {scans}"))
+
+        if options['strict'] and not all(entry['uses_index'] for entry in report):
+            raise CommandError("Some queries do not use an index")
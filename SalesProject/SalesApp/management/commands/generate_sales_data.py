@@ -0,0 +1,68 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from SalesApp.loaders import load_batches, truncate_sales
+from SalesApp.models import Product
+from SalesApp.synthetic import SAMPLE_PATH, SalesGenerator, SalesProfile, write_csv
+
+
+class Command(BaseCommand):
+    help = ("Generate realistic synthetic sales (and product) rows from the "
+            "distributions in data/sales_data.csv")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, required=True, help="Number of sales rows to generate")
+        parser.add_argument('--sample', default=SAMPLE_PATH, help="CSV to fit the distributions on")
+        parser.add_argument('--output', help="Write a CSV file instead of loading into the database")
+        parser.add_argument('--start', type=date.fromisoformat, help="First order date (YYYY-MM-DD)")
+        parser.add_argument('--end', type=date.fromisoformat, help="Last order date (YYYY-MM-DD)")
+        parser.add_argument('--seed', type=int, help="Random seed for reproducible datasets")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--method', choices=['bulk', 'copy'], default='bulk')
+        parser.add_argument('--truncate', action='store_true',
+                            help="Delete existing sales rows before loading")
+        parser.add_argument('--products', action='store_true',
+                            help="Also create Product rows for every generated product")
+
+    def handle(self, *args, **options):
+        if options['rows'] <= 0:
+            raise CommandError("--rows must be positive")
+
+        profile = SalesProfile.from_csv(options['sample'])
+        generator = SalesGenerator(
+            profile, options['rows'], start=options['start'], end=options['end'], seed=options['seed'],
+        )
+        self.stdout.write(
+            f"Generating {options['rows']} rows for {len(generator.customers)} customers "
+            f"and {len(generator.products)} products"
+        )
+
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+                write_csv(generator.iter_rows(), f)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+            return
+
+        if options['truncate']:
+            truncate_sales()
+
+        if options['products']:
+            with transaction.atomic():
+                Product.objects.bulk_create(
+                    [Product(**values) for values in generator.product_rows()],
+                    batch_size=options['batch_size'],
+                    ignore_conflicts=True,
+                )
+
+        def progress(loaded, elapsed):
+            rate = loaded / elapsed if elapsed else 0
+            self.stdout.write(f"{loaded} rows loaded ({rate:,.0f} rows/sec)")
+
+        loaded, elapsed = load_batches(
+            generator.iter_batches(options['batch_size']),
+            method=options['method'],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Loaded {loaded} rows in {elapsed:.2f}s"))
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from SalesApp.loaders import CSVRowError, load_csv, truncate_sales
+from SalesApp.models import NewSalesData
+
+
+class Command(BaseCommand):
+    help = "Stream a sales CSV (data/sales_data.csv format) into new_sales_data"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Path to the CSV file")
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help="Rows parsed and written per batch (default: 5000)")
+        parser.add_argument('--method', choices=['bulk', 'copy'], default='bulk',
+                            help="Write with bulk_create or PostgreSQL COPY (default: bulk)")
+        parser.add_argument('--encoding', default='cp1252',
+                            help="File encoding (default: cp1252, as exported by Excel)")
+        parser.add_argument('--skip-errors', action='store_true',
+                            help="Skip unparseable rows instead of aborting")
+        parser.add_argument('--truncate', action='store_true',
+                            help="Delete existing sales rows before loading")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError("--batch-size must be positive")
+
+        if options['truncate']:
+            self.stdout.write(f"Deleting {NewSalesData.objects.count()} existing rows")
+            truncate_sales()
+
+        errors = [] if options['skip_errors'] else None
+
+        def progress(loaded, elapsed):
+            rate = loaded / elapsed if elapsed else 0
+            self.stdout.write(f"{loaded} rows loaded ({rate:,.0f} rows/sec)")
+
+        try:
+            with open(options['path'], newline='', encoding=options['encoding']) as f:
+                loaded, elapsed = load_csv(
+                    f,
+                    batch_size=options['batch_size'],
+                    method=options['method'],
+                    errors=errors,
+                    progress=progress,
+                )
+        except (OSError, CSVRowError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for error in errors or []:
+            self.stderr.write(f"Skipped {error}")
+
+        rate = loaded / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {loaded} rows in {elapsed:.2f}s ({rate:,.0f} rows/sec)"
+        ))
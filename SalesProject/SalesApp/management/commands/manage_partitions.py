@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from SalesApp import cache, columnar, partitions, rollups
+from SalesApp.models import DailySalesSummary
+from SalesApp.sketches import month_end
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the monthly partitions of new_sales_data ahead of time, move rows out of the default "
+        "partition and detach (archive) or drop months older than --retain-months (PostgreSQL only)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ahead', type=int, default=partitions.CONFIG['MONTHS_AHEAD'],
+            help="Months of partitions to keep ready past the current one",
+        )
+        parser.add_argument(
+            '--retain-months', type=int, default=partitions.CONFIG['RETAIN_MONTHS'],
+            help="Detach the partitions of months more than this many months before the current one",
+        )
+        parser.add_argument(
+            '--drop', action='store_true',
+            help="Drop detached partitions instead of keeping them as archive tables",
+        )
+        parser.add_argument('--dry-run', action='store_true', help="Only show what would be done")
+
+    def handle(self, *args, **options):
+        if not partitions.is_partitioned():
+            raise CommandError("new_sales_data is not partitioned (PostgreSQL only, see migration 0014)")
+
+        current = timezone.now().date().replace(day=1)
+        last = partitions.add_months(current, options['ahead'])
+        attached = partitions.partitions()
+        first = min(attached, default=current)
+        # Months with rows waiting in the default partition, and the gaps
+        # up to the last month to have ready
+        wanted = set(partitions.default_months())
+        month = first
+        while month <= last:
+            wanted.add(month)
+            month = partitions.month_after(month)
+        to_create = sorted(wanted - set(attached))
+
+        to_detach = []
+        if options['retain_months'] is not None:
+            cutoff = partitions.add_months(current, -options['retain_months'])
+            to_detach = [month for month in attached if month < cutoff]
+            to_create = [month for month in to_create if month >= cutoff]
+
+        verb = 'Drop' if options['drop'] else 'Detach'
+        if options['dry_run']:
+            for month in to_create:
+                self.stdout.write(f"Create {partitions.partition_name(month)}")
+            for month in to_detach:
+                self.stdout.write(f"{verb} {attached[month]}")
+            return
+
+        for month in to_create:
+            partitions.create(month)
+        for month in to_detach:
+            partitions.detach(month, drop=options['drop'])
+            # The month's sales are gone from new_sales_data, so are its
+            # rollup rows and sketches
+            rollups.sales_changed(list(
+                DailySalesSummary.objects.filter(date__range=(month, month_end(month))).values_list('date', flat=True)
+            ))
+            # Rows left the table: the columnar copy has to reload, and
+            # cached responses are stale even for a month without rollup rows
+            columnar.sales_mutated()
+            cache.data_changed()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(to_create)} partitions, {'dropped' if options['drop'] else 'detached'} {len(to_detach)}"
+        ))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from SalesApp import forecast_store
+from SalesApp.forecast_tasks import PredictionError
+
+
+class Command(BaseCommand):
+    help = (
+        "Precompute the forecasts of the current models into forecast_points, "
+        "which the prediction endpoints answer from"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--granularity', action='append', choices=list(forecast_store.GRANULARITIES),
+                            dest='granularities', help="Granularity to materialize; repeat for several (default: all)")
+        parser.add_argument('--horizon', type=int,
+                            help="Steps to materialize (default: SALESAPP_FORECASTS['HORIZON'] per granularity)")
+        parser.add_argument('--force', action='store_true',
+                            help="Recompute even if the current model version is already materialized")
+
+    def handle(self, *args, **options):
+        if options['horizon'] is not None and options['horizon'] <= 0:
+            raise CommandError("--horizon must be positive")
+
+        for granularity in options['granularities'] or forecast_store.GRANULARITIES:
+            try:
+                result = forecast_store.materialize(granularity, horizon=options['horizon'], force=options['force'])
+            except PredictionError as e:
+                self.stdout.write(self.style.ERROR(f"{granularity}: {e}"))
+                continue
+
+            line = f"{granularity} ({result['model']}): {result['action']}"
+            if 'reason' in result:
+                line += f", {result['reason']}"
+            if 'version' in result:
+                line += f", version {result['version']}, {result['points']} steps"
+            if 'seconds' in result:
+                seconds = result['seconds']
+                line += f" [forecast {seconds['forecast']:.2f}s, write {seconds['write']:.2f}s]"
+            style = self.style.SUCCESS if result['action'] == 'materialized' else self.style.NOTICE
+            self.stdout.write(style(line))
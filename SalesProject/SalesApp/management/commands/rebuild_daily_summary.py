@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from SalesApp.rollups import rebuild_daily_summary
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily_sales_summary rollup from new_sales_data"
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        created = rebuild_daily_summary()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {created} daily summary rows in {time.perf_counter() - started:.2f}s"
+        ))
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from SalesApp import buckets, cache
+from SalesApp.rollups import rebuild_daily_summary
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute day_sales, week_sales, month_sales, avg_for_week and "
+        "avg_for_month of every sales row"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--skip-summary', action='store_true',
+            help="Use the daily_sales_summary rollup as it is instead of rebuilding it first",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if not options['skip_summary']:
+            created = rebuild_daily_summary()
+            self.stdout.write(f"Rebuilt {created} daily summary rows in {time.perf_counter() - started:.2f}s")
+
+        bucket_started = time.perf_counter()
+        days = buckets.rebuild()
+        cache.data_changed()
+        self.stdout.write(self.style.SUCCESS(
+            f"Recomputed the buckets of {days} days in {time.perf_counter() - bucket_started:.2f}s"
+        ))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from SalesApp import cache, distinct, sketches
+
+
+class Command(BaseCommand):
+    help = "Rebuild the top-K sales sketches and the distinct-count sketches of every day and month from new_sales_data"
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        created = sketches.rebuild()
+        counted = distinct.rebuild()
+        cache.data_changed()
+        self.stdout.write(self.style.SUCCESS(
+            f"Built {created} sales sketches and {counted} distinct-count sketches "
+            f"in {time.perf_counter() - started:.2f}s"
+        ))
@@ -0,0 +1,47 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from SalesApp import retraining
+
+
+class Command(BaseCommand):
+    help = (
+        "Update the SARIMA models with the sales recorded since they were trained "
+        "and install the new versions (meant to run hourly)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', action='append', choices=retraining.SARIMA_MODELS, dest='models',
+                            help="Model to refresh; repeat for several (default: all SARIMA models)")
+        parser.add_argument('--full', action='store_true',
+                            help="Refit from scratch instead of appending the new periods")
+        parser.add_argument('--through',
+                            help="Last day (YYYY-MM-DD) whose sales are complete (default: the last day with sales)")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Compute the update but do not write or install it")
+
+    def handle(self, *args, **options):
+        through = None
+        if options['through']:
+            try:
+                through = date.fromisoformat(options['through'])
+            except ValueError:
+                raise CommandError("--through must be a date in YYYY-MM-DD format")
+
+        results = retraining.refresh(
+            options['models'], full=options['full'], through=through, dry_run=options['dry_run'],
+        )
+        for result in results:
+            timings = ', '.join(f"{step} {seconds:.2f}s" for step, seconds in result.seconds.items())
+            line = f"{result.name}: {result.action}"
+            if result.reason:
+                line += f" ({result.reason})"
+            if result.action in ('append', 'full', 'unchanged'):
+                line += f", {result.nobs} observations through {result.last_observation}"
+            if result.version:
+                line += f", version {result.version}"
+            if timings:
+                line += f" [{timings}; total {result.total_seconds:.2f}s]"
+            style = self.style.SUCCESS if result.action in ('append', 'full') else self.style.NOTICE
+            self.stdout.write(style(line))
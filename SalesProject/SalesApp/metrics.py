@@ -0,0 +1,313 @@
+"""
+Request and inference metrics, exposed in Prometheus text format at
+``/api/metrics/``.
+
+``MetricsMiddleware`` labels every request with its URL route (the pattern
+from ``SalesApp/urls.py``, so ids in paths do not multiply the series) and
+records its count and latency. A ``SAMPLE_RATE`` share of requests is also
+broken down into the number and duration of their database queries, the
+time spent rendering the response and the time spent waiting for
+forecasts; those need a hook around every query and render, so they are
+sampled to keep the overhead low when the metrics stay on under load.
+Forecast execution times (``get_forecast``/``predict`` in the inference
+workers) are recorded for every task.
+
+Like the local-memory cache, the metrics are per server process: scrape
+every process, or run one process per container. Configure with the
+``SALESAPP_METRICS`` setting.
+"""
+import contextvars
+import random
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+DEFAULTS = {
+    'ENABLED': True,
+    # Share of requests whose DB, serialization and inference time is recorded
+    'SAMPLE_RATE': 1.0,
+}
+
+CONFIG = {**DEFAULTS, **getattr(settings, 'SALESAPP_METRICS', {})}
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield self.name, dict(zip(self.labels, labels)), value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (the last one is +Inf), sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            values = {labels: (list(counts), total) for labels, (counts, total) in self._values.items()}
+        for labels, (counts, total) in sorted(values.items()):
+            base = dict(zip(self.labels, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield f'{self.name}_bucket', {**base, 'le': _format(bound)}, cumulative
+            yield f'{self.name}_sum', base, total
+            yield f'{self.name}_count', base, cumulative
+
+
+requests_total = Counter(
+    'salesapp_http_requests_total', "Requests handled, by route, method and status code",
+    ('route', 'method', 'status'),
+)
+request_seconds = Histogram(
+    'salesapp_http_request_duration_seconds', "Request latency from middleware to response",
+    ('route', 'method'),
+)
+sampled_total = Counter(
+    'salesapp_http_requests_sampled_total', "Requests broken down into DB, serialization and inference time",
+    ('route',),
+)
+db_queries = Histogram(
+    'salesapp_http_request_db_queries', "Database queries per sampled request",
+    ('route',), buckets=QUERY_COUNT_BUCKETS,
+)
+db_seconds = Histogram(
+    'salesapp_http_request_db_seconds', "Time in database queries per sampled request", ('route',),
+)
+serialization_seconds = Histogram(
+    'salesapp_http_request_serialization_seconds', "Time rendering the response body per sampled request",
+    ('route',),
+)
+inference_seconds = Histogram(
+    'salesapp_http_request_inference_seconds',
+    "Time waiting for forecasts (queue, transfer and execution) per sampled request", ('route',),
+)
+inference_task_seconds = Histogram(
+    'salesapp_inference_task_seconds', "Forecast task execution time in the inference workers",
+    ('task',),
+)
+
+REGISTRY = [
+    requests_total, request_seconds, sampled_total, db_queries, db_seconds,
+    serialization_seconds, inference_seconds, inference_task_seconds,
+]
+
+
+# Per-request breakdown
+
+class _Sample:
+    __slots__ = ('queries', 'db', 'serialization', 'inference', 'lock')
+
+    def __init__(self):
+        self.queries = 0
+        self.db = self.serialization = self.inference = 0.0
+        # Async views query from several threads at once
+        self.lock = threading.Lock()
+
+    def add(self, field, seconds):
+        with self.lock:
+            setattr(self, field, getattr(self, field) + seconds)
+            if field == 'db':
+                self.queries += 1
+
+
+_sample = contextvars.ContextVar('salesapp_metrics_sample', default=None)
+
+
+def record(field, seconds):
+    """Add ``seconds`` of ``'serialization'`` or ``'inference'`` to the request being sampled, if any."""
+    sample = _sample.get()
+    if sample is not None:
+        sample.add(field, seconds)
+
+
+class timed:
+    """Context manager adding its duration to ``field`` of the request being sampled."""
+
+    def __init__(self, field):
+        self.field = field
+
+    def __enter__(self):
+        self.sample = _sample.get()
+        if self.sample is not None:
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.sample is not None:
+            self.sample.add(self.field, time.perf_counter() - self.started)
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    sample = _sample.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sample.add('db', time.perf_counter() - started)
+
+
+def _instrument_connection(sender, connection, **kwargs):
+    if _query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_query_wrapper)
+
+
+def install():
+    """Time the queries of sampled requests on every database connection."""
+    if not CONFIG['ENABLED']:
+        return
+    connection_created.connect(_instrument_connection, dispatch_uid='salesapp-metrics')
+    for connection in connections.all(initialized_only=True):
+        _instrument_connection(None, connection)
+
+
+def observe_inference(task, exec_seconds, total_seconds):
+    """
+    Record a forecast: ``exec_seconds`` it ran in a worker (None if it
+    failed or timed out) and ``total_seconds`` the request waited for it.
+    """
+    if not CONFIG['ENABLED']:
+        return
+    if exec_seconds is not None:
+        inference_task_seconds.observe(exec_seconds, task)
+    record('inference', total_seconds)
+
+
+# Middleware
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.route if match is not None else 'unmatched'
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def _start(self):
+        sample = _Sample() if random.random() < CONFIG['SAMPLE_RATE'] else None
+        return _sample.set(sample), sample, time.perf_counter()
+
+    def _finish(self, request, response, token, sample, started):
+        elapsed = time.perf_counter() - started
+        _sample.reset(token)
+        route = _route(request)
+        requests_total.inc(route, request.method, str(response.status_code))
+        request_seconds.observe(elapsed, route, request.method)
+        if sample is not None:
+            sampled_total.inc(route)
+            db_queries.observe(sample.queries, route)
+            db_seconds.observe(sample.db, route)
+            serialization_seconds.observe(sample.serialization, route)
+            inference_seconds.observe(sample.inference, route)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not CONFIG['ENABLED']:
+            return self.get_response(request)
+        token, sample, started = self._start()
+        response = self.get_response(request)
+        self._finish(request, response, token, sample, started)
+        return response
+
+    async def __acall__(self, request):
+        if not CONFIG['ENABLED']:
+            return await self.get_response(request)
+        token, sample, started = self._start()
+        response = await self.get_response(request)
+        self._finish(request, response, token, sample, started)
+        return response
+
+
+# Exposition
+
+def _format(value):
+    return '+Inf' if value == float('inf') else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _line(name, labels, value):
+    if labels:
+        pairs = ','.join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+        return f'{name}{{{pairs}}} {_format(value)}'
+    return f'{name} {_format(value)}'
+
+
+def _gauges():
+    from . import inference
+
+    stats = inference.pool.stats()
+    return [
+        ('salesapp_inference_in_flight', "Forecasts submitted to the inference pool and not finished",
+         stats['in_flight']),
+        ('salesapp_inference_queue_depth', "Forecasts waiting for a free inference worker",
+         stats['queue_depth']),
+    ]
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(_line(*sample) for sample in metric.samples())
+    for name, help, value in _gauges():
+        lines.append(f'# HELP {name} {help}')
+        lines.append(f'# TYPE {name} gauge')
+        lines.append(_line(name, {}, value))
+    return '\n'.join(lines) + '\n'
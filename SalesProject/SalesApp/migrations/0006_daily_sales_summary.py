@@ -0,0 +1,60 @@
+# Generated by Django 5.1.2 on 2026-10-18 10:05
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_daily_summary(apps, schema_editor):
+    NewSalesData = apps.get_model('SalesApp', 'NewSalesData')
+    DailySalesSummary = apps.get_model('SalesApp', 'DailySalesSummary')
+    totals = (
+        NewSalesData.objects
+        .values('order_date')
+        .annotate(
+            total_sales=Sum('sales'),
+            total_profit=Sum('profit'),
+            total_quantity=Sum('quantity'),
+            order_count=Count('id'),
+        )
+        .order_by('order_date')
+    )
+    DailySalesSummary.objects.bulk_create(
+        [
+            DailySalesSummary(
+                date=row['order_date'],
+                total_sales=row['total_sales'],
+                total_profit=row['total_profit'],
+                total_quantity=row['total_quantity'],
+                order_count=row['order_count'],
+            )
+            for row in totals.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SalesApp', '0005_rename_current_price_product_price_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('total_sales', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('total_profit', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('total_quantity', models.IntegerField()),
+                ('order_count', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'daily_sales_summary',
+                'ordering': ['date'],
+                'managed': True,
+            },
+        ),
+        migrations.RunPython(backfill_daily_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.2 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SalesApp', '0006_daily_sales_summary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='newsalesdata',
+            index=models.Index(fields=['order_date', 'id'], include=('sales', 'profit', 'quantity'), name='nsd_order_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='newsalesdata',
+            index=models.Index(fields=['customer_name', 'sales'], name='nsd_customer_sales_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='newsalesdata',
+            index=models.Index(fields=['product_name', 'sales'], name='nsd_product_sales_idx'),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.1.2 on 2026-10-18 10:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SalesApp', '0007_new_sales_data_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Customer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customer_id', models.CharField(max_length=20, unique=True)),
+                ('customer_name', models.CharField(max_length=100)),
+                ('segment', models.CharField(max_length=50)),
+            ],
+            options={
+                'db_table': 'customers',
+                'managed': True,
+            },
+        ),
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('country', models.CharField(max_length=100)),
+                ('city', models.CharField(max_length=100)),
+                ('state', models.CharField(max_length=100)),
+                ('postal_code', models.CharField(max_length=20)),
+                ('region', models.CharField(max_length=50)),
+            ],
+            options={
+                'db_table': 'locations',
+                'managed': True,
+                'constraints': [models.UniqueConstraint(fields=('country', 'state', 'city', 'postal_code', 'region'), name='location_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SalesProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.CharField(max_length=20, unique=True)),
+                ('product_name', models.CharField(max_length=200)),
+                ('category', models.CharField(max_length=50)),
+                ('sub_category', models.CharField(max_length=50)),
+                ('catalogue', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sales_products', to='SalesApp.product')),
+            ],
+            options={
+                'db_table': 'sales_products',
+                'managed': True,
+            },
+        ),
+        # Nullable until 0009 has filled them in; the *_ref names avoid the
+        # existing customer_id / product_id columns and are renamed in 0010
+        migrations.AddField(
+            model_name='newsalesdata',
+            name='customer_ref',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='sales', to='SalesApp.customer'),
+        ),
+        migrations.AddField(
+            model_name='newsalesdata',
+            name='location',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='sales', to='SalesApp.location'),
+        ),
+        migrations.AddField(
+            model_name='newsalesdata',
+            name='product_ref',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='sales', to='SalesApp.salesproduct'),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.1.2 on 2026-10-18 10:33
+
+from django.db import migrations
+from django.db.models import Min, OuterRef, Subquery
+
+CUSTOMER_FIELDS = ['customer_id', 'customer_name', 'segment']
+LOCATION_FIELDS = ['country', 'city', 'state', 'postal_code', 'region']
+PRODUCT_FIELDS = ['product_id', 'product_name', 'category', 'sub_category']
+
+
+def _first_rows(NewSalesData, key, fields):
+    """The earliest row (lowest id) for every distinct ``key``."""
+    first_ids = list(
+        NewSalesData.objects.values(key).annotate(first=Min('id')).order_by().values_list('first', flat=True)
+    )
+    for start in range(0, len(first_ids), 1000):
+        yield from NewSalesData.objects.filter(id__in=first_ids[start:start + 1000]).values(*fields)
+
+
+def backfill_dimensions(apps, schema_editor):
+    NewSalesData = apps.get_model('SalesApp', 'NewSalesData')
+    Customer = apps.get_model('SalesApp', 'Customer')
+    Location = apps.get_model('SalesApp', 'Location')
+    SalesProduct = apps.get_model('SalesApp', 'SalesProduct')
+    Product = apps.get_model('SalesApp', 'Product')
+
+    Customer.objects.bulk_create(
+        [Customer(**row) for row in _first_rows(NewSalesData, 'customer_id', CUSTOMER_FIELDS)],
+        batch_size=1000, ignore_conflicts=True,
+    )
+    Location.objects.bulk_create(
+        [Location(**row) for row in NewSalesData.objects.values(*LOCATION_FIELDS).distinct().order_by()],
+        batch_size=1000, ignore_conflicts=True,
+    )
+    # A product id that appears with several names takes the name of its
+    # earliest row. The catalogue (Product) is only linked to, never added to.
+    SalesProduct.objects.bulk_create(
+        [SalesProduct(**row) for row in _first_rows(NewSalesData, 'product_id', PRODUCT_FIELDS)],
+        batch_size=1000, ignore_conflicts=True,
+    )
+    SalesProduct.objects.update(
+        catalogue=Subquery(Product.objects.filter(product_id=OuterRef('product_id')).values('pk')[:1]),
+    )
+
+    NewSalesData.objects.update(
+        customer_ref=Subquery(Customer.objects.filter(customer_id=OuterRef('customer_id')).values('pk')[:1]),
+        location=Subquery(
+            Location.objects.filter(**{field: OuterRef(field) for field in LOCATION_FIELDS}).values('pk')[:1]
+        ),
+        product_ref=Subquery(SalesProduct.objects.filter(product_id=OuterRef('product_id')).values('pk')[:1]),
+    )
+
+
+def restore_columns(apps, schema_editor):
+    NewSalesData = apps.get_model('SalesApp', 'NewSalesData')
+    Customer = apps.get_model('SalesApp', 'Customer')
+    Location = apps.get_model('SalesApp', 'Location')
+    SalesProduct = apps.get_model('SalesApp', 'SalesProduct')
+
+    def lookup(model, ref, field):
+        return Subquery(model.objects.filter(pk=OuterRef(ref)).values(field)[:1])
+
+    NewSalesData.objects.update(
+        **{field: lookup(Customer, 'customer_ref', field) for field in CUSTOMER_FIELDS},
+        **{field: lookup(Location, 'location', field) for field in LOCATION_FIELDS},
+        **{field: lookup(SalesProduct, 'product_ref', field) for field in PRODUCT_FIELDS},
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SalesApp', '0008_customer_location'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_dimensions, restore_columns),
+    ]
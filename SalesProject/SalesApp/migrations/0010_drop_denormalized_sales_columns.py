@@ -0,0 +1,134 @@
+# Generated by Django 5.1.2 on 2026-10-18 10:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+# The flat columns dropped below, as 0001_initial created them
+FLAT_COLUMNS = {
+    'customer_ref': {'customer_id': 20, 'customer_name': 100, 'segment': 50},
+    'location': {'country': 100, 'city': 100, 'state': 100, 'postal_code': 20, 'region': 50},
+    'product_ref': {'product_id': 20, 'category': 50, 'sub_category': 50, 'product_name': 200},
+}
+DIMENSIONS = {'customer_ref': 'Customer', 'location': 'Location', 'product_ref': 'SalesProduct'}
+
+
+def restore_columns(apps, schema_editor):
+    """Fill the re-added flat columns from the dimension rows when reversing."""
+    NewSalesData = apps.get_model('SalesApp', 'NewSalesData')
+    NewSalesData.objects.update(**{
+        field: Subquery(
+            apps.get_model('SalesApp', DIMENSIONS[ref]).objects.filter(pk=OuterRef(ref)).values(field)[:1]
+        )
+        for ref, fields in FLAT_COLUMNS.items() for field in fields
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SalesApp', '0009_backfill_dimensions'),
+    ]
+
+    operations = [
+        # Reversing re-adds the flat columns empty, so they are nullable until
+        # restore_columns has filled them from the dimension tables
+        *[
+            migrations.AlterField(
+                model_name='newsalesdata',
+                name=field,
+                field=models.CharField(max_length=max_length, null=True),
+            )
+            for fields in FLAT_COLUMNS.values() for field, max_length in fields.items()
+        ],
+        migrations.RunPython(migrations.RunPython.noop, restore_columns),
+        migrations.RemoveIndex(
+            model_name='newsalesdata',
+            name='nsd_customer_sales_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='newsalesdata',
+            name='nsd_product_sales_idx',
+        ),
+        migrations.RemoveField(
+            model_name='newsalesdata',
+            name='category',
+        ),
+        migrations.RemoveField(
+            model_name='newsalesdata',
+            name='city',
+        ),
+        migrations.RemoveField(
+            model_name='newsalesdata',
+            name='country',
+        ),
+        migrations.RemoveField(
+            model_name='newsalesdata',
+            name='customer_id',
+        ),
+        migrations.RemoveField(
+            model_name='newsalesdata',
+            name='customer_name',
+        ),
+        migrations.RemoveField(
+            model_name='newsalesdata',
+            name='postal_code',
+        ),
+        migrations.RemoveField(
+            model_name='newsalesdata',
+            name='product_id',
+        ),
+        migrations.RemoveField(
+            model_name='newsalesdata',
+            name='product_name',
+        ),
+        migrations.RemoveField(
+            model_name='newsalesdata',
+            name='region',
+        ),
+        migrations.RemoveField(
+            model_name='newsalesdata',
+            name='segment',
+        ),
+        migrations.RemoveField(
+            model_name='newsalesdata',
+            name='state',
+        ),
+        migrations.RemoveField(
+            model_name='newsalesdata',
+            name='sub_category',
+        ),
+        migrations.RenameField(
+            model_name='newsalesdata',
+            old_name='customer_ref',
+            new_name='customer',
+        ),
+        migrations.RenameField(
+            model_name='newsalesdata',
+            old_name='product_ref',
+            new_name='product',
+        ),
+        migrations.AlterField(
+            model_name='newsalesdata',
+            name='customer',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='sales', to='SalesApp.customer'),
+        ),
+        migrations.AlterField(
+            model_name='newsalesdata',
+            name='location',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='sales', to='SalesApp.location'),
+        ),
+        migrations.AlterField(
+            model_name='newsalesdata',
+            name='product',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='sales', to='SalesApp.salesproduct'),
+        ),
+        migrations.AddIndex(
+            model_name='newsalesdata',
+            index=models.Index(fields=['customer', 'sales'], name='nsd_customer_sales_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='newsalesdata',
+            index=models.Index(fields=['product', 'sales'], name='nsd_product_sales_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.2 on 2026-10-18 10:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SalesApp', '0010_drop_denormalized_sales_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ForecastPoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly')], max_length=10)),
+                ('model_version', models.CharField(max_length=64)),
+                ('origin', models.DateField()),
+                ('step', models.IntegerField()),
+                ('target_date', models.DateField()),
+                ('yhat', models.FloatField()),
+                ('yhat_lower', models.FloatField()),
+                ('yhat_upper', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'forecast_points',
+                'ordering': ['granularity', 'step'],
+                'managed': True,
+                'constraints': [models.UniqueConstraint(fields=('granularity', 'model_version', 'step'), name='forecast_point_unique')],
+            },
+        ),
+    ]
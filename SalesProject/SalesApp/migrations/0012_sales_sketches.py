@@ -0,0 +1,31 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SalesApp', '0011_forecast_points'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('customer', 'Customer'), ('product', 'Product')], max_length=10)),
+                ('granularity', models.CharField(choices=[('day', 'Day'), ('month', 'Month')], max_length=10)),
+                ('date', models.DateField()),
+                ('counters', models.JSONField()),
+                ('error', models.BigIntegerField()),
+                ('total', models.BigIntegerField()),
+            ],
+            options={
+                'db_table': 'sales_sketches',
+                'ordering': ['dimension', 'granularity', 'date'],
+                'managed': True,
+                'constraints': [models.UniqueConstraint(fields=('dimension', 'granularity', 'date'), name='sales_sketch_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SalesApp', '0012_sales_sketches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DistinctSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target', models.CharField(choices=[('customer', 'Customer'), ('product', 'Product')], max_length=10)),
+                ('grouping', models.CharField(choices=[('all', 'All'), ('region', 'Region'), ('state', 'State'), ('category', 'Category'), ('segment', 'Segment')], max_length=10)),
+                ('granularity', models.CharField(choices=[('day', 'Day'), ('month', 'Month')], max_length=10)),
+                ('date', models.DateField()),
+                ('groups', models.JSONField()),
+                ('registers', models.BinaryField()),
+                ('orders', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'distinct_sketches',
+                'ordering': ['target', 'grouping', 'granularity', 'date'],
+                'managed': True,
+                'constraints': [models.UniqueConstraint(fields=('target', 'grouping', 'granularity', 'date'), name='distinct_sketch_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,108 @@
+# Generated by Django 5.1.2 on 2026-10-18 13:20
+
+from datetime import date
+
+from django.db import migrations
+
+TABLE = 'new_sales_data'
+
+# Months of partitions created past the last sale (later ones come from
+# `manage.py manage_partitions`; until then rows land in the default partition)
+MONTHS_AHEAD = 3
+
+
+def _month_after(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _definitions(cursor):
+    """CREATE INDEX statements and foreign key constraints of the table, but not its primary key."""
+    cursor.execute(
+        "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s "
+        "AND indexname <> %s",
+        [TABLE, f'{TABLE}_pkey'],
+    )
+    # Indexes of a partitioned table are defined ON ONLY the parent
+    indexes = [row[0].replace(' ON ONLY ', ' ON ') for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype = 'f'",
+        [TABLE],
+    )
+    return indexes, cursor.fetchall()
+
+
+def _is_partitioned(cursor):
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass", [TABLE])
+    return cursor.fetchone()[0] == 'p'
+
+
+def _rebuild(cursor, partitioned):
+    """Copy the table into a new, partitioned (or plain) one under the same name, with the same indexes."""
+    indexes, foreign_keys = _definitions(cursor)
+    old = f'{TABLE}_old'
+    cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {old}')
+    cursor.execute(
+        f'CREATE TABLE {TABLE} (LIKE {old} INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING STORAGE)'
+        + (' PARTITION BY RANGE (order_date)' if partitioned else '')
+    )
+
+    if partitioned:
+        cursor.execute(f'SELECT MIN(order_date), MAX(order_date) FROM {old}')
+        first, last = cursor.fetchone()
+        today = date.today()
+        month = min(first or today, today).replace(day=1)
+        end = max(last or today, today).replace(day=1)
+        for _ in range(MONTHS_AHEAD):
+            end = _month_after(end)
+        while month <= end:
+            following = _month_after(month)
+            cursor.execute(
+                f'CREATE TABLE {TABLE}_p{month:%Y_%m} PARTITION OF {TABLE} '
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+            )
+            month = following
+        cursor.execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+
+    cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {old}')
+    cursor.execute(f'DROP TABLE {old} CASCADE')
+
+    # The partition key has to be part of the primary key
+    key = 'id, order_date' if partitioned else 'id'
+    cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY ({key})')
+    for index in indexes:
+        cursor.execute(index)
+    for name, definition in foreign_keys:
+        cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}')
+    cursor.execute(
+        f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {TABLE}"
+    )
+    cursor.execute(f'ANALYZE {TABLE}')
+
+
+def partition(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if not _is_partitioned(cursor):
+            _rebuild(cursor, partitioned=True)
+
+
+def unpartition(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if _is_partitioned(cursor):
+            _rebuild(cursor, partitioned=False)
+
+
+# Range-partitions new_sales_data by order_date month on PostgreSQL; other
+# databases keep the plain table. The model is unchanged.
+class Migration(migrations.Migration):
+    dependencies = [
+        ('SalesApp', '0013_distinct_sketches'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
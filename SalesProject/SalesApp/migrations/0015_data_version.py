@@ -0,0 +1,32 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:42
+
+import time
+
+from django.db import migrations, models
+
+
+def create_version(apps, schema_editor):
+    # Millisecond clock, as SalesApp.cache starts the counter
+    apps.get_model('SalesApp', 'DataVersion').objects.create(pk=1, version=int(time.time() * 1000))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SalesApp', '0014_partition_new_sales_data'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField()),
+            ],
+            options={
+                'db_table': 'data_version',
+                'managed': True,
+            },
+        ),
+        migrations.RunPython(create_version, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,211 @@
+"""
+Lazy, thread-safe registry for the forecasting models in saved_models/.
+
+Models are loaded on first use, shared by every caller in the process, and
+reloaded when the artifact on disk changes (mtime first, then content hash,
+so a touched-but-identical file is not reloaded). A reload builds the new
+entry completely before swapping it in, so readers never see a half-loaded
+model and keep using the previous one until the swap.
+
+This module does not depend on Django so it can be used from worker
+processes as well.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import joblib
+
+logger = logging.getLogger(__name__)
+
+MODELS_DIR = Path(__file__).resolve().parent / 'saved_models'
+
+MODEL_FILES = {
+    'monthly_sarima': 'sarima_monthly_sales_model.joblib',
+    'weekly_sarima': 'weekly_sales_model.joblib',
+    'daily_prophet': 'daily_sales_model.joblib',
+}
+
+# Seconds between stat() calls on an artifact to look for a newer version
+CHECK_INTERVAL = 5.0
+
+
+def _rss_bytes():
+    """Resident set size of this process (best effort)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@dataclass
+class LoadedModel:
+    name: str
+    path: Path
+    model: object = None
+    version: str = None
+    mtime: float = None
+    file_hash: str = None
+    file_size: int = 0
+    load_seconds: float = 0.0
+    resident_bytes: int = 0
+    loaded_at: float = None
+    error: str = None
+    checked_at: float = field(default_factory=time.monotonic)
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'path': str(self.path),
+            'loaded': self.model is not None,
+            'version': self.version,
+            'file_size': self.file_size,
+            'load_seconds': round(self.load_seconds, 4),
+            'resident_bytes': self.resident_bytes,
+            'loaded_at': self.loaded_at,
+            'error': self.error,
+        }
+
+
+class ModelRegistry:
+    def __init__(self, directory=MODELS_DIR, files=None, check_interval=CHECK_INTERVAL):
+        self.directory = Path(directory)
+        self.files = dict(MODEL_FILES if files is None else files)
+        self.check_interval = check_interval
+        self._entries = {}
+        self._locks = {name: threading.Lock() for name in self.files}
+        # name -> (mtime, size, version, checked_at) of the artifact on disk
+        self._artifacts = {}
+
+    def path(self, name):
+        return self.directory / self.files[name]
+
+    def entry(self, name):
+        """Return the current ``LoadedModel`` for ``name``, loading it if needed."""
+        if name not in self.files:
+            raise KeyError(f"Unknown model {name!r}")
+        entry = self._entries.get(name)
+        if entry is None or self._needs_check(entry):
+            entry = self._refresh(name)
+        return entry
+
+    def get(self, name):
+        """Return the model object, or None if its artifact could not be loaded."""
+        return self.entry(name).model
+
+    def get_with_version(self, name):
+        entry = self.entry(name)
+        return entry.model, entry.version
+
+    def artifact_version(self, name):
+        """
+        Version of the artifact on disk without loading it (the same content
+        hash prefix a loaded entry reports), or None if there is no artifact.
+        """
+        cached = self._artifacts.get(name)
+        now = time.monotonic()
+        if cached is not None and now - cached[3] < self.check_interval:
+            return cached[2]
+        try:
+            stat = self.path(name).stat()
+        except OSError:
+            self._artifacts[name] = (None, None, None, now)
+            return None
+        if cached is not None and (stat.st_mtime, stat.st_size) == cached[:2]:
+            version = cached[2]
+        else:
+            version = _file_hash(self.path(name))[:12]
+        self._artifacts[name] = (stat.st_mtime, stat.st_size, version, now)
+        return version
+
+    def reload(self, name):
+        """Force a reload from disk regardless of mtime/hash."""
+        with self._locks[name]:
+            self._entries[name] = self._load(name)
+            return self._entries[name]
+
+    def stats(self):
+        """Load statistics for every registered model, without loading anything."""
+        stats = {}
+        for name in self.files:
+            entry = self._entries.get(name)
+            stats[name] = entry.as_dict() if entry else {
+                'name': name, 'path': str(self.path(name)), 'loaded': False,
+            }
+        return stats
+
+    def _needs_check(self, entry):
+        return time.monotonic() - entry.checked_at >= self.check_interval
+
+    def _refresh(self, name):
+        with self._locks[name]:
+            entry = self._entries.get(name)
+            # Another thread may have refreshed it while we waited
+            if entry is not None and not self._needs_check(entry):
+                return entry
+
+            path = self.path(name)
+            try:
+                stat = path.stat()
+            except OSError:
+                stat = None
+
+            if entry is not None and stat is not None and entry.model is not None:
+                if stat.st_mtime == entry.mtime and stat.st_size == entry.file_size:
+                    entry.checked_at = time.monotonic()
+                    return entry
+                if _file_hash(path) == entry.file_hash:
+                    entry.mtime = stat.st_mtime
+                    entry.checked_at = time.monotonic()
+                    return entry
+
+            new_entry = self._load(name)
+            # Keep serving the previous model if the new artifact is broken
+            if new_entry.model is None and entry is not None and entry.model is not None and stat is not None:
+                entry.error = new_entry.error
+                entry.checked_at = time.monotonic()
+                return entry
+            self._entries[name] = new_entry
+            return new_entry
+
+    def _load(self, name):
+        path = self.path(name)
+        entry = LoadedModel(name=name, path=path)
+        try:
+            stat = path.stat()
+            file_hash = _file_hash(path)
+            rss_before = _rss_bytes()
+            started = time.perf_counter()
+            model = joblib.load(path)
+            entry.load_seconds = time.perf_counter() - started
+            entry.resident_bytes = max(_rss_bytes() - rss_before, 0)
+        except Exception as e:
+            entry.error = str(e)
+            logger.warning("Could not load model %s from %s: %s", name, path, e)
+            return entry
+
+        entry.model = model
+        entry.mtime = stat.st_mtime
+        entry.file_size = stat.st_size
+        entry.file_hash = file_hash
+        entry.version = file_hash[:12]
+        entry.loaded_at = time.time()
+        logger.info("Loaded model %s (%s) in %.2fs", name, entry.version, entry.load_seconds)
+        return entry
+
+
+registry = ModelRegistry()
@@ -1,19 +1,67 @@
 from django.db import models
 
-class NewSalesData(models.Model):
-    order_date = models.DateField()
-    customer_id = models.CharField(max_length=20)
+class Customer(models.Model):
+    customer_id = models.CharField(max_length=20, unique=True)
     customer_name = models.CharField(max_length=100)
     segment = models.CharField(max_length=50)
+
+    def __str__(self):
+        return self.customer_name
+
+    class Meta:
+        db_table = 'customers'
+        managed = True
+
+
+class Location(models.Model):
     country = models.CharField(max_length=100)
     city = models.CharField(max_length=100)
     state = models.CharField(max_length=100)
     postal_code = models.CharField(max_length=20)
     region = models.CharField(max_length=50)
-    product_id = models.CharField(max_length=20)
+
+    def __str__(self):
+        return f"{self.city}, {self.state} {self.postal_code}"
+
+    class Meta:
+        db_table = 'locations'
+        managed = True
+        constraints = [
+            models.UniqueConstraint(
+                fields=['country', 'state', 'city', 'postal_code', 'region'], name='location_unique',
+            ),
+        ]
+
+
+class SalesProduct(models.Model):
+    """
+    A product as recorded on sales, kept apart from the user-facing
+    catalogue. ``catalogue`` points at the Product of the same id when one
+    was already listed; recording a sale never adds to the catalogue.
+    """
+    product_id = models.CharField(max_length=20, unique=True)
+    product_name = models.CharField(max_length=200)
     category = models.CharField(max_length=50)
     sub_category = models.CharField(max_length=50)
-    product_name = models.CharField(max_length=200)
+    catalogue = models.ForeignKey(
+        'Product', on_delete=models.SET_NULL, null=True, blank=True, related_name='sales_products',
+    )
+
+    def __str__(self):
+        return self.product_name
+
+    class Meta:
+        db_table = 'sales_products'
+        managed = True
+
+
+class NewSalesData(models.Model):
+    order_date = models.DateField()
+    # The composite indexes below lead with customer and product, so the
+    # foreign keys do not need indexes of their own
+    customer = models.ForeignKey(Customer, on_delete=models.PROTECT, related_name='sales', db_index=False)
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='sales')
+    product = models.ForeignKey(SalesProduct, on_delete=models.PROTECT, related_name='sales', db_index=False)
     sales = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.IntegerField()
     discount = models.DecimalField(max_digits=4, decimal_places=2)
@@ -25,12 +73,21 @@ class NewSalesData(models.Model):
     day_sales = models.DecimalField(max_digits=10, decimal_places=4)
 
     def __str__(self):
-        return f"{self.order_date} - {self.customer_name} - {self.product_name}"
+        return f"{self.order_date} - {self.customer.customer_name} - {self.product.product_name}"
 
     class Meta:
         db_table = 'new_sales_data'
         ordering = ['-order_date']
         managed = True
+        indexes = [
+            # Date filters, keyset pagination and the daily rollup refresh;
+            # INCLUDE lets PostgreSQL answer the sums from the index alone
+            models.Index(fields=['order_date', 'id'], include=['sales', 'profit', 'quantity'],
+                         name='nsd_order_date_id_idx'),
+            # Per-customer / per-product sales totals and rankings
+            models.Index(fields=['customer', 'sales'], name='nsd_customer_sales_idx'),
+            models.Index(fields=['product', 'sales'], name='nsd_product_sales_idx'),
+        ]
 
 
 class Product(models.Model):
@@ -47,3 +104,138 @@ class Product(models.Model):
     class Meta:
         db_table = 'products'  # This ensures the table is named 'products' in PostgreSQL
         managed = True  # Django will manage this table
+
+
+class DailySalesSummary(models.Model):
+    """Per-day rollup of new_sales_data, maintained by SalesApp.rollups."""
+    date = models.DateField(unique=True)
+    total_sales = models.DecimalField(max_digits=14, decimal_places=2)
+    total_profit = models.DecimalField(max_digits=14, decimal_places=2)
+    total_quantity = models.IntegerField()
+    order_count = models.IntegerField()
+
+    def __str__(self):
+        return f"{self.date} - {self.total_sales}"
+
+    class Meta:
+        db_table = 'daily_sales_summary'
+        ordering = ['date']
+        managed = True
+
+
+class ForecastPoint(models.Model):
+    """
+    One precomputed forecast step of a model version, written by
+    SalesApp.forecast_store and read by the prediction endpoints.
+    """
+    GRANULARITY_CHOICES = [('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly')]
+
+    granularity = models.CharField(max_length=10, choices=GRANULARITY_CHOICES)
+    model_version = models.CharField(max_length=64)
+    # Last date the model was trained on; ``step`` counts periods after it
+    origin = models.DateField()
+    step = models.IntegerField()
+    target_date = models.DateField()
+    yhat = models.FloatField()
+    yhat_lower = models.FloatField()
+    yhat_upper = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.granularity} {self.target_date} - {self.yhat:.2f} ({self.model_version})"
+
+    class Meta:
+        db_table = 'forecast_points'
+        ordering = ['granularity', 'step']
+        managed = True
+        constraints = [
+            # Also the index behind every endpoint lookup
+            models.UniqueConstraint(fields=['granularity', 'model_version', 'step'], name='forecast_point_unique'),
+        ]
+
+
+class SalesSketch(models.Model):
+    """
+    Top-K summary of sales per customer or product for one day or month,
+    maintained by SalesApp.sketches.
+    """
+    GRANULARITY_CHOICES = [('day', 'Day'), ('month', 'Month')]
+    DIMENSION_CHOICES = [('customer', 'Customer'), ('product', 'Product')]
+
+    dimension = models.CharField(max_length=10, choices=DIMENSION_CHOICES)
+    granularity = models.CharField(max_length=10, choices=GRANULARITY_CHOICES)
+    # The day, or the first day of the month
+    date = models.DateField()
+    # {customer or product id: sales in cents}, each at most the true total
+    counters = models.JSONField()
+    # In cents: no true total exceeds its counter (0 if untracked) by more
+    error = models.BigIntegerField()
+    # All sales of the bucket, in cents
+    total = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.dimension} {self.granularity} {self.date} - {len(self.counters)} counters"
+
+    class Meta:
+        db_table = 'sales_sketches'
+        ordering = ['dimension', 'granularity', 'date']
+        managed = True
+        constraints = [
+            # Also the index behind the range lookups
+            models.UniqueConstraint(fields=['dimension', 'granularity', 'date'], name='sales_sketch_unique'),
+        ]
+
+
+class DistinctSketch(models.Model):
+    """
+    HyperLogLog registers of the customers or products that bought on one
+    day or in one month, overall or per region, state, category or
+    segment, maintained by SalesApp.distinct.
+    """
+    GRANULARITY_CHOICES = [('day', 'Day'), ('month', 'Month')]
+    TARGET_CHOICES = [('customer', 'Customer'), ('product', 'Product')]
+    GROUPING_CHOICES = [
+        ('all', 'All'), ('region', 'Region'), ('state', 'State'), ('category', 'Category'), ('segment', 'Segment'),
+    ]
+
+    target = models.CharField(max_length=10, choices=TARGET_CHOICES)
+    grouping = models.CharField(max_length=10, choices=GROUPING_CHOICES)
+    granularity = models.CharField(max_length=10, choices=GRANULARITY_CHOICES)
+    # The day, or the first day of the month
+    date = models.DateField()
+    # [[region, state, ... ('' for all), length of its sketch], ...]
+    groups = models.JSONField()
+    # The sketches of the groups one after another, see SalesApp.distinct.encode
+    registers = models.BinaryField()
+    # Sales rows counted in, whatever the grouping
+    orders = models.IntegerField()
+
+    def __str__(self):
+        return f"{self.target} by {self.grouping} {self.granularity} {self.date} - {len(self.groups)} groups"
+
+    class Meta:
+        db_table = 'distinct_sketches'
+        ordering = ['target', 'grouping', 'granularity', 'date']
+        managed = True
+        constraints = [
+            # Also the index behind the range lookups
+            models.UniqueConstraint(
+                fields=['target', 'grouping', 'granularity', 'date'], name='distinct_sketch_unique',
+            ),
+        ]
+
+
+class DataVersion(models.Model):
+    """
+    The single-row data-version counter behind the response cache keys
+    (SalesApp.cache). Kept in the database, so a write from any worker or
+    management command moves every process to the new version.
+    """
+    version = models.BigIntegerField()
+
+    def __str__(self):
+        return str(self.version)
+
+    class Meta:
+        db_table = 'data_version'
+        managed = True
@@ -0,0 +1,243 @@
+"""
+Keyset pagination and ``limit`` handling for the list and ranking endpoints.
+
+Keyset (a.k.a. seek) pagination continues from the last row of the previous
+page with a ``WHERE (key) < (last key)`` predicate instead of an OFFSET, so
+every page costs the same however deep the client has scrolled.
+"""
+import base64
+import binascii
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db.models import F, Q, Sum, Window
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from . import partitions
+from .models import DailySalesSummary
+
+MAX_LIMIT = getattr(settings, 'SALESAPP_MAX_LIMIT', 1000)
+
+
+def get_limit(request, default=None, maximum=MAX_LIMIT):
+    """Parse an optional positive ``?limit=`` query parameter."""
+    value = request.query_params.get('limit')
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValidationError({'limit': 'Must be a positive integer.'})
+    if limit <= 0:
+        raise ValidationError({'limit': 'Must be a positive integer.'})
+    return min(limit, maximum)
+
+
+LAYOUTS = ('rows', 'columns')
+
+
+def get_layout(request):
+    """
+    Parse an optional ``?layout=`` query parameter: ``rows`` (the default,
+    a list of objects) or ``columns`` (one array per field).
+    """
+    layout = request.query_params.get('layout') or 'rows'
+    if layout not in LAYOUTS:
+        raise ValidationError({'layout': f"Must be one of: {', '.join(LAYOUTS)}."})
+    return layout
+
+
+def get_window(request, default_days=None):
+    """
+    Parse optional ``?days=`` and ``?end=YYYY-MM-DD`` query parameters into
+    the inclusive ``(start, end)`` of the last ``days`` days up to ``end``
+    (default today), or None without ``days`` and ``default_days``.
+    """
+    days = request.query_params.get('days')
+    if days in (None, ''):
+        if default_days is None:
+            return None
+        days = default_days
+    try:
+        days = int(days)
+    except ValueError:
+        raise ValidationError({'days': 'Must be a positive integer.'})
+    if days <= 0:
+        raise ValidationError({'days': 'Must be a positive integer.'})
+
+    end = request.query_params.get('end')
+    if end:
+        try:
+            end = date.fromisoformat(end)
+        except ValueError:
+            raise ValidationError({'end': 'Must be a date in YYYY-MM-DD format.'})
+    else:
+        end = timezone.now().date()
+    return end - timedelta(days=days - 1), end
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only keyset pagination over a descending ``(date field, id)`` key.
+
+    Responses look like ``{"next": <url or null>, "results": [...]}``.
+    """
+    date_field = 'order_date'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = MAX_LIMIT
+    cursor_query_param = 'cursor'
+
+    def get_page_size(self, request):
+        value = request.query_params.get(self.page_size_query_param)
+        if value in (None, ''):
+            return self.page_size
+        try:
+            size = int(value)
+        except ValueError:
+            raise ValidationError({self.page_size_query_param: 'Must be a positive integer.'})
+        if size <= 0:
+            raise ValidationError({self.page_size_query_param: 'Must be a positive integer.'})
+        return min(size, self.max_page_size)
+
+    def encode_cursor(self, row_date, row_id):
+        raw = f'{row_date.isoformat()}|{row_id}'.encode()
+        return base64.urlsafe_b64encode(raw).decode()
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+            row_date, row_id = raw.split('|')
+            return date.fromisoformat(row_date), int(row_id)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise ValidationError({self.cursor_query_param: 'Invalid cursor.'})
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        position = self.decode_cursor(request)
+        upper = None
+        if position is not None:
+            row_date, row_id = position
+            upper = row_date
+            queryset = queryset.filter(
+                Q(**{f'{self.date_field}__lt': row_date})
+                | Q(**{self.date_field: row_date, 'id__lt': row_id})
+            )
+
+        # Fetch one extra row to learn whether there is a next page
+        ordered = queryset.order_by(f'-{self.date_field}', '-id')
+        lower = self.get_lower_bound(upper, page_size + 1)
+        rows = None
+        if lower is not None:
+            rows = list(ordered.filter(**{f'{self.date_field}__range': (lower, upper or date.max)})[:page_size + 1])
+        if rows is None or len(rows) <= page_size:
+            # Without a bound, or when it was too tight, ask for the page as is
+            rows = list(ordered[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        self.last = rows[-1] if rows else None
+        return rows
+
+    def get_lower_bound(self, upper, count):
+        """
+        A date from which on (up to ``upper``, the cursor's date, or None for
+        the first page) the next ``count`` rows are thought to lie, or None.
+        A bound only lets the database skip what is older (e.g. partitions);
+        if it turns out too tight the page is read without it.
+        """
+        return None
+
+    def get_position(self, row):
+        """``(date, id)`` of a model instance or of a dict from ``.values()``."""
+        if isinstance(row, dict):
+            return row[self.date_field], row['id']
+        return getattr(row, self.date_field), row.id
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        cursor = self.encode_cursor(*self.get_position(self.last))
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+
+class SalesKeysetPagination(KeysetPagination):
+    """
+    Keyset pagination of ``new_sales_data`` bounded by the daily rollup: the
+    page starts at the latest day from which the rollup counts enough rows,
+    so a partitioned table reads one or two monthly partitions per page.
+    """
+
+    def get_lower_bound(self, upper, count):
+        if not partitions.is_partitioned():
+            return None
+        days = DailySalesSummary.objects.all()
+        if upper is not None:
+            # Some rows of the cursor's day were on earlier pages, so only
+            # the days before it are counted
+            days = days.filter(date__lt=upper)
+        return (
+            days.annotate(rows=Window(Sum('order_count'), order_by=F('date').desc()))
+            .filter(rows__gte=count).order_by('-date').values_list('date', flat=True).first()
+        )
+
+
+class IdKeysetPagination(KeysetPagination):
+    """Keyset pagination on ascending ``id`` alone, for tables without a date."""
+
+    def encode_cursor(self, row_id):
+        return base64.urlsafe_b64encode(str(row_id).encode()).decode()
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            return int(base64.urlsafe_b64decode(cursor.encode()).decode())
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise ValidationError({self.cursor_query_param: 'Invalid cursor.'})
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        last_id = self.decode_cursor(request)
+        if last_id is not None:
+            queryset = queryset.filter(id__gt=last_id)
+
+        rows = list(queryset.order_by('id')[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        self.last = rows[-1] if rows else None
+        return rows
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        last_id = self.last['id'] if isinstance(self.last, dict) else self.last.id
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(last_id))
@@ -0,0 +1,72 @@
+"""
+Request body parsers for bulk sales ingest: NDJSON and CSV.
+
+Both produce a list of dicts keyed by NewSalesData field names, the same
+shape as a JSON array body, so the view can validate them uniformly.
+"""
+import codecs
+import csv
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from .loaders import CSV_COLUMNS, DATE_FORMAT, DECIMAL_FIELDS
+
+
+def _charset(parser_context):
+    parser_context = parser_context or {}
+    return parser_context.get('encoding', settings.DEFAULT_CHARSET)
+
+
+class NDJSONParser(BaseParser):
+    """One JSON object per line; blank lines are ignored."""
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        reader = codecs.getreader(_charset(parser_context))(stream)
+        records = []
+        for line_number, line in enumerate(reader, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError as e:
+                raise ParseError(f"NDJSON parse error on line {line_number}: {e}")
+        return records
+
+
+class CSVParser(BaseParser):
+    """
+    CSV with a header row. Columns may be named after the model fields or
+    use the headers of the sales CSV export ("Order Date", "Sub-Category", ...,
+    with dd/mm/yyyy dates and unrounded decimals, rounded here to the model
+    precision as the CSV loader does).
+    """
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        reader = codecs.getreader(_charset(parser_context))(stream)
+        try:
+            rows = csv.DictReader(reader)
+            export_format = 'Order Date' in (rows.fieldnames or [])
+            return [self._convert(row) if export_format else row for row in rows]
+        except (csv.Error, UnicodeDecodeError) as e:
+            raise ParseError(f"CSV parse error: {e}")
+
+    def _convert(self, row):
+        values = {field: row.get(header) for header, field in CSV_COLUMNS.items()}
+        try:
+            values['order_date'] = datetime.strptime(values['order_date'], DATE_FORMAT).date()
+        except (TypeError, ValueError):
+            pass  # left as-is for the serializer to report
+        for field, exponent in DECIMAL_FIELDS.items():
+            try:
+                values[field] = Decimal(values[field]).quantize(exponent)
+            except (TypeError, ValueError, InvalidOperation):
+                pass
+        return values
@@ -0,0 +1,140 @@
+"""
+Monthly range partitions of ``new_sales_data`` on PostgreSQL.
+
+Migration 0014 turns the table into one partitioned by ``order_date``,
+with a partition per month (``new_sales_data_p2017_03``) and a default
+partition (``new_sales_data_default``) for dates no partition covers yet.
+Queries bounded by date (quick insights, windowed top customers and
+products, exact distinct counts, exports, rollup and sketch refreshes)
+then only read the partitions of their months.
+
+``manage.py manage_partitions`` keeps the partitions ahead of the data
+and detaches old months; see ``SALESAPP_PARTITIONS`` in settings. On other
+databases the table stays a plain one and nothing here applies.
+"""
+import functools
+import re
+from datetime import date
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import NewSalesData
+
+DEFAULTS = {
+    # Months of partitions kept ready past the current one
+    'MONTHS_AHEAD': 3,
+    # Months kept attached before the current one (None: all)
+    'RETAIN_MONTHS': None,
+}
+
+CONFIG = {**DEFAULTS, **getattr(settings, 'SALESAPP_PARTITIONS', {})}
+
+TABLE = NewSalesData._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+_BOUND = re.compile(r"FOR VALUES FROM \('(\d{4}-\d{2}-\d{2})'\) TO \('(\d{4}-\d{2}-\d{2})'\)")
+
+
+def month_after(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y_%m}'
+
+
+@functools.lru_cache(maxsize=None)
+def is_partitioned():
+    """Whether ``new_sales_data`` is partitioned; looked up once per process."""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass", [TABLE])
+        return cursor.fetchone()[0] == 'p'
+
+
+def partitions():
+    """``{first day of month: partition name}`` of the attached month partitions."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = %s::regclass",
+            [TABLE],
+        )
+        rows = cursor.fetchall()
+    months = {}
+    for name, bound in rows:
+        match = _BOUND.search(bound)
+        if match:
+            months[date.fromisoformat(match.group(1))] = name
+    return dict(sorted(months.items()))
+
+
+def default_months():
+    """First days of the months with rows in the default partition."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT DISTINCT date_trunc('month', order_date)::date FROM {connection.ops.quote_name(DEFAULT_PARTITION)}"
+        )
+        return sorted(row[0] for row in cursor.fetchall())
+
+
+def create(month):
+    """
+    Create the partition of ``month`` (a first day) unless it exists; rows
+    of that month already in the default partition are moved into it.
+    Returns whether it was created.
+    """
+    if month in partitions():
+        return False
+    name = connection.ops.quote_name(partition_name(month))
+    table = connection.ops.quote_name(TABLE)
+    default = connection.ops.quote_name(DEFAULT_PARTITION)
+    bounds = [month, month_after(month)]
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Attaching checks the default partition for rows of the month, so
+        # they are moved out first
+        cursor.execute(f'CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING STORAGE)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {default} WHERE order_date >= %s AND order_date < %s RETURNING *) '
+            f'INSERT INTO {name} SELECT * FROM moved',
+            bounds,
+        )
+        cursor.execute(
+            f"ALTER TABLE {table} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{bounds[0].isoformat()}') TO ('{bounds[1].isoformat()}')"
+        )
+    return True
+
+
+def ensure(first, last):
+    """Create the missing partitions of the months from ``first`` to ``last``; the months created."""
+    created = []
+    month = first.replace(day=1)
+    while month <= last:
+        if create(month):
+            created.append(month)
+        month = month_after(month)
+    return created
+
+
+def detach(month, drop=False):
+    """
+    Detach the partition of ``month`` from ``new_sales_data``; it stays as
+    a table of its own (the archive) unless ``drop``. Returns its name.
+    """
+    name = partitions()[month]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'ALTER TABLE {connection.ops.quote_name(TABLE)} DETACH PARTITION {connection.ops.quote_name(name)}'
+        )
+        if drop:
+            cursor.execute(f'DROP TABLE {connection.ops.quote_name(name)}')
+    return name
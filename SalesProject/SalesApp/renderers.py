@@ -0,0 +1,87 @@
+"""
+JSON rendering with orjson.
+
+``ORJSONRenderer`` produces the same JSON as DRF's ``JSONRenderer`` (compact,
+UTF-8, Decimal as a number, dates in ISO format, datetimes the way DRF
+formats them) but encodes in C: strings, numbers, lists, dicts and NumPy
+arrays and scalars never go through Python code. Only Decimal, dates and
+the types orjson has no native form for (lazy translations, ...) reach
+``_default``, which does what DRF's encoder does with them.
+
+orjson is optional. Without it, and for indented output (the browsable
+API), rendering falls back to ``JSONRenderer``. Unlike ``JSONRenderer``,
+NaN and infinite floats are written as ``null`` rather than raising, large
+exponents as ``1e16`` rather than ``1e+16`` and NumPy float32 values at
+float32 precision.
+"""
+import json
+from datetime import date
+from decimal import Decimal
+
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+from . import metrics
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+_drf_default = encoders.JSONEncoder().default
+
+if orjson is not None:
+    OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    # orjson's own datetime format differs from DRF's (microseconds,
+    # "+00:00"), so dates and times are passed through to here
+    if type(obj) is date:
+        return obj.isoformat()
+    return _drf_default(obj)
+
+
+def dumps(data, sort_keys=False):
+    """Encode ``data`` to JSON bytes like ``ORJSONRenderer`` does."""
+    if orjson is None:
+        return json.dumps(data, cls=encoders.JSONEncoder, sort_keys=sort_keys,
+                          separators=(',', ':'), ensure_ascii=False).encode()
+    options = OPTIONS | orjson.OPT_SORT_KEYS if sort_keys else OPTIONS
+    return orjson.dumps(data, default=_default, option=options)
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with metrics.timed('serialization'):
+            return self._render(data, accepted_media_type, renderer_context)
+
+    def _render(self, data, accepted_media_type, renderer_context):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if (
+            orjson is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context)
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = dumps(data)
+        # JSONRenderer escapes these two so the output is also valid JavaScript
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class JSONResponse(HttpResponse):
+    """
+    JSON response for plain Django views, rendered by ``ORJSONRenderer``.
+    Like DRF's ``Response`` it keeps the unrendered ``data``.
+    """
+
+    def __init__(self, data, status=200, **kwargs):
+        super().__init__(ORJSONRenderer().render(data), content_type='application/json', status=status, **kwargs)
+        self.data = data
@@ -0,0 +1,283 @@
+"""
+Refreshing the SARIMA models with the sales recorded since they were trained.
+
+The training series of a SARIMA model is total sales per period (per month
+for ``monthly_sarima``), which the ``daily_sales_summary`` rollup gives
+directly. A refresh compares that series with the one inside the model:
+
+- periods completed after the model's last one are added with
+  ``results.append(new, refit=False)``, which keeps the estimated
+  parameters and only runs the Kalman filter over the new observations;
+- a full refit (same specification, previous parameters as the starting
+  point) runs instead when it is forced, when there are new periods and
+  the last full refit is older than ``FULL_REFIT_DAYS``, or when periods
+  the model was trained on have changed in the database since.
+
+Every refresh that changes a model is written to
+``saved_models/versions/<model>/`` and recorded in that directory's
+``manifest.json``, then installed over the live artifact with
+``os.replace``. The model registry of every process (web and inference
+workers) picks the new file up on its next check, so a refresh never needs
+a restart and readers never see a partially written file.
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta, timezone
+
+import joblib
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .model_registry import _file_hash, registry
+from .models import DailySalesSummary
+from .routers import replica_reads
+
+DEFAULTS = {
+    # A refresh refits from scratch when the last full refit is older than this
+    'FULL_REFIT_DAYS': 7,
+    # Versions kept in saved_models/versions/<model>/
+    'KEEP_VERSIONS': 24,
+}
+
+CONFIG = {**DEFAULTS, **getattr(settings, 'SALESAPP_RETRAINING', {})}
+
+SARIMA_MODELS = ['monthly_sarima', 'weekly_sarima']
+
+# Relative difference above which a trained period counts as revised. The
+# models were trained on 4-decimal CSV amounts and new_sales_data stores
+# cents, so monthly totals differ by a few cents without any revision.
+REVISION_TOLERANCE = 1e-4
+
+
+@dataclass
+class RefreshResult:
+    name: str
+    action: str  # 'append', 'full', 'unchanged' or 'skipped'
+    reason: str = ''
+    version: str = None
+    appended: int = 0
+    nobs: int = 0
+    last_observation: str = None
+    seconds: dict = field(default_factory=dict)
+
+    @property
+    def total_seconds(self):
+        return sum(self.seconds.values())
+
+
+def versions_dir(name):
+    return registry.directory / 'versions' / name
+
+
+def _manifest_path(name):
+    return versions_dir(name) / 'manifest.json'
+
+
+def load_manifest(name):
+    try:
+        with open(_manifest_path(name)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'name': name, 'current': None, 'last_full_refit': None, 'versions': []}
+
+
+def _write_atomic(path, write):
+    """Write a file through a temporary file in the same directory and os.replace."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _save_manifest(name, manifest):
+    data = json.dumps(manifest, indent=2).encode()
+    _write_atomic(_manifest_path(name), lambda f: f.write(data))
+
+
+# Training series
+
+def _bin_label(day, freq):
+    """Label of the ``freq`` period that ``day`` falls in."""
+    return pd.Series([0.0], index=pd.DatetimeIndex([day])).resample(freq).sum().index[0]
+
+
+def sales_series(freq, through=None):
+    """
+    Total sales per complete ``freq`` period, from the daily rollup (on the
+    read replica, if there is one).
+
+    A period is complete when ``through`` (default: the last day with
+    sales) is its last day or later; a first period that starts before
+    the first day with sales is left out as well.
+    """
+    with replica_reads():
+        daily = pd.Series(dict(DailySalesSummary.objects.values_list('date', 'total_sales')), dtype=object)
+    if daily.empty:
+        return pd.Series(dtype=float)
+    daily.index = pd.DatetimeIndex(daily.index)
+    daily = daily.astype(float).sort_index()
+    if through is None:
+        through = daily.index[-1]
+    through = pd.Timestamp(through)
+    first = daily.index[0]
+
+    series = daily[:through].resample(freq).sum()
+    complete_before = _bin_label(through + timedelta(days=1), freq)
+    series = series[series.index < complete_before]
+    if len(series) and _bin_label(first - timedelta(days=1), freq) == series.index[0]:
+        series = series.iloc[1:]
+    return series
+
+
+def _model_series(results):
+    endog = results.model.data.orig_endog
+    series = pd.Series(np.asarray(endog, dtype=float).ravel(), index=results.model.data.dates)
+    series.name = getattr(endog, 'name', None)
+    return series
+
+
+def _revised_periods(trained, observed):
+    overlap = trained.index.intersection(observed.index)
+    if not len(overlap):
+        return 0
+    old = trained[overlap].to_numpy()
+    new = observed[overlap].to_numpy()
+    scale = np.maximum(np.abs(old), 1.0)
+    return int((np.abs(new - old) / scale > REVISION_TOLERANCE).sum())
+
+
+def _full_refit_due(manifest, now):
+    last = manifest.get('last_full_refit')
+    if last is None:
+        return True
+    return now - datetime.fromisoformat(last) >= timedelta(days=CONFIG['FULL_REFIT_DAYS'])
+
+
+# Refresh
+
+def refresh_model(name, full=False, through=None, dry_run=False):
+    """Bring one SARIMA model up to date with the database; see the module docstring."""
+    timings = {}
+    started = time.perf_counter()
+    path = registry.path(name)
+    if not path.exists():
+        return RefreshResult(name, 'skipped', reason=f"no artifact at {path}")
+    results = joblib.load(path)
+    timings['load'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    trained = _model_series(results)
+    freq = results.model.data.dates.freq
+    observed = sales_series(freq, through=through)
+    timings['data'] = time.perf_counter() - started
+
+    manifest = load_manifest(name)
+    now = datetime.now(timezone.utc)
+    last = trained.index[-1]
+    if len(observed):
+        new_index = pd.date_range(last, observed.index[-1], freq=freq)[1:]
+    else:
+        new_index = pd.DatetimeIndex([], freq=freq)
+    # Periods with no sales at all are zeros, not gaps
+    new = observed.reindex(new_index, fill_value=0.0).rename(trained.name)
+    revised = _revised_periods(trained, observed)
+
+    if full:
+        action, reason = 'full', 'requested'
+    elif revised:
+        action, reason = 'full', f"{revised} trained periods changed"
+    elif len(new) and _full_refit_due(manifest, now):
+        action, reason = 'full', f"scheduled, {len(new)} new periods"
+    elif len(new):
+        action, reason = 'append', f"{len(new)} new periods"
+    else:
+        return RefreshResult(
+            name, 'unchanged', reason='no new complete periods', version=manifest.get('current'),
+            nobs=int(results.nobs), last_observation=str(last.date()), seconds=timings,
+        )
+
+    started = time.perf_counter()
+    if action == 'append':
+        updated = results.append(new, refit=False)
+    else:
+        # The database wins where it has data; other periods stay as trained
+        history = observed.combine_first(trained)
+        history = history.reindex(pd.date_range(history.index[0], history.index[-1], freq=freq), fill_value=0.0)
+        updated = results.model.clone(history.rename(trained.name)).fit(start_params=results.params, disp=False)
+    timings['update'] = time.perf_counter() - started
+
+    result = RefreshResult(
+        name, action, reason=reason, appended=len(new),
+        nobs=int(updated.nobs), last_observation=str(updated.model.data.dates[-1].date()),
+        seconds=timings,
+    )
+    if not dry_run:
+        result.version = _install(name, updated, result, manifest, now)
+    return result
+
+
+def _install(name, updated, result, manifest, now):
+    started = time.perf_counter()
+    directory = versions_dir(name)
+    artifact = directory / f"{now.strftime('%Y%m%dT%H%M%SZ')}-{result.action}.joblib"
+    _write_atomic(artifact, lambda f: joblib.dump(updated, f))
+    version = _file_hash(artifact)[:12]
+
+    # Copy next to the live artifact first so the final rename stays on one filesystem
+    live = registry.path(name)
+    with open(artifact, 'rb') as source:
+        _write_atomic(live, lambda f: shutil.copyfileobj(source, f))
+    result.seconds['write'] = time.perf_counter() - started
+
+    entry = {
+        'version': version,
+        'file': artifact.name,
+        'created_at': now.isoformat(),
+        **{key: value for key, value in asdict(result).items() if key not in ('name', 'version')},
+    }
+    entry['seconds'] = {key: round(value, 4) for key, value in entry['seconds'].items()}
+    manifest['current'] = version
+    if result.action == 'full':
+        manifest['last_full_refit'] = now.isoformat()
+    manifest['versions'] = (manifest['versions'] + [entry])[-CONFIG['KEEP_VERSIONS']:]
+    _prune(directory, {entry['file'] for entry in manifest['versions']})
+    _save_manifest(name, manifest)
+    return version
+
+
+def _prune(directory, keep):
+    for path in directory.glob('*.joblib'):
+        if path.name not in keep:
+            path.unlink()
+
+
+def refresh(names=None, full=False, through=None, dry_run=False):
+    """Refresh every SARIMA model (or ``names``); returns a list of ``RefreshResult``."""
+    return [
+        refresh_model(name, full=full, through=through, dry_run=dry_run)
+        for name in (names or SARIMA_MODELS)
+    ]
+
+
+def status():
+    """Current version, last full refit and last refresh of every SARIMA model."""
+    status = {}
+    for name in SARIMA_MODELS:
+        manifest = load_manifest(name)
+        status[name] = {
+            'current': manifest['current'],
+            'last_full_refit': manifest['last_full_refit'],
+            'last_refresh': manifest['versions'][-1] if manifest['versions'] else None,
+            'versions': len(manifest['versions']),
+        }
+    return status
@@ -0,0 +1,129 @@
+"""
+Maintenance of the per-day ``daily_sales_summary`` rollup.
+
+Writes to ``new_sales_data`` only ever touch a handful of days, so instead of
+re-aggregating the whole fact table we recompute just the affected days.
+
+Refreshes of the same month are serialized: ``sales_changed`` first takes a
+PostgreSQL advisory lock per month it touches (held until commit), so a
+refresh never computes a total that misses the rows of another one still
+in flight. The API views take the same locks before they write, so a
+refresh never waits for a row held by a writer that waits for its locks.
+SQLite runs one writing transaction at a time anyway.
+"""
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+
+from . import buckets, cache, distinct, sketches
+from .models import DailySalesSummary, NewSalesData
+
+# Keeps the IN (...) list of a single refresh query reasonably small
+REFRESH_CHUNK_SIZE = 500
+
+
+def _daily_totals(queryset):
+    return (
+        queryset
+        .values('order_date')
+        .annotate(
+            total_sales=Sum('sales'),
+            total_profit=Sum('profit'),
+            total_quantity=Sum('quantity'),
+            order_count=Count('id'),
+        )
+        .order_by('order_date')
+    )
+
+
+def _summary_row(row):
+    return DailySalesSummary(
+        date=row['order_date'],
+        total_sales=row['total_sales'],
+        total_profit=row['total_profit'],
+        total_quantity=row['total_quantity'],
+        order_count=row['order_count'],
+    )
+
+
+# First argument of the advisory locks, the second one being the month
+MONTH_LOCK = 0x5A1E5
+
+SUMMARY_FIELDS = ['total_sales', 'total_profit', 'total_quantity', 'order_count']
+
+
+def lock_months(dates):
+    """
+    Wait for, then hold until commit, the locks of the months of ``dates``
+    and of the ISO weeks around them (the bucket columns of a week reach
+    into the next or previous month). Must run inside a transaction.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    months = set()
+    for day in dates:
+        for edge in buckets.week_bounds(day):
+            months.add(edge.year * 12 + edge.month - 1)
+        months.add(day.year * 12 + day.month - 1)
+    with connection.cursor() as cursor:
+        # Always in the same order, so two refreshes cannot deadlock
+        for month in sorted(months):
+            cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', [MONTH_LOCK, month])
+
+
+def refresh_days(dates):
+    """Recompute the summary rows for the given dates from new_sales_data."""
+    dates = sorted(set(dates))
+    for i in range(0, len(dates), REFRESH_CHUNK_SIZE):
+        chunk = dates[i:i + REFRESH_CHUNK_SIZE]
+        rows = [_summary_row(row) for row in _daily_totals(NewSalesData.objects.filter(order_date__in=chunk))]
+        with transaction.atomic():
+            DailySalesSummary.objects.bulk_create(
+                rows, update_conflicts=True, unique_fields=['date'], update_fields=SUMMARY_FIELDS,
+            )
+            # Days whose last sale went away
+            DailySalesSummary.objects.filter(date__in=chunk).exclude(date__in=[row.date for row in rows]).delete()
+
+
+def rebuild_daily_summary(batch_size=1000):
+    """
+    Drop and rebuild the whole rollup with a single GROUP BY scan, and the
+    sales and distinct-count sketches with it.
+    """
+    created = 0
+    with transaction.atomic():
+        DailySalesSummary.objects.all().delete()
+        batch = []
+        for row in _daily_totals(NewSalesData.objects.all()).iterator():
+            batch.append(_summary_row(row))
+            if len(batch) >= batch_size:
+                DailySalesSummary.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        if batch:
+            DailySalesSummary.objects.bulk_create(batch)
+            created += len(batch)
+        sketches.rebuild()
+        distinct.rebuild()
+    cache.data_changed()
+    return created
+
+
+def sales_changed(dates):
+    """
+    Hook to call after NewSalesData rows dated ``dates`` were created,
+    updated or deleted. Bulk writes bypass model signals, so this is also
+    where cached responses get invalidated.
+
+    The bucket columns of the affected weeks and months are recomputed from
+    the refreshed rollup, and the top-K sales sketches and distinct-count
+    sketches of those days and months from the rows, in the same
+    transaction as the write and under the locks of its months.
+    """
+    dates = set(dates)
+    with transaction.atomic():
+        lock_months(dates)
+        refresh_days(dates)
+        buckets.refresh(dates)
+        sketches.refresh(dates)
+        distinct.refresh(dates)
+    cache.data_changed()
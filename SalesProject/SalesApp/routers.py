@@ -0,0 +1,143 @@
+"""
+Sending the analytics reads to a read replica.
+
+``ReplicaRouter`` (in ``DATABASE_ROUTERS``) sends reads to the replica
+alias only inside a replica-reads scope; everything else, and every write,
+stays on ``default``. ``ReplicaMiddleware`` opens that scope for GET and
+HEAD requests under ``PATHS`` (the analytics API), and
+``replica_reads()`` opens it around the forecasting data pulls.
+
+Reads stay on the primary, so they see what was just written:
+
+- for ``STICKY_SECONDS`` after a client's POST (or PUT, PATCH, DELETE),
+  which sets a cookie that the middleware honours, to cover replication lag;
+- for the rest of a request (or scope) once something in it wrote;
+- while a transaction is open on ``default``, whose writes the replica
+  cannot see yet.
+
+The cookie only comes back with requests that carry credentials. A
+browser app on another origin must send them (``credentials: 'include'``
+with fetch, ``withCredentials`` with axios; ``CORS_ALLOW_CREDENTIALS`` is
+set), on the write as well, or it never has the cookie. The dashboard in
+FrontEnd does not, so right after a write its reads may lag behind by
+the replica's delay. The response cache is not affected: the data
+version in its keys is read from the same replica as the data (see
+SalesApp.cache), so a lagging replica's response is stored under the
+older version it reflects.
+
+Without the replica alias in ``DATABASES`` (see ``SALESAPP_REPLICA_HOST``
+in settings) everything reads from ``default``. Configure with the
+``SALESAPP_ROUTING`` setting.
+"""
+import contextlib
+import contextvars
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+DEFAULTS = {
+    # Alias of the read replica in DATABASES
+    'REPLICA': 'replica',
+    # Seconds a client keeps reading from the primary after writing
+    'STICKY_SECONDS': 10,
+    'COOKIE': 'salesapp_primary',
+    # URL prefixes whose GET and HEAD requests read from the replica
+    'PATHS': ('/api/',),
+}
+
+CONFIG = {**DEFAULTS, **getattr(settings, 'SALESAPP_ROUTING', {})}
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class _Scope:
+    def __init__(self, alias):
+        self.alias = alias
+        self.wrote = False
+
+
+_scope = contextvars.ContextVar('salesapp_replica_scope', default=None)
+
+
+def replica():
+    """The replica alias, or None when it is not configured."""
+    alias = CONFIG['REPLICA']
+    return alias if alias in settings.DATABASES and alias != DEFAULT_DB_ALIAS else None
+
+
+@contextlib.contextmanager
+def replica_reads():
+    """Read from the replica (if any) inside the block."""
+    token = _scope.set(_Scope(replica()))
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        scope = _scope.get()
+        if scope is None or scope.alias is None or scope.wrote:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return scope.alias
+
+    def db_for_write(self, model, **hints):
+        scope = _scope.get()
+        if scope is not None:
+            scope.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == replica():
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def _start(self, request):
+        alias = replica()
+        if (
+            request.method not in SAFE_METHODS
+            or CONFIG['COOKIE'] in request.COOKIES
+            or not request.path.startswith(tuple(CONFIG['PATHS']))
+        ):
+            alias = None
+        scope = _Scope(alias)
+        return _scope.set(scope), scope
+
+    def _finish(self, request, response, token, scope):
+        _scope.reset(token)
+        if replica() and (scope.wrote or request.method not in SAFE_METHODS):
+            response.set_cookie(
+                CONFIG['COOKIE'], '1', max_age=CONFIG['STICKY_SECONDS'], httponly=True, samesite='Lax',
+            )
+        return response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token, scope = self._start(request)
+        response = self.get_response(request)
+        return self._finish(request, response, token, scope)
+
+    async def __acall__(self, request):
+        token, scope = self._start(request)
+        response = await self.get_response(request)
+        return self._finish(request, response, token, scope)
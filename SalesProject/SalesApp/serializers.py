@@ -1,11 +1,93 @@
+from django.db import models
 from rest_framework import serializers
+from . import dimensions
 from .models import NewSalesData
 from .models import Product
 
 class SalesDataSerializer(serializers.ModelSerializer):
+    # Customer, location and product live in their own tables; the API keeps
+    # exposing them as flat fields on each sale
+    customer_id = serializers.CharField(source='customer.customer_id', max_length=20)
+    customer_name = serializers.CharField(source='customer.customer_name', max_length=100)
+    segment = serializers.CharField(source='customer.segment', max_length=50)
+    country = serializers.CharField(source='location.country', max_length=100)
+    city = serializers.CharField(source='location.city', max_length=100)
+    state = serializers.CharField(source='location.state', max_length=100)
+    postal_code = serializers.CharField(source='location.postal_code', max_length=20)
+    region = serializers.CharField(source='location.region', max_length=50)
+    product_id = serializers.CharField(source='product.product_id', max_length=20)
+    category = serializers.CharField(source='product.category', max_length=50)
+    sub_category = serializers.CharField(source='product.sub_category', max_length=50)
+    product_name = serializers.CharField(source='product.product_name', max_length=200)
+
     class Meta:
         model = NewSalesData
-        fields = '__all__'
+        fields = [
+            'id', 'order_date', *dimensions.FLAT_FIELDS,
+            'sales', 'quantity', 'discount', 'profit',
+            'avg_for_week', 'avg_for_month', 'week_sales', 'month_sales', 'day_sales',
+        ]
+
+    def validate(self, attrs):
+        # Names, segments and categories belong to the customer or product,
+        # which other sales share; an edit can only move the sale to another
+        if self.instance is not None:
+            row = dimensions.flatten(attrs)
+            given = set(row)
+            for dimension, key in (('customer', 'customer_id'), ('product', 'product_id')):
+                row.setdefault(key, getattr(getattr(self.instance, dimension), key))
+            errors = dimensions.conflicting_attributes(row, given)
+            if errors:
+                raise serializers.ValidationError(errors)
+        return attrs
+
+    def create(self, validated_data):
+        values, = dimensions.resolve([dimensions.flatten(validated_data)])
+        return NewSalesData.objects.create(**values)
+
+    def update(self, instance, validated_data):
+        row = dimensions.flatten(validated_data)
+        # A partial update keeps the dimensions it does not mention
+        for dimension, fields in (
+            ('customer', dimensions.CUSTOMER_FIELDS),
+            ('location', dimensions.LOCATION_FIELDS),
+            ('product', dimensions.PRODUCT_FIELDS),
+        ):
+            current = getattr(instance, dimension)
+            for field in fields:
+                row.setdefault(field, getattr(current, field))
+
+        values, = dimensions.resolve([row])
+        for field, value in values.items():
+            setattr(instance, field, value)
+        instance.save()
+        return instance
+
+# Serializer field -> ORM path, for reading list pages with .values()
+SALES_ROW_PATHS = {
+    name: dimensions.FLAT_FIELDS.get(name, name) for name in SalesDataSerializer.Meta.fields
+}
+_SALES_DECIMAL_FIELDS = [
+    field.name for field in NewSalesData._meta.concrete_fields if isinstance(field, models.DecimalField)
+]
+
+
+def sales_rows(rows):
+    """
+    What ``SalesDataSerializer(many=True).data`` gives for ``rows`` read with
+    ``.values(*SALES_ROW_PATHS.values())``, without a serializer call per
+    field: decimals as fixed-point strings and the date in ISO format.
+    """
+    items = list(SALES_ROW_PATHS.items())
+    data = []
+    for row in rows:
+        item = {name: row[path] for name, path in items}
+        item['order_date'] = item['order_date'].isoformat()
+        for name in _SALES_DECIMAL_FIELDS:
+            item[name] = format(item[name], 'f')
+        data.append(item)
+    return data
+
 
 class ProductSerializer(serializers.ModelSerializer):
     class Meta:
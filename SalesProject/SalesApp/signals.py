@@ -0,0 +1,41 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import cache, columnar
+from .models import Customer, Location, NewSalesData, Product, SalesProduct
+
+
+@receiver(post_save, sender=NewSalesData)
+@receiver(post_delete, sender=NewSalesData)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Location)
+@receiver(post_save, sender=SalesProduct)
+def invalidate_response_cache(sender, **kwargs):
+    cache.data_changed()
+
+
+# Inserts are picked up by the columnar snapshot's append path; changes to
+# existing rows need a rebuild
+@receiver(post_save, sender=NewSalesData)
+@receiver(post_delete, sender=NewSalesData)
+def invalidate_columnar_snapshot(sender, created=False, **kwargs):
+    if not created:
+        columnar.sales_mutated()
+
+
+# Renaming a customer, location or product changes the names the snapshot
+# groups by
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Location)
+@receiver(post_save, sender=SalesProduct)
+def dimension_changed(sender, created=False, **kwargs):
+    if not created:
+        columnar.sales_mutated()
+
+
+# Products sold before they were listed get linked once the catalogue has them
+@receiver(post_save, sender=Product)
+def link_sales_products(sender, instance, **kwargs):
+    SalesProduct.objects.filter(product_id=instance.product_id, catalogue=None).update(catalogue=instance)
@@ -0,0 +1,251 @@
+"""
+Top-K sketches of sales per customer and per product.
+
+Every day and every month of ``new_sales_data`` gets, per dimension, a
+summary of at most ``CAPACITY`` counters in the mergeable form of the
+Space-Saving / Misra-Gries algorithm: each tracked id has a counter that
+is at most its true sales, and one ``error`` value bounds by how much any
+counter (an untracked id counts 0) falls short. Summaries of adjacent
+buckets merge by adding counters and errors; whenever more than
+``CAPACITY`` ids remain, the ``CAPACITY + 1``-th largest counter is
+subtracted from all of them, the ones that drop to zero are forgotten and
+the subtracted amount is added to the error. Every subtraction removes at
+least ``CAPACITY + 1`` times its amount from the counters, so the error
+never exceeds ``total / (CAPACITY + 1)``, however many buckets are merged.
+
+"Top N customers of the last D days" then merges the month sketches of
+the whole months in the window and the day sketches of the days around
+them: at most a few dozen small JSON rows, no group-by over the fact
+table. A day with at most ``CAPACITY`` customers (or products) has an
+exact sketch. A day on which some customer or product has net negative
+sales cannot be sketched: its total leaves that amount out, so it fails
+the rollup check below.
+
+Day sketches are rebuilt from ``new_sales_data`` for the days a write
+touched (``rollups.sales_changed``), and month sketches from their days.
+Amounts are kept in integer cents so sums are exact. Before answering,
+the totals of the sketches are checked against the daily rollup; if a
+bucket is missing or stale the caller falls back to the exact query.
+"""
+import heapq
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncMonth
+
+from .dimensions import NAME_FIELDS
+from .models import DailySalesSummary, NewSalesData, SalesSketch
+
+DEFAULTS = {
+    'ENABLED': True,
+    # Counters per sketch; also the largest ?limit a sketch answers
+    'CAPACITY': 256,
+    # ?limit of a windowed top-N request that gives none
+    'DEFAULT_LIMIT': 10,
+}
+
+CONFIG = {**DEFAULTS, **getattr(settings, 'SALESAPP_SKETCHES', {})}
+
+DIMENSIONS = ('customer', 'product')
+
+# Keeps the IN (...) list of a single refresh query reasonably small
+REFRESH_CHUNK_SIZE = 500
+
+
+def _cents(value):
+    return int(value * 100)
+
+
+def prune(counters, error, capacity):
+    """Cut ``{id: counter}`` down to ``capacity`` counters; returns ``(counters, error)``."""
+    if len(counters) <= capacity:
+        return counters, error
+    cut = heapq.nlargest(capacity + 1, counters.values())[-1]
+    return {key: count - cut for key, count in counters.items() if count > cut}, error + cut
+
+
+def merge(sketches, capacity):
+    """Merge ``(counters, error, total)`` triples into one."""
+    counters = defaultdict(int)
+    error = total = 0
+    for sketch_counters, sketch_error, sketch_total in sketches:
+        for key, count in sketch_counters.items():
+            counters[key] += count
+        error += sketch_error
+        total += sketch_total
+    counters, error = prune(dict(counters), error, capacity)
+    return counters, error, total
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def month_end(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+
+# Writing
+
+def _day_rows(dimension, days, capacity):
+    sums = (
+        NewSalesData.objects.filter(order_date__in=days)
+        .values_list('order_date', dimension).annotate(total=Sum('sales')).order_by()
+    )
+    per_day = defaultdict(dict)
+    for day, key, total in sums:
+        per_day[day][str(key)] = _cents(total)
+
+    rows = []
+    for day, counters in per_day.items():
+        # A customer whose returns outweigh their purchases is no heavy hitter,
+        # and counters cannot track a negative amount. Leaving it out of the
+        # total as well keeps the error bound; the day then no longer matches
+        # the rollup, so windows that hold it are answered exactly.
+        counters = {key: count for key, count in counters.items() if count > 0}
+        total = sum(counters.values())
+        counters, error = prune(counters, 0, capacity)
+        rows.append(SalesSketch(dimension=dimension, granularity='day', date=day,
+                                counters=counters, error=error, total=total))
+    return rows
+
+
+def _month_row(dimension, month, capacity):
+    days = SalesSketch.objects.filter(
+        dimension=dimension, granularity='day', date__range=(month, month_end(month)),
+    ).values_list('counters', 'error', 'total')
+    if not days:
+        return None
+    counters, error, total = merge(days, capacity)
+    return SalesSketch(dimension=dimension, granularity='month', date=month,
+                       counters=counters, error=error, total=total)
+
+
+SKETCH_FIELDS = ['counters', 'error', 'total']
+
+
+def _upsert(rows, granularity, dates):
+    """Write ``rows`` over the sketches of ``dates`` and drop the ones left without sales."""
+    SalesSketch.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['dimension', 'granularity', 'date'],
+        update_fields=SKETCH_FIELDS,
+    )
+    for dimension in DIMENSIONS:
+        SalesSketch.objects.filter(dimension=dimension, granularity=granularity, date__in=dates).exclude(
+            date__in=[row.date for row in rows if row.dimension == dimension],
+        ).delete()
+
+
+def refresh(dates):
+    """Rebuild the day sketches of ``dates`` and the month sketches around them."""
+    if not CONFIG['ENABLED']:
+        return
+    capacity = CONFIG['CAPACITY']
+    dates = sorted(set(dates))
+    months = sorted({month_start(day) for day in dates})
+    # Upserts rather than delete and insert, so that a concurrent refresh
+    # of the same day waits on the row instead of failing on the unique key
+    with transaction.atomic():
+        for i in range(0, len(dates), REFRESH_CHUNK_SIZE):
+            chunk = dates[i:i + REFRESH_CHUNK_SIZE]
+            _upsert([row for dimension in DIMENSIONS for row in _day_rows(dimension, chunk, capacity)], 'day', chunk)
+        _upsert([
+            row for dimension in DIMENSIONS for month in months
+            if (row := _month_row(dimension, month, capacity)) is not None
+        ], 'month', months)
+
+
+def rebuild():
+    """Drop every sketch and build them again for all days with sales."""
+    with transaction.atomic():
+        SalesSketch.objects.all().delete()
+        refresh(DailySalesSummary.objects.values_list('date', flat=True))
+    return SalesSketch.objects.count()
+
+
+# Reading
+
+def rollup_totals(months, day_ranges, column):
+    """
+    ``{('month', first day) or ('day', day): sum of column}`` of the daily
+    rollup for the buckets of ``split_window``, to check sketches against.
+    """
+    rollup = DailySalesSummary.objects.order_by()
+    totals = {}
+    if months:
+        totals.update(
+            (('month', row['month']), row['total'])
+            for row in rollup.filter(date__range=(months[0], month_end(months[-1])))
+            .annotate(month=TruncMonth('date')).values('month').annotate(total=Sum(column))
+            if row['month'] in months
+        )
+    if day_ranges:
+        days = Q()
+        for first, last in day_ranges:
+            days |= Q(date__range=(first, last))
+        totals.update((('day', day), total) for day, total in rollup.filter(days).values_list('date', column))
+    return totals
+
+
+def split_window(start, end):
+    """Whole months of ``start..end`` and the days outside them: ``(months, (day ranges))``."""
+    first_month = month_start(start) if start.day == 1 else month_start(month_end(start) + timedelta(days=1))
+    last_month = month_start(end) if end == month_end(end) else month_start(month_start(end) - timedelta(days=1))
+    if first_month > last_month:
+        return [], [(start, end)]
+    months = []
+    month = first_month
+    while month <= last_month:
+        months.append(month)
+        month = month_end(month) + timedelta(days=1)
+    day_ranges = []
+    if start < first_month:
+        day_ranges.append((start, first_month - timedelta(days=1)))
+    if end > month_end(last_month):
+        day_ranges.append((month_end(last_month) + timedelta(days=1), end))
+    return months, day_ranges
+
+
+def top(dimension, limit, start, end):
+    """
+    ``([(name, sales), ...], error)`` of the ``limit`` customers or products
+    with the highest sales from ``start`` to ``end`` (inclusive), from the
+    sketches, or None when they cannot answer (disabled, ``limit`` above
+    their capacity, or a bucket missing or out of date).
+
+    Each sales figure is at most the true total and at most ``error`` below
+    it. Products sharing a name are added together.
+    """
+    if not CONFIG['ENABLED'] or limit is None or limit > CONFIG['CAPACITY']:
+        return None
+
+    months, day_ranges = split_window(start, end)
+    condition = Q(granularity='month', date__in=months)
+    for first, last in day_ranges:
+        condition |= Q(granularity='day', date__range=(first, last))
+    sketches = list(
+        SalesSketch.objects.filter(condition, dimension=dimension)
+        .values_list('granularity', 'date', 'counters', 'error', 'total')
+    )
+
+    # Every bucket must agree with the rollup
+    expected = {key: _cents(total) for key, total in rollup_totals(months, day_ranges, 'total_sales').items()}
+    found = {(granularity, day): total for granularity, day, _, _, total in sketches}
+    if found != expected:
+        return None
+
+    counters, error, _ = merge(
+        [(counters, error, total) for _, _, counters, error, total in sketches], CONFIG['CAPACITY'],
+    )
+
+    model, name_field = NAME_FIELDS[dimension]
+    names = dict(model.objects.filter(pk__in=[int(key) for key in counters]).values_list('pk', name_field))
+    totals = defaultdict(int)
+    for key, count in counters.items():
+        totals[names[int(key)]] += count
+    ranked = heapq.nlargest(limit, totals.items(), key=lambda item: item[1])
+    return [(name, Decimal(count) / 100) for name, count in ranked], Decimal(error) / 100
@@ -0,0 +1,303 @@
+"""
+Synthetic NewSalesData / Product generator fitted on data/sales_data.csv.
+
+The profile keeps the sample's empirical distributions: customers (with
+their order frequencies and segments), ship-to locations, products per
+sub-category, the joint (quantity, discount, profit margin) of each
+sub-category, and the seasonality of orders by month and weekday. Larger
+datasets get proportionally more customers and, more slowly, more product
+variants, so group-by cardinalities grow the way they would in real data.
+
+Rows are produced day by day and released once the week and month they
+belong to are complete, so the denormalized day/week/month totals are
+correct while memory stays bounded by roughly one month of rows.
+"""
+import csv
+import math
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+
+from .buckets import DAYS_PER_MONTH, DAYS_PER_WEEK
+from .loaders import CSV_COLUMNS, DECIMAL_FIELDS, parse_row
+
+SAMPLE_PATH = 'data/sales_data.csv'
+SAMPLE_ENCODING = 'cp1252'
+
+
+@dataclass
+class SalesProfile:
+    customers: list          # (customer_id, customer_name, segment)
+    customer_weights: np.ndarray
+    locations: list          # (country, city, state, postal_code, region)
+    location_weights: np.ndarray
+    products: list           # (product_id, category, sub_category, product_name, unit_price)
+    product_weights: np.ndarray
+    product_sub_category: np.ndarray
+    # (quantity, discount, margin) triples grouped by sub-category
+    mix_offsets: np.ndarray
+    mix_counts: np.ndarray
+    mix: np.ndarray
+    month_weights: np.ndarray    # 12 entries
+    weekday_weights: np.ndarray  # 7 entries
+    start: date
+    end: date
+    sample_rows: int
+
+    @classmethod
+    def from_csv(cls, path=SAMPLE_PATH, encoding=SAMPLE_ENCODING):
+        rows = []
+        with open(path, newline='', encoding=encoding) as f:
+            for line, row in enumerate(csv.DictReader(f), start=2):
+                rows.append(parse_row(row, line))
+        return cls.from_rows(rows)
+
+    @classmethod
+    def from_rows(cls, rows):
+        customers = {}
+        customer_counts = defaultdict(int)
+        location_counts = defaultdict(int)
+        products = {}
+        product_counts = defaultdict(int)
+        sub_categories = {}
+        mix = defaultdict(list)
+        month_counts = np.zeros(12)
+        weekday_counts = np.zeros(7)
+
+        for row in rows:
+            customers[row['customer_id']] = (row['customer_id'], row['customer_name'], row['segment'])
+            customer_counts[row['customer_id']] += 1
+            location_counts[(row['country'], row['city'], row['state'], row['postal_code'], row['region'])] += 1
+
+            quantity = row['quantity']
+            discount = float(row['discount'])
+            sales = float(row['sales'])
+            if row['product_id'] not in products and quantity and discount < 1:
+                unit_price = sales / (quantity * (1 - discount))
+                products[row['product_id']] = (
+                    row['product_id'], row['category'], row['sub_category'], row['product_name'], unit_price,
+                )
+            product_counts[row['product_id']] += 1
+            sub_categories.setdefault(row['sub_category'], len(sub_categories))
+            margin = float(row['profit']) / sales if sales else 0.0
+            mix[row['sub_category']].append((quantity, discount, margin))
+
+            month_counts[row['order_date'].month - 1] += 1
+            weekday_counts[row['order_date'].weekday()] += 1
+
+        customer_list = list(customers.values())
+        product_list = list(products.values())
+        mix_rows, offsets, counts = [], [], []
+        for sub_category in sub_categories:
+            offsets.append(len(mix_rows))
+            counts.append(len(mix[sub_category]))
+            mix_rows.extend(mix[sub_category])
+
+        dates = [row['order_date'] for row in rows]
+        return cls(
+            customers=customer_list,
+            customer_weights=_normalize([customer_counts[c[0]] for c in customer_list]),
+            locations=list(location_counts),
+            location_weights=_normalize(list(location_counts.values())),
+            products=product_list,
+            product_weights=_normalize([product_counts[p[0]] for p in product_list]),
+            product_sub_category=np.array([sub_categories[p[2]] for p in product_list]),
+            mix_offsets=np.array(offsets),
+            mix_counts=np.array(counts),
+            mix=np.array(mix_rows, dtype=float),
+            month_weights=_normalize(month_counts),
+            weekday_weights=_normalize(weekday_counts),
+            start=min(dates),
+            end=max(dates),
+            sample_rows=len(rows),
+        )
+
+
+def _normalize(values):
+    values = np.asarray(values, dtype=float)
+    return values / values.sum()
+
+
+class SalesGenerator:
+    """
+    Generate ``rows`` synthetic sales rows between ``start`` and ``end``
+    (the sample's date span by default).
+    """
+
+    def __init__(self, profile, rows, start=None, end=None, seed=None):
+        self.profile = profile
+        self.rows = rows
+        self.start = start or profile.start
+        self.end = end or profile.end
+        self.rng = np.random.default_rng(seed)
+        self.scale = max(rows / profile.sample_rows, 1.0)
+        self._build_customers()
+        self._build_products()
+
+    def _build_customers(self):
+        profile = self.profile
+        extra = int(len(profile.customers) * (self.scale - 1))
+        self.customers = list(profile.customers)
+        weights = list(profile.customer_weights)
+        if extra:
+            names = [c[1].split(' ', 1) for c in profile.customers if ' ' in c[1]]
+            segments = [c[2] for c in profile.customers]
+            firsts = self.rng.integers(len(names), size=extra)
+            lasts = self.rng.integers(len(names), size=extra)
+            picked_segments = self.rng.integers(len(segments), size=extra)
+            for i in range(extra):
+                first, last = names[firsts[i]][0], names[lasts[i]][1]
+                customer_id = f"{first[0]}{last[0]}-{90000 + i}"
+                self.customers.append((customer_id, f"{first} {last}", segments[picked_segments[i]]))
+            # Re-use the sample's order-frequency distribution for new customers
+            weights.extend(self.rng.choice(profile.customer_weights, size=extra))
+        self.customer_weights = _normalize(weights)
+
+    def _build_products(self):
+        profile = self.profile
+        # Catalogues grow more slowly than order volume
+        extra = int(len(profile.products) * (math.sqrt(self.scale) - 1))
+        self.products = list(profile.products)
+        weights = list(profile.product_weights)
+        sub_category = list(profile.product_sub_category)
+        if extra:
+            templates = self.rng.integers(len(profile.products), size=extra)
+            price_noise = self.rng.lognormal(0, 0.25, size=extra)
+            for i, template in enumerate(templates):
+                product_id, category, sub_cat, name, unit_price = profile.products[template]
+                prefix = product_id.rsplit('-', 1)[0]
+                self.products.append((
+                    f"{prefix}-{20000000 + i:08d}", category, sub_cat,
+                    f"{name} (Model {i + 1})"[:200], unit_price * price_noise[i],
+                ))
+                weights.append(profile.product_weights[template])
+                sub_category.append(profile.product_sub_category[template])
+        self.product_weights = _normalize(weights)
+        self.product_sub_category = np.array(sub_category)
+
+    def product_rows(self):
+        """Product catalogue rows (Product model field values) for the generated products."""
+        stock = self.rng.integers(0, 500, size=len(self.products))
+        for (product_id, category, sub_category, name, unit_price), stock_level in zip(self.products, stock):
+            yield {
+                'product_id': product_id,
+                'product_name': name[:255],
+                'category': category,
+                'sub_category': sub_category,
+                'price': Decimal(f"{unit_price:.2f}"),
+                'stock_level': int(stock_level),
+            }
+
+    def _day_counts(self):
+        days = [self.start + timedelta(days=i) for i in range((self.end - self.start).days + 1)]
+        weights = np.array([
+            self.profile.month_weights[d.month - 1] * self.profile.weekday_weights[d.weekday()]
+            for d in days
+        ])
+        counts = self.rng.multinomial(self.rows, _normalize(weights))
+        return zip(days, counts)
+
+    def _day_rows(self, day, count):
+        rng = self.rng
+        profile = self.profile
+        customers = rng.choice(len(self.customers), size=count, p=self.customer_weights)
+        locations = rng.choice(len(profile.locations), size=count, p=profile.location_weights)
+        products = rng.choice(len(self.products), size=count, p=self.product_weights)
+        sub_categories = self.product_sub_category[products]
+        picks = profile.mix_offsets[sub_categories] + (
+            rng.random(count) * profile.mix_counts[sub_categories]
+        ).astype(int)
+        quantity, discount, margin = profile.mix[picks].T
+        noise = rng.lognormal(0, 0.05, size=count)
+
+        rows = []
+        for i in range(count):
+            customer_id, customer_name, segment = self.customers[customers[i]]
+            country, city, state, postal_code, region = profile.locations[locations[i]]
+            product_id, category, sub_category, product_name, unit_price = self.products[products[i]]
+            sales = float(unit_price * quantity[i] * (1 - discount[i]) * noise[i])
+            rows.append({
+                'order_date': day,
+                'customer_id': customer_id,
+                'customer_name': customer_name,
+                'segment': segment,
+                'country': country,
+                'city': city,
+                'state': state,
+                'postal_code': postal_code,
+                'region': region,
+                'product_id': product_id,
+                'category': category,
+                'sub_category': sub_category,
+                'product_name': product_name,
+                'sales': round(sales, 2),
+                'quantity': int(quantity[i]),
+                'discount': round(float(discount[i]), 2),
+                'profit': round(sales * float(margin[i]), 2),
+            })
+        return rows
+
+    def iter_rows(self):
+        """Yield rows (NewSalesData field values) in date order."""
+        pending = deque()
+        day_totals = {}
+        week_totals = defaultdict(float)
+        month_totals = defaultdict(float)
+
+        def complete(day, today):
+            week_end = day + timedelta(days=6 - day.weekday())
+            month_end = date(day.year + day.month // 12, day.month % 12 + 1, 1) - timedelta(days=1)
+            return today >= max(week_end, month_end)
+
+        def flush(day, rows):
+            week = week_totals[day - timedelta(days=day.weekday())]
+            month = month_totals[(day.year, day.month)]
+            totals = {
+                'day_sales': day_totals.pop(day),
+                'week_sales': week,
+                'avg_for_week': week / DAYS_PER_WEEK,
+                'month_sales': month,
+                'avg_for_month': month / DAYS_PER_MONTH,
+            }
+            for row in rows:
+                row.update(totals)
+                for field, exponent in DECIMAL_FIELDS.items():
+                    row[field] = Decimal(repr(row[field])).quantize(exponent)
+                yield row
+
+        for day, count in self._day_counts():
+            rows = self._day_rows(day, count)
+            total = sum(row['sales'] for row in rows)
+            day_totals[day] = total
+            week_totals[day - timedelta(days=day.weekday())] += total
+            month_totals[(day.year, day.month)] += total
+            pending.append((day, rows))
+            while pending and complete(pending[0][0], day):
+                yield from flush(*pending.popleft())
+        while pending:
+            yield from flush(*pending.popleft())
+
+    def iter_batches(self, batch_size=5000):
+        batch = []
+        for row in self.iter_rows():
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def write_csv(rows, fileobj):
+    """Write generated rows in the sales CSV export format (dd/mm/yyyy dates)."""
+    headers = list(CSV_COLUMNS)
+    fields = list(CSV_COLUMNS.values())
+    writer = csv.writer(fileobj)
+    writer.writerow(headers)
+    for row in rows:
+        values = [row[field] for field in fields]
+        values[0] = row['order_date'].strftime('%d/%m/%Y')
+        writer.writerow(values)
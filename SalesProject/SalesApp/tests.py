@@ -1,3 +1,1924 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import joblib
+import numpy as np
+import pandas as pd
+from asgiref.sync import async_to_sync
+from django.core.cache import caches as django_caches
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections, router, transaction
+from django.db.models import Count, F, Sum
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+from . import (
+    async_views, buckets, cache, columnar, dashboard, dimensions, distinct, exports, forecast_store, forecast_tasks,
+    forecasting, inference, kpis, loaders, metrics, partitions, renderers, retraining, routers, rollups, sketches,
+    views,
+)
+from .forecast_tasks import PredictionError
+from .management.commands import explain_views
+from .model_registry import ModelRegistry, registry
+from .models import (
+    Customer, DailySalesSummary, DataVersion, DistinctSketch, ForecastPoint, Location, NewSalesData, Product,
+    SalesProduct, SalesSketch,
+)
+from .serializers import SalesDataSerializer
+
+
+def _sale(day, customer, product, location, sales):
+    zero = Decimal('0')
+    return NewSalesData(
+        order_date=day, customer=customer, location=location, product=product,
+        sales=sales, quantity=1, discount=zero, profit=zero,
+        avg_for_week=zero, avg_for_month=zero, week_sales=zero, month_sales=zero, day_sales=zero,
+    )
+
+
+def _dimensions():
+    """A customer, a product and a location to hang sales on."""
+    return (
+        Customer.objects.create(customer_id='CU-1', customer_name='Customer 1', segment='Consumer'),
+        SalesProduct.objects.create(
+            product_id='OFF-1', product_name='Stapler', category='Office Supplies',
+            sub_category='Fasteners',
+        ),
+        Location.objects.create(
+            country='United States', city='Austin', state='Texas', postal_code='78701', region='Central',
+        ),
+    )
+
+
+def _csv(*rows):
+    """A sales CSV in the data/sales_data.csv format."""
+    buffer = StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(loaders.CSV_COLUMNS))
+    writer.writeheader()
+    writer.writerows(rows)
+    buffer.seek(0)
+    return buffer
+
+
+CSV_ROW = {
+    'Order Date': '03/01/2014', 'Customer ID': 'DP-13000', 'Customer Name': 'Darren Powers', 'Segment': 'Consumer',
+    'Country': 'United States', 'City': 'Houston', 'State': 'Texas', 'Postal Code': '77095', 'Region': 'Central',
+    'Product ID': 'OFF-PA-10000174', 'Category': 'Office Supplies', 'Sub-Category': 'Paper',
+    'Product Name': 'Message Book', 'Sales': '16.448', 'Quantity': '2', 'Discount': '0.2', 'Profit': '5.5512',
+    'Avg for Week': '688.3288571', 'Avg for Month': '474.5631667', 'Week Sales': '4818.302',
+    'Month Sales': '14236.895', 'Day Sales': '16.448',
+}
+
+
+class LoaderTests(TestCase):
+    ROWS = [
+        CSV_ROW,
+        {**CSV_ROW, 'Sales': '3.552', 'Profit': '1'},
+        {**CSV_ROW, 'Order Date': '04/01/2014', 'Customer ID': 'PO-19195', 'Customer Name': 'Phillina Ober',
+         'Sales': '11.784', 'Profit': '4.2717'},
+    ]
+
+    def test_parse_row(self):
+        values = loaders.parse_row(CSV_ROW)
+        self.assertEqual(values['order_date'], date(2014, 1, 3))
+        self.assertEqual(values['quantity'], 2)
+        self.assertEqual(values['sales'], Decimal('16.45'))
+        self.assertEqual(values['avg_for_week'], Decimal('688.3289'))
+        self.assertEqual(values['customer_id'], 'DP-13000')
+
+    def test_bad_rows_abort_or_are_skipped(self):
+        bad = {**CSV_ROW, 'Sales': 'n/a'}
+        with self.assertRaisesRegex(loaders.CSVRowError, '^line 3: '):
+            list(loaders.iter_batches(_csv(CSV_ROW, bad)))
+
+        errors = []
+        batches = list(loaders.iter_batches(_csv(CSV_ROW, bad, CSV_ROW), batch_size=1, errors=errors))
+        self.assertEqual([len(batch) for batch in batches], [1, 1])
+        self.assertEqual([error.line for error in errors], [3])
+
+    def test_load_refreshes_the_rollup_once(self):
+        with mock.patch.object(rollups, 'sales_changed', wraps=rollups.sales_changed) as changed:
+            loaded, _ = loaders.load_csv(_csv(*self.ROWS), batch_size=1)
+        self.assertEqual(loaded, 3)
+        changed.assert_called_once()
+
+        self.assertEqual(Customer.objects.count(), 2)
+        self.assertEqual(
+            list(DailySalesSummary.objects.values_list('date', 'total_sales', 'order_count')),
+            [(date(2014, 1, 3), Decimal('20.00'), 2), (date(2014, 1, 4), Decimal('11.78'), 1)],
+        )
+        # The bucket columns are recomputed, not taken from the file
+        sale = NewSalesData.objects.get(order_date=date(2014, 1, 4))
+        self.assertEqual((sale.day_sales, sale.week_sales), (Decimal('11.78'), Decimal('31.78')))
+
+    def test_a_failed_load_keeps_the_rollup_of_what_it_loaded(self):
+        rows = [*self.ROWS[:2], {**CSV_ROW, 'Quantity': 'two'}]
+        with self.assertRaises(loaders.CSVRowError):
+            loaders.load_csv(_csv(*rows), batch_size=2)
+        self.assertEqual(NewSalesData.objects.count(), 2)
+        self.assertEqual(DailySalesSummary.objects.get().order_count, 2)
+
+
+class FakeSarima:
+    """SARIMA results stand-in trained up to ``last``, forecasting ``100 * step``."""
+
+    def __init__(self, last):
+        self.model = SimpleNamespace(data=SimpleNamespace(dates=pd.DatetimeIndex([last])))
+        self.calls = []
+
+    def get_forecast(self, steps):
+        self.calls.append(steps)
+        return SimpleNamespace(predicted_mean=pd.Series(np.arange(1, steps + 1) * 100.0))
+
+
+class ForecastingTests(SimpleTestCase):
+    def setUp(self):
+        forecasting.clear()
+        self.addCleanup(forecasting.clear)
+        self.model = FakeSarima('2018-12-31')
+
+    def test_one_forecast_answers_every_horizon(self):
+        self.assertEqual(forecasting.forecast_at(self.model, [3, 1, 2]), [300.0, 100.0, 200.0])
+        self.assertEqual(list(forecasting.predicted_mean(self.model, 2)), [100.0, 200.0])
+        self.assertEqual(self.model.calls, [3])
+
+        forecasting.predicted_mean(self.model, 5)
+        forecasting.predicted_mean(self.model, 2, version='retrained')
+        self.assertEqual(self.model.calls, [3, 5, 2])
+
+    def test_memo_is_bounded(self):
+        with mock.patch.object(forecasting, 'MEMO_SIZE', 2):
+            for version in ('a', 'b', 'c'):
+                forecasting.predicted_mean(self.model, 1, version=version)
+            forecasting.predicted_mean(self.model, 1, version='a')
+        self.assertEqual(self.model.calls, [1, 1, 1, 1])
+
+    def test_range(self):
+        with mock.patch.object(registry, 'get_with_version', return_value=(self.model, 'v1')):
+            predictions = forecast_tasks.sarima_range('weekly_sarima', '2019-01-28', '2019-02-11')
+            self.assertEqual(predictions, [
+                {'date': '2019-01-28', 'predicted_sales': 100.0},
+                {'date': '2019-02-04', 'predicted_sales': 200.0},
+                {'date': '2019-02-11', 'predicted_sales': 200.0},
+            ])
+            self.assertEqual(self.model.calls, [2])
+            for start, end in (('2019-02-11', '2019-01-28'), ('2018-12-31', '2019-01-28')):
+                with self.assertRaises(PredictionError):
+                    forecast_tasks.sarima_range('weekly_sarima', start, end)
+
+
+class ModelRegistryTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / 'model.joblib'
+        self.registry = ModelRegistry(directory.name, files={'model': 'model.joblib'}, check_interval=0)
+
+    def write(self, value, mtime=None):
+        joblib.dump(value, self.path)
+        if mtime is not None:
+            os.utime(self.path, (mtime, mtime))
+
+    def test_loads_lazily_and_once(self):
+        self.write({'coef': 1})
+        self.assertEqual(self.registry.stats()['model']['loaded'], False)
+        with mock.patch.object(joblib, 'load', wraps=joblib.load) as load:
+            model, version = self.registry.get_with_version('model')
+            self.assertIs(self.registry.get('model'), model)
+        self.assertEqual(model, {'coef': 1})
+        self.assertEqual(load.call_count, 1)
+        self.assertEqual(version, self.registry.artifact_version('model'))
+        with self.assertRaises(KeyError):
+            self.registry.get('other')
+
+    def test_reloads_changed_artifacts_only(self):
+        self.write({'coef': 1}, mtime=1000)
+        first = self.registry.entry('model')
+        # Touched but identical: same entry
+        self.write({'coef': 1}, mtime=2000)
+        self.assertIs(self.registry.entry('model'), first)
+
+        self.write({'coef': 2}, mtime=3000)
+        second = self.registry.entry('model')
+        self.assertEqual(second.model, {'coef': 2})
+        self.assertNotEqual(second.version, first.version)
+
+    def test_keeps_the_previous_model_when_the_new_one_is_broken(self):
+        self.write({'coef': 1}, mtime=1000)
+        self.registry.get('model')
+        self.path.write_bytes(b'not a model')
+        entry = self.registry.entry('model')
+        self.assertEqual(entry.model, {'coef': 1})
+        self.assertIsNotNone(entry.error)
+
+    def test_missing_artifact(self):
+        self.assertIsNone(self.registry.get('model'))
+        self.assertIsNone(self.registry.artifact_version('model'))
+        self.assertIsNotNone(self.registry.entry('model').error)
+
+    def test_concurrent_first_use_loads_once(self):
+        self.write({'coef': 1})
+        registry = ModelRegistry(self.path.parent, files={'model': 'model.joblib'})
+        with mock.patch.object(joblib, 'load', wraps=joblib.load) as load:
+            threads = [threading.Thread(target=registry.get, args=('model',)) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(load.call_count, 1)
+
+
+RECORD = {
+    'order_date': '2017-03-01', 'customer_id': 'CU-1', 'customer_name': 'Customer 1', 'segment': 'Consumer',
+    'country': 'United States', 'city': 'Austin', 'state': 'Texas', 'postal_code': '78701', 'region': 'Central',
+    'product_id': 'OFF-1', 'category': 'Office Supplies', 'sub_category': 'Fasteners', 'product_name': 'Stapler',
+    'sales': '10.00', 'quantity': 1, 'discount': '0.00', 'profit': '2.00',
+    'avg_for_week': '0', 'avg_for_month': '0', 'week_sales': '0', 'month_sales': '0', 'day_sales': '0',
+}
+
+
+class BulkIngestTests(TestCase):
+    URL = '/api/sales/bulk/'
+
+    def post(self, records, query=''):
+        return self.client.post(self.URL + query, records, content_type='application/json')
+
+    def test_json_records(self):
+        response = self.post({'records': [RECORD, {**RECORD, 'customer_id': 'CU-2', 'sales': '5.50'}]})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'status': 'success', 'created': 2, 'errors': []})
+        self.assertEqual(Customer.objects.count(), 2)
+        self.assertEqual(
+            DailySalesSummary.objects.values_list('total_sales', 'order_count').get(), (Decimal('15.50'), 2),
+        )
+
+    def test_invalid_rows_are_skipped_or_reject_the_batch(self):
+        records = [RECORD, {**RECORD, 'quantity': 'two'}, RECORD]
+        response = self.post(records, '?atomic=true')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(([error['row'] for error in response.json()['errors']]), [1])
+        self.assertFalse(NewSalesData.objects.exists())
+
+        response = self.post(records)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.json()['status'], response.json()['created']), ('partial', 2))
+        self.assertEqual(NewSalesData.objects.count(), 2)
+
+    def test_limits(self):
+        self.assertEqual(self.post({'rows': []}).status_code, 400)
+        with mock.patch.object(views, 'BULK_MAX_ROWS', 2):
+            response = self.post([RECORD] * 3)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(NewSalesData.objects.exists())
+
+    def test_ndjson(self):
+        body = '\n'.join(json.dumps(record) for record in (RECORD, {**RECORD, 'sales': '1.00'})) + '\n\n'
+        response = self.client.post(self.URL, body, content_type='application/x-ndjson')
+        self.assertEqual(response.json()['created'], 2)
+
+        response = self.client.post(self.URL, json.dumps(RECORD) + '\n{"sales":', content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('line 2', response.json()['detail'])
+
+    def test_csv(self):
+        # Field-named columns, and the headers of the sales CSV export
+        buffer = StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=list(RECORD))
+        writer.writeheader()
+        writer.writerow(RECORD)
+        response = self.client.post(self.URL, buffer.getvalue(), content_type='text/csv')
+        self.assertEqual(response.json()['created'], 1)
+
+        response = self.client.post(self.URL, _csv(CSV_ROW).getvalue(), content_type='text/csv')
+        self.assertEqual(response.json()['created'], 1)
+        sale = NewSalesData.objects.get(customer__customer_id='DP-13000')
+        self.assertEqual((sale.order_date, sale.sales), (date(2014, 1, 3), Decimal('16.45')))
+
+
+class RollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, cls.product, cls.location = _dimensions()
+        NewSalesData.objects.bulk_create([
+            _sale(day, cls.customer, cls.product, cls.location, Decimal('10.00'))
+            for day in (date(2017, 3, 1), date(2017, 3, 1), date(2017, 3, 2))
+        ])
+        rollups.rebuild_daily_summary()
+
+    def summary(self):
+        return {row.date: (row.total_sales, row.order_count) for row in DailySalesSummary.objects.all()}
+
+    def test_rebuild(self):
+        self.assertEqual(self.summary(), {date(2017, 3, 1): (20, 2), date(2017, 3, 2): (10, 1)})
+
+    def test_refresh_after_writes(self):
+        _sale(date(2017, 3, 2), self.customer, self.product, self.location, Decimal('5.50')).save()
+        moved = NewSalesData.objects.filter(order_date=date(2017, 3, 1)).first()
+        moved.order_date = date(2017, 3, 5)
+        moved.save()
+        rollups.sales_changed({date(2017, 3, 1), date(2017, 3, 2), date(2017, 3, 5)})
+        self.assertEqual(self.summary(), {
+            date(2017, 3, 1): (10, 1), date(2017, 3, 2): (Decimal('15.50'), 2), date(2017, 3, 5): (10, 1),
+        })
+
+        NewSalesData.objects.filter(order_date=date(2017, 3, 5)).delete()
+        rollups.sales_changed([date(2017, 3, 5)])
+        self.assertNotIn(date(2017, 3, 5), self.summary())
+
+
+class IndexUsageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        customer, product, location = _dimensions()
+        NewSalesData.objects.bulk_create([
+            _sale(date(2017, 1, 1) + timedelta(days=day % 90), customer, product, location, Decimal(day))
+            for day in range(300)
+        ])
+        rollups.rebuild_daily_summary()
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # A few hundred rows are cheaper to scan than to look up
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def test_date_filters_use_the_order_date_index(self):
+        with CaptureQueriesContext(connection) as queries:
+            list(NewSalesData.objects.filter(order_date__range=(date(2017, 2, 1), date(2017, 2, 28)))
+                 .values_list('sales', flat=True))
+        scans = explain_views.explain(queries[0]['sql'])
+        self.assertTrue(all(kind in explain_views.INDEX_NODES for kind, _ in scans), scans)
+        # A bitmap heap scan names no index, its bitmap index scan does
+        self.assertTrue(any('order_date' in (index or '') for _, index in scans), scans)
+
+    def test_report_covers_the_analytics_views(self):
+        out = StringIO()
+        call_command('explain_views', '--json', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertTrue(report)
+        self.assertLessEqual({entry['view'] for entry in report}, {name for name, _ in explain_views.ROUTES})
+        for entry in report:
+            self.assertTrue(entry['scans'], entry['sql'])
+
+
+@skipUnless(connection.vendor == 'postgresql', "Concurrent writers need PostgreSQL")
+class ConcurrentRefreshTests(TransactionTestCase):
+    def test_refreshes_of_a_month_wait_for_each_other(self):
+        customer, product, location = _dimensions()
+        refreshed, commit = threading.Event(), threading.Event()
+        errors = []
+
+        def write(day, hold):
+            try:
+                with transaction.atomic():
+                    _sale(day, customer, product, location, Decimal('10.00')).save()
+                    rollups.sales_changed([day])
+                    if hold:
+                        refreshed.set()
+                        commit.wait(5)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        first = threading.Thread(target=write, args=(date(2017, 3, 1), True))
+        first.start()
+        refreshed.wait(5)
+        second = threading.Thread(target=write, args=(date(2017, 3, 1), False))
+        second.start()
+        second.join(0.5)
+        # Waiting for the first write's month
+        self.assertTrue(second.is_alive())
+        commit.set()
+        first.join()
+        second.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(DailySalesSummary.objects.get().order_count, 2)
+        self.assertEqual(set(NewSalesData.objects.values_list('month_sales', flat=True)), {20})
+
+    def _refresh_concurrently(self, refresh, day):
+        """Run ``refresh([day])`` in two transactions that overlap; the errors raised."""
+        refreshed, commit = threading.Event(), threading.Event()
+        errors = []
+
+        def run(hold):
+            try:
+                with transaction.atomic():
+                    refresh([day])
+                    if hold:
+                        refreshed.set()
+                        commit.wait(5)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        first = threading.Thread(target=run, args=(True,))
+        first.start()
+        refreshed.wait(5)
+        second = threading.Thread(target=run, args=(False,))
+        second.start()
+        second.join(0.5)
+        commit.set()
+        first.join()
+        second.join()
+        return errors
+
+    def test_concurrent_sketch_refreshes_do_not_collide(self):
+        customer, product, location = _dimensions()
+        day = date(2017, 3, 1)
+        _sale(day, customer, product, location, Decimal('10.00')).save()
+        sketches.refresh([day])
+
+        self.assertEqual(self._refresh_concurrently(sketches.refresh, day), [])
+        self.assertEqual(SalesSketch.objects.filter(date=day).count(), 4)
+
+    def test_concurrent_distinct_refreshes_do_not_collide(self):
+        customer, product, location = _dimensions()
+        day = date(2017, 3, 1)
+        _sale(day, customer, product, location, Decimal('10.00')).save()
+        distinct.refresh([day])
+
+        self.assertEqual(self._refresh_concurrently(distinct.refresh, day), [])
+        self.assertEqual(DistinctSketch.objects.filter(date=day).count(), 20)
+
+
+class ResponseCacheTests(TestCase):
+    URL = '/api/kpis/?periods=day&date=2017-03-01'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, cls.product, cls.location = _dimensions()
+        _sale(date(2017, 3, 1), cls.customer, cls.product, cls.location, Decimal('10.00')).save()
+        rollups.rebuild_daily_summary()
+
+    def setUp(self):
+        django_caches[cache.CACHE_ALIAS].clear()
+
+    def day_sales(self, response):
+        return response.json()['kpis']['day']['current']['sales']
+
+    def test_hits_and_revalidation(self):
+        first = self.client.get(self.URL)
+        second = self.client.get(self.URL)
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(first['ETag'], second['ETag'])
+        stats = cache.get_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+        not_modified = self.client.get(self.URL, headers={'If-None-Match': first['ETag']})
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+
+        self.client.get(self.URL.replace('day', 'month'))
+        self.assertEqual(cache.get_stats()['misses'], 2)
+
+    def test_writes_invalidate_cached_responses(self):
+        before = self.client.get(self.URL)
+        self.assertEqual(self.day_sales(before), 10)
+        version = cache.get_data_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            _sale(date(2017, 3, 1), self.customer, self.product, self.location, Decimal('5.00')).save()
+            rollups.sales_changed([date(2017, 3, 1)])
+        self.assertGreater(cache.get_data_version(), version)
+
+        after = self.client.get(self.URL, headers={'If-None-Match': before['ETag']})
+        self.assertEqual(after.status_code, 200)
+        self.assertEqual(self.day_sales(after), 15)
+        self.assertNotEqual(after['ETag'], before['ETag'])
+
+    def test_the_version_is_shared_through_the_database(self):
+        version = cache.get_data_version()
+        # Another process's cache holds nothing of this one's
+        django_caches[cache.CACHE_ALIAS].clear()
+        self.assertEqual(cache.get_data_version(), version)
+
+        before = self.client.get(self.URL)
+        _sale(date(2017, 3, 1), self.customer, self.product, self.location, Decimal('5.00')).save()
+        rollups.refresh_days([date(2017, 3, 1)])
+        self.assertEqual(self.day_sales(self.client.get(self.URL)), 10)
+        # The commit of that write, bumped by another worker or a command
+        DataVersion.objects.update(version=F('version') + 1)
+        after = self.client.get(self.URL, headers={'If-None-Match': before['ETag']})
+        self.assertEqual((after.status_code, self.day_sales(after)), (200, 15))
+
+    def test_errors_are_not_cached(self):
+        self.assertEqual(self.client.get('/api/kpis/?date=someday').status_code, 400)
+        self.assertEqual(self.client.get('/api/kpis/?date=someday').status_code, 400)
+        self.assertEqual(cache.get_stats()['hits'], 0)
+
+
+def _blocking_task(started, release):
+    started.set()
+    release.wait(5)
+    return 'done'
+
+
+def _failing_task():
+    raise PredictionError("SARIMA model not loaded", 500)
+
+
+class InferencePoolTests(SimpleTestCase):
+    def threaded(self, pool):
+        """Let ``pool`` hand its tasks to threads instead of processes."""
+        executor = ThreadPoolExecutor(max_workers=pool.workers)
+        self.addCleanup(executor.shutdown)
+        return mock.patch.object(pool, '_get_executor', return_value=executor)
+
+    def test_tasks_run_in_worker_processes(self):
+        pool = inference.InferencePool(workers=1, max_queue=0)
+        self.addCleanup(pool.shutdown)
+        self.assertNotEqual(pool.run(os.getpid), os.getpid())
+        stats = pool.stats()
+        self.assertEqual((stats['mode'], stats['started'], stats['completed']), ('process_pool', True, 1))
+
+    def test_a_full_queue_is_rejected(self):
+        pool = inference.InferencePool(workers=1, max_queue=0, enabled=False)
+        started, release = threading.Event(), threading.Event()
+        worker = threading.Thread(target=pool.run, args=(_blocking_task, started, release))
+        worker.start()
+        self.addCleanup(worker.join)
+        self.addCleanup(release.set)
+        started.wait(5)
+
+        with self.assertRaises(inference.InferenceOverloaded) as raised:
+            pool.run(_blocking_task, started, release)
+        self.assertEqual(raised.exception.status_code, 503)
+        self.assertEqual((pool.stats()['rejected'], pool.stats()['in_flight']), (1, 1))
+
+    def test_slow_results_time_out_but_hold_their_slot(self):
+        pool = inference.InferencePool(workers=1, max_queue=0, timeout=0.05)
+        started, release = threading.Event(), threading.Event()
+        with self.threaded(pool):
+            with self.assertRaises(inference.InferenceTimeout) as raised:
+                pool.run(_blocking_task, started, release)
+            self.assertEqual(raised.exception.status_code, 504)
+            # Still running: no room for another forecast
+            with self.assertRaises(inference.InferenceOverloaded):
+                pool.run(_blocking_task, started, release)
+            release.set()
+            # Queued behind the first task, after its slot was given back
+            pool._get_executor().submit(int).result()
+            self.assertEqual(pool.run(_blocking_task, started, release), 'done')
+        stats = pool.stats()
+        self.assertEqual((stats['timed_out'], stats['rejected'], stats['completed']), (1, 1, 1))
+
+    def test_task_errors_reach_the_caller(self):
+        pool = inference.InferencePool(enabled=False)
+        with self.assertRaises(PredictionError) as raised:
+            pool.run(_failing_task)
+        self.assertEqual(raised.exception.status_code, 500)
+        self.assertEqual((pool.stats()['failed'], pool.stats()['in_flight']), (1, 0))
+
+    def test_a_broken_pool_is_replaced(self):
+        pool = inference.InferencePool(workers=1)
+        broken = mock.Mock()
+        broken.submit.return_value.result.side_effect = BrokenProcessPool()
+        pool._executor = broken
+        with self.assertRaises(inference.InferenceOverloaded):
+            pool.run(_blocking_task, None, None)
+        self.assertIsNone(pool._executor)
+        broken.shutdown.assert_called_once()
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, cls.product, cls.location = _dimensions()
+        # Several sales per day, so pages end in the middle of a day
+        NewSalesData.objects.bulk_create([
+            _sale(date(2017, 3, 1) + timedelta(days=i // 3), cls.customer, cls.product, cls.location, Decimal(i))
+            for i in range(1, 26)
+        ])
+        cls.expected = list(NewSalesData.objects.order_by('-order_date', '-id').values_list('id', flat=True))
+
+    def test_plain_list_unless_a_page_is_asked_for(self):
+        response = self.client.get('/api/sales/')
+        self.assertEqual([row['id'] for row in response.json()], self.expected)
+        response = self.client.get('/api/sales/?limit=4')
+        self.assertEqual([row['id'] for row in response.json()], self.expected[:4])
+
+    def test_pages_cover_every_row_once(self):
+        url, ids, pages = '/api/sales/?page_size=4', [], 0
+        while url:
+            page = self.client.get(url).json()
+            self.assertLessEqual(len(page['results']), 4)
+            ids += [row['id'] for row in page['results']]
+            url, pages = page['next'], pages + 1
+        self.assertEqual(ids, self.expected)
+        self.assertEqual(pages, 7)
+
+    def test_invalid_parameters(self):
+        for query in ('page_size=0', 'page_size=x', 'cursor=not-a-cursor', 'limit=-1'):
+            self.assertEqual(self.client.get(f'/api/sales/?{query}').status_code, 400, query)
+
+    def test_products_are_paginated_on_request(self):
+        for i, name in ((1, 'Stapler'), (2, 'Paper')):
+            Product.objects.create(
+                product_id=f'OFF-{i}', product_name=name, category='Office Supplies',
+                sub_category='Paper', price=Decimal('5.00'), stock_level=10,
+            )
+        self.assertEqual(len(self.client.get('/api/new-product-data/').json()), 2)
+        page = self.client.get('/api/new-product-data/?page_size=1').json()
+        self.assertEqual([row['product_id'] for row in page['results']], ['OFF-1'])
+        page = self.client.get(page['next']).json()
+        self.assertEqual(([row['product_id'] for row in page['results']], page['next']), (['OFF-2'], None))
+
+
+class ExportTests(TestCase):
+    URL = '/api/sales/export/'
+
+    @classmethod
+    def setUpTestData(cls):
+        customer, product, location = _dimensions()
+        NewSalesData.objects.bulk_create([
+            _sale(date(2017, 3, day), customer, product, location, Decimal(day))
+            for day in (3, 1, 2, 2, 5)
+        ])
+
+    def rows(self, response):
+        return list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))
+
+    def test_csv(self):
+        response = self.client.get(self.URL)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        header, *rows = self.rows(response)
+        self.assertEqual(header, exports.EXPORT_FIELDS)
+        expected = NewSalesData.objects.order_by('order_date', 'id')
+        self.assertEqual([row[0] for row in rows], [str(sale.id) for sale in expected])
+        self.assertEqual(rows[0][header.index('customer_id')], 'CU-1')
+
+        response = self.client.get(
+            self.URL, {'start': '2017-03-02', 'end': '2017-03-03', 'columns': 'order_date,sales'},
+        )
+        self.assertEqual(self.rows(response), [
+            ['order_date', 'sales'], ['2017-03-02', '2.00'], ['2017-03-02', '2.00'], ['2017-03-03', '3.00'],
+        ])
+
+    def test_invalid_parameters(self):
+        for params in ({'start': '03/01/2017'}, {'start': '2017-03-02', 'end': '2017-03-01'},
+                       {'columns': 'sales,margin'}, {'output': 'xlsx'}):
+            self.assertEqual(self.client.get(self.URL, params).status_code, 400, params)
+
+    def test_chunks(self):
+        chunks = list(exports.stream_csv(exports.export_queryset(), ['id'], chunk_size=2))
+        self.assertEqual([chunk.count('\n') for chunk in chunks], [1, 2, 2, 1])
+
+    @skipUnless(exports.arrow_available(), "needs pyarrow")
+    def test_parquet_and_arrow(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        response = self.client.get(self.URL, {'output': 'parquet', 'columns': 'order_date,sales,quantity'})
+        table = pq.read_table(pa.BufferReader(b''.join(response.streaming_content)))
+        self.assertEqual(table.schema, exports.arrow_schema(['order_date', 'sales', 'quantity']))
+        self.assertEqual(table.column('sales').to_pylist(), [Decimal(day) for day in (1, 2, 2, 3, 5)])
+
+        response = self.client.get(self.URL, {'output': 'arrow', 'end': '2017-03-02'})
+        table = pa.ipc.open_stream(b''.join(response.streaming_content)).read_all()
+        self.assertEqual((table.num_rows, table.column_names), (3, exports.EXPORT_FIELDS))
+
+    async def test_asgi_streams_chunk_by_chunk(self):
+        with mock.patch.object(exports, 'aiterate', wraps=exports.aiterate) as aiterate, warnings.catch_warnings():
+            # Django warns when it has to read a sync iterator up front
+            warnings.simplefilter('error')
+            response = await self.async_client.get(self.URL, {'columns': 'id'})
+            self.assertTrue(response.is_async)
+            chunks = [chunk async for chunk in response.streaming_content]
+        aiterate.assert_called_once()
+        # The header, then the rows
+        self.assertEqual([chunk.count(b'\n') for chunk in chunks], [1, 5])
+
+
+class ColumnarSnapshotTests(TestCase):
+    URLS = [
+        '/api/dashboard-stats/', '/api/product-data/', '/api/customer-data/?limit=3',
+        '/api/get-top-customers/', '/api/get-top-products/?limit=2',
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, cls.product, cls.location = _dimensions()
+        customers = [cls.customer] + [
+            Customer.objects.create(customer_id=f'CU-{i}', customer_name=f'Customer {i}', segment='Corporate')
+            for i in range(2, 7)
+        ]
+        # Two product ids share a name, which both paths total together
+        products = [cls.product] + [
+            SalesProduct.objects.create(
+                product_id=f'OFF-{i}', product_name='Stapler' if i == 2 else f'Product {i}', category='Furniture',
+                sub_category='Chairs',
+            )
+            for i in range(2, 6)
+        ]
+        generator = random.Random(12)
+        NewSalesData.objects.bulk_create([
+            _sale(
+                date(2017, 1, 1) + timedelta(days=generator.randrange(120)), generator.choice(customers),
+                generator.choice(products), cls.location, Decimal(generator.randrange(1, 100000)).scaleb(-2),
+            )
+            for _ in range(300)
+        ])
+        rollups.rebuild_daily_summary()
+
+    def setUp(self):
+        django_caches[cache.CACHE_ALIAS].clear()
+        patcher = mock.patch.object(columnar, '_snapshot', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def enabled(self):
+        return mock.patch.dict(columnar.CONFIG, ENABLED=True)
+
+    def test_snapshot_matches_sql(self):
+        with self.enabled():
+            snapshot = columnar.get_snapshot()
+        start, end = date(2017, 2, 1), date(2017, 3, 15)
+        totals = NewSalesData.objects.filter(order_date__range=(start, end)).aggregate(
+            sales=Sum('sales'), profit=Sum('profit'), quantity=Sum('quantity'), orders=Count('id'),
+        )
+        self.assertEqual(snapshot.totals(start, end), totals)
+        for dimension in ('customer', 'product'):
+            self.assertEqual(
+                snapshot.sum_by(f'{dimension}_name', limit=3), dimensions.ranked_by_name(dimension, limit=3),
+            )
+            self.assertEqual(
+                snapshot.sum_by(f'{dimension}_name', order='name'), dimensions.ranked_by_name(dimension, order='name'),
+            )
+
+    def test_endpoints_match_sql(self):
+        expected = [self.client.get(url).json() for url in self.URLS]
+        django_caches[cache.CACHE_ALIAS].clear()
+        with self.enabled():
+            self.assertEqual([self.client.get(url).json() for url in self.URLS], expected)
+
+    def test_appends_and_rebuilds(self):
+        with self.enabled():
+            snapshot = columnar.get_snapshot()
+            with self.captureOnCommitCallbacks(execute=True):
+                sale = _sale(date(2017, 6, 1), self.customer, self.product, self.location, Decimal('7.00'))
+                sale.save()
+            fresh = columnar.get_snapshot()
+            self.assertEqual((len(fresh), fresh.appends, fresh.max_id), (301, 1, sale.id))
+            self.assertEqual(len(snapshot), 300)
+
+            # An update bumps the mutation count, which rebuilds
+            with self.captureOnCommitCallbacks(execute=True):
+                sale.sales = Decimal('8.00')
+                sale.save()
+            self.assertEqual(columnar.get_snapshot().totals(date(2017, 6, 1))['sales'], Decimal('8.00'))
+            self.assertEqual(columnar.stats()['rebuilds'], 2)
+
+    def stale_snapshot(self, skipped):
+        """A snapshot loaded while the transaction of ``skipped`` had not committed yet."""
+        snapshot = columnar.ColumnarSnapshot()
+        snapshot.load(NewSalesData.objects.exclude(id=skipped.id).order_by('order_date', 'id'))
+        snapshot.mutations = columnar.get_mutation_count()
+        columnar._snapshot = snapshot
+        return snapshot
+
+    def test_rows_committed_below_the_maximum_id(self):
+        skipped = NewSalesData.objects.order_by('id')[10]
+        with self.enabled():
+            self.stale_snapshot(skipped)
+            snapshot = columnar.get_snapshot()
+            self.assertEqual(len(snapshot), 300)
+            self.assertEqual(snapshot.totals(), columnar.build().totals())
+            dates = snapshot.columns['order_date']
+            self.assertTrue((dates[1:] >= dates[:-1]).all())
+
+            # Outside the window it stays missing until the next rebuild
+            self.stale_snapshot(skipped)
+            with mock.patch.dict(columnar.CONFIG, RECHECK_IDS=0):
+                self.assertEqual(len(columnar.get_snapshot()), 299)
+
+
+class DimensionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, cls.product, cls.location = _dimensions()
+        # Three small products named alike outsell every other one together
+        products = [cls.product] + [
+            SalesProduct.objects.create(
+                product_id=f'OFF-{i}', product_name=name, category='Furniture', sub_category='Chairs',
+            )
+            for i, name in enumerate(['Desk', 'Lamp', 'Shelf', 'Lamp', 'Lamp'], start=2)
+        ]
+        sales = {'OFF-1': [30], 'OFF-2': [40, 2], 'OFF-3': [20], 'OFF-4': [25], 'OFF-5': [15], 'OFF-6': [10]}
+        NewSalesData.objects.bulk_create([
+            _sale(date(2017, 3, 1), cls.customer, product, cls.location, Decimal(amount))
+            for product in products for amount in sales[product.product_id]
+        ])
+
+    def test_ranked_by_name(self):
+        ranked = [('Lamp', 45), ('Desk', 42), ('Stapler', 30), ('Shelf', 25)]
+        self.assertEqual(dimensions.ranked_by_name('product'), ranked)
+        self.assertEqual(dimensions.ranked_by_name('product', limit=2), ranked[:2])
+        self.assertEqual(dimensions.ranked_by_name('product', limit=2, order='name'), [('Desk', 42), ('Lamp', 45)])
+        self.assertEqual(dimensions.ranked_by_name('customer', limit=5), [('Customer 1', 142)])
+        self.assertEqual(
+            dimensions.ranked_by_name('product', value='quantity', queryset=NewSalesData.objects.filter(sales__lt=20)),
+            [('Lamp', 2), ('Desk', 1)],
+        )
+
+    def test_ranking_is_limited_in_sql(self):
+        with CaptureQueriesContext(connection) as queries:
+            dimensions.ranked_by_name('product', limit=2)
+        limited = [query['sql'] for query in queries if 'LIMIT 2' in query['sql']]
+        self.assertEqual(len(limited), 1)
+        self.assertIn('ORDER BY', limited[0])
+
+    def test_sales_link_to_the_catalogue_without_adding_to_it(self):
+        listed = Product.objects.create(
+            product_id='OFF-8', product_name='Binder', category='Office Supplies',
+            sub_category='Binders', price=Decimal('4.00'), stock_level=5,
+        )
+        for product_id in ('OFF-7', 'OFF-8'):
+            values = {**RECORD, 'product_id': product_id, 'product_name': 'Sold'}
+            self.assertEqual(self.client.post('/api/sales/', values, content_type='application/json').status_code, 201)
+        self.assertEqual(list(Product.objects.values_list('product_id', flat=True)), ['OFF-8'])
+        self.assertEqual(SalesProduct.objects.get(product_id='OFF-8').catalogue, listed)
+        self.assertIsNone(SalesProduct.objects.get(product_id='OFF-7').catalogue)
+
+        # Listing a product later links the sales recorded before
+        later = Product.objects.create(
+            product_id='OFF-7', product_name='Folder', category='Office Supplies',
+            sub_category='Binders', price=Decimal('2.00'), stock_level=5,
+        )
+        self.assertEqual(SalesProduct.objects.get(product_id='OFF-7').catalogue, later)
+        # and removing it from the catalogue keeps the sales
+        self.assertEqual(self.client.delete(f'/api/products/{later.pk}/').status_code, 204)
+        self.assertIsNone(SalesProduct.objects.get(product_id='OFF-7').catalogue)
+
+    def test_edits_cannot_rename_the_customer_or_product(self):
+        sale = NewSalesData.objects.filter(product=self.product).get()
+        for values in (
+            {**RECORD, 'customer_name': 'Renamed', 'segment': 'Corporate'},
+            {**RECORD, 'category': 'Furniture'},
+        ):
+            response = self.client.put(f'/api/sales/{sale.id}/', values, content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'category'})
+        serializer = SalesDataSerializer(sale, data={'segment': 'Corporate'}, partial=True)
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(set(serializer.errors), {'segment'})
+        self.assertEqual(
+            Customer.objects.values_list('customer_name', 'segment').get(customer_id='CU-1'),
+            ('Customer 1', 'Consumer'),
+        )
+        self.assertEqual(SalesProduct.objects.get(product_id='OFF-1').category, 'Office Supplies')
+
+        # Unchanged attributes pass, and a new id moves the sale to a new customer
+        values = {**RECORD, 'customer_id': 'CU-9', 'customer_name': 'Renamed', 'sales': '12.00'}
+        response = self.client.put(f'/api/sales/{sale.id}/', values, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        sale.refresh_from_db()
+        self.assertEqual((sale.customer.customer_name, sale.sales), ('Renamed', Decimal('12.00')))
+        self.assertEqual(Customer.objects.get(customer_id='CU-1').customer_name, 'Customer 1')
+
+    def test_moving_a_sale_keeps_the_other_customer(self):
+        other = Customer.objects.create(customer_id='CU-2', customer_name='Customer 2', segment='Home Office')
+        sale = NewSalesData.objects.filter(product=self.product).get()
+        serializer = SalesDataSerializer(sale, data={'customer_id': 'CU-2'}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        self.assertEqual(serializer.save().customer, other)
+        other.refresh_from_db()
+        self.assertEqual((other.customer_name, other.segment), ('Customer 2', 'Home Office'))
+
+
+class BucketTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, cls.product, cls.location = _dimensions()
+        # The ISO week of 2017-03-01 starts in February
+        NewSalesData.objects.bulk_create([
+            _sale(day, cls.customer, cls.product, cls.location, Decimal(sales))
+            for day, sales in (
+                (date(2017, 2, 27), '7.00'), (date(2017, 3, 1), '14.00'), (date(2017, 3, 1), '1.00'),
+                (date(2017, 3, 6), '30.00'),
+            )
+        ])
+        rollups.rebuild_daily_summary()
+
+    def buckets(self, day):
+        return set(NewSalesData.objects.filter(order_date=day).values_list(*buckets.BUCKET_FIELDS))
+
+    def test_values(self):
+        self.assertEqual(buckets.rebuild(), 3)
+        self.assertEqual(self.buckets(date(2017, 3, 1)), {
+            (Decimal('15'), Decimal('22'), Decimal('3.1429'), Decimal('45'), Decimal('1.5')),
+        })
+        self.assertEqual(self.buckets(date(2017, 2, 27)), {
+            (Decimal('7'), Decimal('22'), Decimal('3.1429'), Decimal('7'), Decimal('0.2333')),
+        })
+        self.assertEqual(self.buckets(date(2017, 3, 6)), {
+            (Decimal('30'), Decimal('30'), Decimal('4.2857'), Decimal('45'), Decimal('1.5')),
+        })
+
+    def test_refresh_writes_only_changed_rows(self):
+        buckets.rebuild()
+        self.assertEqual(buckets.refresh([date(2017, 3, 1)]), 0)
+
+        # New sales on 2017-03-06 change its week and all of March, not February
+        _sale(date(2017, 3, 6), self.customer, self.product, self.location, Decimal('5.00')).save()
+        rollups.refresh_days([date(2017, 3, 6)])
+        self.assertEqual(buckets.refresh([date(2017, 3, 6)]), 4)
+        self.assertEqual(self.buckets(date(2017, 2, 27)), {
+            (Decimal('7'), Decimal('22'), Decimal('3.1429'), Decimal('7'), Decimal('0.2333')),
+        })
+        self.assertEqual(self.buckets(date(2017, 3, 6)), {
+            (Decimal('35'), Decimal('35'), Decimal('5'), Decimal('50'), Decimal('1.6667')),
+        })
+
+    def test_affected_ranges(self):
+        self.assertEqual(buckets.affected_ranges([date(2017, 3, 1), date(2017, 3, 20)]), [
+            (date(2017, 2, 27), date(2017, 3, 31)),
+        ])
+        self.assertEqual(buckets.affected_ranges([date(2017, 1, 31), date(2017, 3, 31)]), [
+            (date(2017, 1, 1), date(2017, 2, 5)), (date(2017, 3, 1), date(2017, 4, 2)),
+        ])
+
+    @skipUnless(connection.vendor == 'postgresql', "row locks are PostgreSQL only")
+    def test_rows_are_locked_in_id_order(self):
+        with CaptureQueriesContext(connection) as queries:
+            buckets.rebuild()
+        update, = [query['sql'] for query in queries if 'UPDATE' in query['sql']]
+        self.assertIn('ORDER BY t.id FOR UPDATE OF t', update)
+
+
+class RetrainingTests(TestCase):
+    NAME = 'monthly_sarima'
+    MONTHS = pd.date_range('2015-01-01', periods=24, freq='MS')
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(15)
+        cls.totals = [1000 + 40 * i + rng.randint(0, 200) for i in range(len(cls.MONTHS))]
+        for month, total in zip(cls.MONTHS, cls.totals):
+            cls.add_month(month.date(), total)
+
+    @staticmethod
+    def add_month(month, total):
+        DailySalesSummary.objects.create(
+            date=month, total_sales=Decimal(total), total_profit=0, total_quantity=1, order_count=1,
+        )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.registry = ModelRegistry(directory.name, files={self.NAME: 'monthly.joblib'}, check_interval=0)
+        patcher = mock.patch.object(retraining, 'registry', self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.live = self.registry.path(self.NAME)
+        joblib.dump(self.fit(pd.Series(self.totals, index=self.MONTHS, dtype=float)), self.live)
+
+    def fit(self, series):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            return SARIMAX(series, order=(1, 0, 0), trend='c').fit(disp=False)
+
+    def refresh(self, through, **kwargs):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            return retraining.refresh_model(self.NAME, through=through, **kwargs)
+
+    def test_nothing_new(self):
+        result = self.refresh(date(2016, 12, 31))
+        self.assertEqual((result.action, result.nobs), ('unchanged', 24))
+        self.assertFalse(retraining.versions_dir(self.NAME).exists())
+
+    def test_new_months_are_appended_between_full_refits(self):
+        self.add_month(date(2017, 1, 1), 2100)
+        first = self.refresh(date(2017, 1, 31))
+        # No full refit on record yet
+        self.assertEqual((first.action, first.appended, first.nobs), ('full', 1, 25))
+        self.assertEqual(self.registry.get(self.NAME).nobs, 25)
+        params = self.registry.get(self.NAME).params
+
+        self.add_month(date(2017, 2, 1), 2150)
+        # A month that is not over yet is left out
+        self.assertEqual(self.refresh(date(2017, 2, 20)).action, 'unchanged')
+        second = self.refresh(date(2017, 2, 28))
+        self.assertEqual((second.action, second.appended, second.nobs), ('append', 1, 26))
+        model = self.registry.get(self.NAME)
+        self.assertEqual((model.nobs, str(model.model.data.dates[-1].date())), (26, '2017-02-01'))
+        np.testing.assert_allclose(model.params, params)
+
+        manifest = retraining.load_manifest(self.NAME)
+        self.assertEqual(manifest['current'], second.version)
+        self.assertEqual([entry['action'] for entry in manifest['versions']], ['full', 'append'])
+        self.assertEqual(retraining.status()[self.NAME]['versions'], 2)
+
+    def test_revised_history_is_refit(self):
+        DailySalesSummary.objects.filter(date=date(2015, 6, 1)).update(total_sales=Decimal(9000))
+        result = self.refresh(date(2016, 12, 31))
+        self.assertEqual(result.action, 'full')
+        self.assertIn('1 trained periods changed', result.reason)
+        self.assertEqual(self.registry.get(self.NAME).model.data.orig_endog.iloc[5], 9000)
+
+    def test_dry_run_installs_nothing(self):
+        before = self.live.read_bytes()
+        self.add_month(date(2017, 1, 1), 2100)
+        result = self.refresh(date(2017, 1, 31), dry_run=True)
+        self.assertEqual((result.action, result.version), ('full', None))
+        self.assertEqual(self.live.read_bytes(), before)
+        self.assertFalse(retraining.versions_dir(self.NAME).exists())
+
+    def test_old_versions_are_pruned(self):
+        with mock.patch.dict(retraining.CONFIG, KEEP_VERSIONS=1):
+            for month in (date(2017, 1, 1), date(2017, 2, 1)):
+                self.add_month(month, 2100)
+                self.refresh(month + timedelta(days=27), full=True)
+        files = list(retraining.versions_dir(self.NAME).glob('*.joblib'))
+        self.assertEqual([path.name for path in files],
+                         [entry['file'] for entry in retraining.load_manifest(self.NAME)['versions']])
+
+
+class ForecastStoreTests(TestCase):
+    DAILY_ORIGIN = date(2018, 12, 30)
+    MONTHLY_ORIGIN = date(2018, 12, 31)
+
+    @classmethod
+    def setUpTestData(cls):
+        ForecastPoint.objects.bulk_create([
+            ForecastPoint(
+                granularity='daily', model_version='d1', origin=cls.DAILY_ORIGIN, step=step,
+                target_date=cls.DAILY_ORIGIN + timedelta(days=step),
+                yhat=step * 10.0, yhat_lower=step * 10.0 - 1, yhat_upper=step * 10.0 + 1,
+            )
+            for step in range(1, 41)
+        ] + [
+            ForecastPoint(
+                granularity='monthly', model_version='m1', origin=cls.MONTHLY_ORIGIN, step=step,
+                target_date=date(2019, step, 28), yhat=1000.0 + step, yhat_lower=900.0, yhat_upper=1100.0,
+            )
+            for step in range(1, 13)
+        ])
+
+    def setUp(self):
+        self.versions = {'daily_prophet': 'd1', 'monthly_sarima': 'm1', 'weekly_sarima': None}
+        for patcher in (
+            mock.patch.object(registry, 'artifact_version', side_effect=self.versions.get),
+            mock.patch.dict(forecast_store._origins, clear=True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_forecast(self):
+        self.assertEqual(forecast_store.forecast('daily', '2019-01-02'), ('2019-01-02', 30.0))
+        self.assertEqual(forecast_store.forecast('monthly', '2019-03-15'), ('2019-03-15', 1003.0))
+        for granularity, value in (
+            ('daily', '2018-12-30'), ('daily', '2019-02-09'), ('daily', 'soon'),
+            ('monthly', '2020-01-31'), ('weekly', '2019-01-07'),
+        ):
+            self.assertIsNone(forecast_store.forecast(granularity, value), value)
+
+    def test_other_model_versions_are_not_served(self):
+        self.versions['daily_prophet'] = 'd2'
+        self.assertIsNone(forecast_store.forecast('daily', '2019-01-02'))
+
+    def test_daily_window(self):
+        window = forecast_store.daily_window('2019-02-05', days=30)
+        self.assertEqual(len(window), 31)
+        self.assertEqual(window[0], {'date': '2019-01-06', 'predicted_sales': 70.0})
+        self.assertEqual(window[-1], {'date': '2019-02-05', 'predicted_sales': 370.0})
+        # Starting on or before the origin, or past the horizon
+        self.assertIsNone(forecast_store.daily_window('2019-01-10', days=30))
+        self.assertIsNone(forecast_store.daily_window('2019-02-10', days=30))
+
+    def test_endpoints_read_the_table(self):
+        with mock.patch.object(inference.pool, 'run', side_effect=AssertionError("ran the model")):
+            response = self.client.post(
+                '/api/predict-daily-sales/', {'date': '2019-01-02'}, content_type='application/json',
+            )
+        self.assertEqual(response.json(), {'status': 'success', 'date': '2019-01-02', 'predicted_sales': 30.0})
+
+    def test_parse_list_and_range(self):
+        self.assertEqual(
+            forecast_store.parse_batch({'granularity': 'daily', 'dates': ['2019-01-03', '2019/01/02'], 'intervals': 1}),
+            ('daily', ['2019-01-03', '2019-01-02'], True),
+        )
+        self.assertEqual(
+            forecast_store.parse_batch({'granularity': 'weekly', 'start_date': '2019-01-01', 'end_date': '2019-01-20'}),
+            ('weekly', ['2019-01-07', '2019-01-14'], False),
+        )
+        _, dates, _ = forecast_store.parse_batch(
+            {'granularity': 'monthly', 'start_date': '2019-01-15', 'end_date': '2019-03-01'},
+        )
+        self.assertEqual(dates, ['2019-01-31', '2019-02-28'])
+
+    def test_parse_errors(self):
+        for data in (
+            {'granularity': 'hourly', 'dates': ['2019-01-02']},
+            {'granularity': 'daily', 'dates': []},
+            {'granularity': 'daily', 'dates': '2019-01-02'},
+            {'granularity': 'daily', 'dates': ['2019-01-02', 'tomorrow']},
+            {'granularity': 'daily', 'start_date': '2019-01-02'},
+            {'granularity': 'daily', 'start_date': '2019-01-02', 'end_date': '2019-01-01'},
+            {'granularity': 'weekly', 'start_date': '2019-01-01', 'end_date': '2019-01-06'},
+        ):
+            with self.assertRaises(PredictionError, msg=data):
+                forecast_store.parse_batch(data)
+
+    def test_parse_limit(self):
+        days = [str(date(2019, 1, 1) + timedelta(days=i)) for i in range(forecast_store.MAX_BATCH_DATES + 1)]
+        forecast_store.parse_batch({'granularity': 'daily', 'dates': days[:-1]})
+        with self.assertRaisesRegex(PredictionError, 'At most'):
+            forecast_store.parse_batch({'granularity': 'daily', 'dates': days})
+        with self.assertRaisesRegex(PredictionError, 'At most'):
+            forecast_store.parse_batch({'granularity': 'daily', 'start_date': days[0], 'end_date': days[-1]})
+
+    def test_batch(self):
+        # Unordered and repeated dates keep their positions
+        self.assertEqual(forecast_store.batch('daily', ['2019-01-03', '2019-01-01', '2019-01-03']), {
+            'dates': ['2019-01-03', '2019-01-01', '2019-01-03'], 'predicted_sales': [40.0, 20.0, 40.0],
+        })
+        self.assertEqual(forecast_store.batch('monthly', ['2019-02-28', '2019-01-31'], intervals=True), {
+            'dates': ['2019-02-28', '2019-01-31'], 'predicted_sales': [1002.0, 1001.0],
+            'yhat_lower': [900.0, 900.0], 'yhat_upper': [1100.0, 1100.0],
+        })
+
+    def test_batch_misses(self):
+        # On or before the origin, past the horizon, or no stored version
+        self.assertIsNone(forecast_store.batch('daily', ['2019-01-02', '2018-12-30']))
+        self.assertIsNone(forecast_store.batch('daily', ['2019-01-02', '2019-02-09']))
+        self.assertIsNone(forecast_store.batch('weekly', ['2019-01-07']))
+
+    def test_batch_endpoint(self):
+        with mock.patch.object(inference.pool, 'run', side_effect=AssertionError("ran the model")):
+            response = self.client.post('/api/predict-batch/', {
+                'granularity': 'daily', 'start_date': '2019-01-01', 'end_date': '2019-01-02', 'intervals': True,
+            }, content_type='application/json')
+        self.assertEqual(response.json(), {
+            'status': 'success', 'granularity': 'daily', 'dates': ['2019-01-01', '2019-01-02'],
+            'predicted_sales': [20.0, 30.0], 'yhat_lower': [19.0, 29.0], 'yhat_upper': [21.0, 31.0],
+        })
+        self.assertEqual(self.client.get('/api/predict-batch/').status_code, 405)
+        response = self.client.post('/api/predict-batch/', {'granularity': 'daily'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class KPITests(TestCase):
+    DAY = date(2017, 3, 31)
+
+    @classmethod
+    def setUpTestData(cls):
+        customer, product, location = _dimensions()
+        generator = random.Random(21)
+        NewSalesData.objects.bulk_create([
+            _sale(
+                date(2016, 1, 1) + timedelta(days=generator.randrange(456)), customer, product, location,
+                Decimal(generator.randrange(1, 50000)).scaleb(-2),
+            )
+            for _ in range(600)
+        ])
+        rollups.rebuild_daily_summary()
+
+    def test_windows(self):
+        self.assertEqual(kpis.windows('day', self.DAY), ((self.DAY, self.DAY), (date(2017, 3, 30), date(2017, 3, 30))))
+        self.assertEqual(kpis.windows('week', self.DAY), (
+            (date(2017, 3, 27), self.DAY), (date(2017, 3, 20), date(2017, 3, 24)),
+        ))
+        # The last day is clamped to the shorter month
+        self.assertEqual(kpis.windows('month', self.DAY), (
+            (date(2017, 3, 1), self.DAY), (date(2017, 2, 1), date(2017, 2, 28)),
+        ))
+        self.assertEqual(kpis.windows('month', date(2017, 1, 15))[1], (date(2016, 12, 1), date(2016, 12, 15)))
+        self.assertEqual(kpis.windows('year', date(2016, 2, 29))[1], (date(2015, 1, 1), date(2015, 2, 28)))
+
+    def test_matches_the_fact_table_in_one_query(self):
+        with self.assertNumQueries(1):
+            result = kpis.compute(self.DAY)
+        for period, values in result.items():
+            for side in ('current', 'previous'):
+                window = values[side]
+                totals = NewSalesData.objects.filter(order_date__range=(window['start'], window['end'])).aggregate(
+                    sales=Sum('sales'), orders=Count('id'),
+                )
+                self.assertEqual(window['sales'], round(float(totals['sales'] or 0), 2), (period, side))
+                self.assertEqual(window['orders'], totals['orders'], (period, side))
+            change = values['change']['sales']
+            self.assertAlmostEqual(change['delta'], values['current']['sales'] - values['previous']['sales'], places=2)
+
+    def test_empty_base(self):
+        result = kpis.compute(date(2016, 1, 1), ['day'])['day']
+        self.assertEqual(result['previous']['orders'], 0)
+        self.assertEqual(result['previous']['avg_order_value'], 0)
+        self.assertIsNone(result['change']['sales']['percent'])
+
+    def test_endpoint(self):
+        response = self.client.get('/api/kpis/?periods=month,day&date=2017-03-31')
+        self.assertEqual(list(response.json()['kpis']), ['day', 'month'])
+        for query in ('periods=quarter', 'periods=,', 'date=31/03/2017'):
+            self.assertEqual(self.client.get(f'/api/kpis/?{query}').status_code, 400, query)
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_in_place_needs_force(self):
+        customer, product, location = _dimensions()
+        _sale(date(2017, 3, 1), customer, product, location, Decimal('1.00')).save()
+        with self.assertRaisesRegex(CommandError, '--force'):
+            call_command('benchmark_endpoints', '--in-place', '--sizes', '10', stdout=StringIO())
+        self.assertEqual((NewSalesData.objects.count(), SalesProduct.objects.count()), (1, 1))
+
+
+class RendererTests(SimpleTestCase):
+    DATA = {
+        'total': Decimal('1234.50'),
+        'day': date(2017, 3, 1),
+        'at': datetime(2017, 3, 1, 12, 30, 15, 250000, tzinfo=timezone.utc),
+        'name': 'Café\u2028Zürich',
+        'counts': np.array([1, 2, 3]),
+        'mean': np.float64(2.5),
+        1: [None, True, {'nested': [1.5, 'x']}],
+    }
+
+    def test_same_output_as_the_drf_renderer(self):
+        self.assertEqual(renderers.ORJSONRenderer().render(self.DATA), JSONRenderer().render(self.DATA))
+
+    @skipUnless(renderers.orjson, "needs orjson")
+    def test_encodes_with_orjson(self):
+        with mock.patch.object(renderers.orjson, 'dumps', wraps=renderers.orjson.dumps) as dumps:
+            renderers.ORJSONRenderer().render(self.DATA)
+        dumps.assert_called_once()
+
+    def test_indented_and_missing_orjson_fall_back(self):
+        indented = renderers.ORJSONRenderer().render(self.DATA, renderer_context={'indent': 2})
+        self.assertEqual(indented, JSONRenderer().render(self.DATA, renderer_context={'indent': 2}))
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(renderers.ORJSONRenderer().render(self.DATA), JSONRenderer().render(self.DATA))
+            self.assertEqual(renderers.dumps({'b': 1, 'a': 2}, sort_keys=True), b'{"a":2,"b":1}')
+
+    def test_json_response_keeps_its_data(self):
+        response = renderers.JSONResponse({'total': Decimal('1.50')}, status=201)
+        self.assertEqual((response.status_code, response['Content-Type']), (201, 'application/json'))
+        self.assertEqual(response.content, b'{"total":1.5}')
+        self.assertEqual(response.data, {'total': Decimal('1.50')})
+
+
+class AsyncViewTests(TransactionTestCase):
+    # The dashboard parts read from the replica, when there is one
+    databases = '__all__'
+
+    def setUp(self):
+        customer, product, location = _dimensions()
+        NewSalesData.objects.bulk_create([
+            _sale(date(2017, 3, 1) + timedelta(days=day % 40), customer, product, location, Decimal(day + 1))
+            for day in range(120)
+        ])
+        rollups.rebuild_daily_summary()
+
+    def assertSameAsSync(self, name):
+        # The sync view cannot run inside an event loop, so this test is not async
+        django_caches[cache.CACHE_ALIAS].clear()
+        response = async_to_sync(self.async_client.get)(f'/api/async/{name}/')
+        self.assertEqual(response.status_code, 200)
+        django_caches[cache.CACHE_ALIAS].clear()
+        self.assertEqual(response.json(), self.client.get(f'/api/{name}/').json())
+        return response.json()
+
+    def test_same_responses_as_the_sync_views(self):
+        stats = self.assertSameAsSync('dashboard-stats')
+        self.assertTrue(stats['top_products'])
+        trends = self.assertSameAsSync('sales-trends')
+        self.assertEqual(len(trends['monthly_trends']), 2)
+        with mock.patch('django.utils.timezone.now', return_value=datetime(2017, 3, 11, 12, tzinfo=timezone.utc)):
+            insights = self.assertSameAsSync('quick-insights')
+        self.assertEqual(insights['status'], 'success')
+
+    def test_parts_run_concurrently(self):
+        barrier = threading.Barrier(2, timeout=5)
+        # Each part waits for the other: run one after another they would time out
+        results = async_to_sync(async_views.gather)({'a': barrier.wait, 'b': barrier.wait})
+        self.assertEqual(sorted(results.values()), [0, 1])
+
+    async def test_only_get(self):
+        response = await self.async_client.post('/api/async/dashboard-stats/')
+        self.assertEqual(response.status_code, 405)
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        customer, product, location = _dimensions()
+        cls.sale = _sale(date(2017, 3, 1), customer, product, location, Decimal('10.00'))
+        cls.sale.save()
+
+    def setUp(self):
+        django_caches[cache.CACHE_ALIAS].clear()
+
+    def scrape(self):
+        """``{(name, (label pairs)): value}`` from /api/metrics/."""
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if line.startswith('#'):
+                continue
+            series, value = line.rsplit(' ', 1)
+            name, _, labels = series.partition('{')
+            samples[name, tuple(re.findall(r'(\w+)="([^"]*)"', labels))] = float(value)
+        return samples
+
+    def delta(self, before, after, name, **labels):
+        key = (name, tuple(labels.items()))
+        return after.get(key, 0) - before.get(key, 0)
+
+    def test_requests_are_counted_per_route(self):
+        before = self.scrape()
+        for _ in range(2):
+            self.assertEqual(self.client.get(f'/api/sales/{self.sale.pk}/').status_code, 200)
+        self.client.get('/api/sales/0/')
+        after = self.scrape()
+
+        route = 'api/sales/<int:pk>/'
+        total = 'salesapp_http_requests_total'
+        self.assertEqual(self.delta(before, after, total, route=route, method='GET', status='200'), 2)
+        self.assertEqual(self.delta(before, after, total, route=route, method='GET', status='404'), 1)
+        self.assertEqual(
+            self.delta(before, after, 'salesapp_http_request_duration_seconds_count', route=route, method='GET'), 3,
+        )
+        # Sampled: every request with the default SAMPLE_RATE
+        self.assertEqual(self.delta(before, after, 'salesapp_http_requests_sampled_total', route=route), 3)
+        self.assertGreaterEqual(self.delta(before, after, 'salesapp_http_request_db_queries_sum', route=route), 3)
+        self.assertGreater(self.delta(before, after, 'salesapp_http_request_serialization_seconds_sum', route=route), 0)
+
+    def test_unsampled_requests_are_only_counted(self):
+        before = self.scrape()
+        with mock.patch.dict(metrics.CONFIG, SAMPLE_RATE=0):
+            self.client.get('/api/kpis/')
+        after = self.scrape()
+        self.assertEqual(
+            self.delta(before, after, 'salesapp_http_requests_total', route='api/kpis/', method='GET', status='200'), 1,
+        )
+        self.assertEqual(self.delta(before, after, 'salesapp_http_requests_sampled_total', route='api/kpis/'), 0)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram('latency', "Latency", ('route',), buckets=(0.1, 1))
+        for value in (0.05, 0.5, 0.7, 3):
+            histogram.observe(value, 'a')
+        self.assertEqual(list(histogram.samples()), [
+            ('latency_bucket', {'route': 'a', 'le': '0.1'}, 1),
+            ('latency_bucket', {'route': 'a', 'le': '1'}, 3),
+            ('latency_bucket', {'route': 'a', 'le': '+Inf'}, 4),
+            ('latency_sum', {'route': 'a'}, 4.25),
+            ('latency_count', {'route': 'a'}, 4),
+        ])
+
+    def test_inference_gauges_and_task_times(self):
+        before = self.scrape()
+        metrics.observe_inference('sarima_forecast', 0.02, 0.03)
+        after = self.scrape()
+        self.assertEqual(self.delta(before, after, 'salesapp_inference_task_seconds_count', task='sarima_forecast'), 1)
+        self.assertIn(('salesapp_inference_in_flight', ()), after)
+        self.assertIn(('salesapp_inference_queue_depth', ()), after)
+
+
+class SalesSketchTests(TestCase):
+    # Small enough that the sketches of months and longer windows are pruned
+    CAPACITY = 8
+    START = date(2017, 1, 1)
+    END = date(2017, 4, 30)
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(22)
+        cls.location = Location.objects.create(
+            country='United States', city='Austin', state='Texas', postal_code='78701', region='Central',
+        )
+        cls.product = SalesProduct.objects.create(
+            product_id='OFF-1', product_name='Stapler', category='Office Supplies',
+            sub_category='Fasteners',
+        )
+        cls.customers = [
+            Customer.objects.create(customer_id=f'CU-{i}', customer_name=f'Customer {i}', segment='Consumer')
+            for i in range(40)
+        ]
+        days = (cls.END - cls.START).days + 1
+        rows = []
+        for _ in range(3000):
+            # A few customers buy a lot, most only now and then
+            customer = cls.customers[min(int(rng.paretovariate(1.1)) - 1, len(cls.customers) - 1)]
+            day = cls.START + timedelta(days=rng.randrange(days))
+            rows.append(_sale(day, customer, cls.product, cls.location, Decimal(rng.randint(100, 50000)) / 100))
+        NewSalesData.objects.bulk_create(rows)
+        with mock.patch.dict(sketches.CONFIG, CAPACITY=cls.CAPACITY):
+            rollups.rebuild_daily_summary()
+
+    def setUp(self):
+        patcher = mock.patch.dict(sketches.CONFIG, CAPACITY=self.CAPACITY)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _exact(self, start, end):
+        queryset = NewSalesData.objects.filter(order_date__range=(start, end))
+        # SQLite sums decimals as floats
+        cent = Decimal('0.01')
+        return {
+            name: Decimal(total).quantize(cent)
+            for name, total in dimensions.totals_by_name('customer', queryset=queryset).items()
+        }
+
+    def assertWithinErrorBound(self, start, end, limit=5):
+        ranked, error = sketches.top('customer', limit, start, end)
+        exact = self._exact(start, end)
+
+        self.assertLessEqual(error, sum(exact.values()) / (self.CAPACITY + 1))
+        for name, total in ranked:
+            self.assertLessEqual(total, exact[name])
+            self.assertLessEqual(exact[name], total + error)
+        # No customer clearly above the reported ones is missing
+        reported = {name for name, _ in ranked}
+        for name, total in exact.items():
+            if total > ranked[-1][1] + error:
+                self.assertIn(name, reported)
+        return error
+
+    def test_top_customers_are_within_the_error_bound(self):
+        windows = [
+            (self.START, self.END),
+            (date(2017, 1, 15), date(2017, 3, 10)),
+            (date(2017, 2, 1), date(2017, 2, 28)),
+            (date(2017, 3, 5), date(2017, 3, 5)),
+        ]
+        errors = [self.assertWithinErrorBound(start, end) for start, end in windows]
+        # The longer windows did need pruning
+        self.assertGreater(errors[0], 0)
+
+    def test_refresh_after_a_write_keeps_the_bound(self):
+        day = date(2017, 3, 14)
+        NewSalesData.objects.create(
+            **{field.name: getattr(_sale(day, self.customers[-1], self.product, self.location, Decimal('500000')),
+                                   field.name)
+               for field in NewSalesData._meta.concrete_fields if not field.primary_key}
+        )
+        rollups.sales_changed([day])
+
+        ranked, _ = sketches.top('customer', 1, date(2017, 3, 1), date(2017, 3, 31))
+        self.assertEqual(ranked[0][0], self.customers[-1].customer_name)
+        self.assertWithinErrorBound(date(2017, 3, 1), date(2017, 3, 31))
+
+    def test_refresh_updates_rows_in_place_and_drops_emptied_days(self):
+        day = date(2017, 3, 14)
+        month = SalesSketch.objects.get(dimension='customer', granularity='month', date=date(2017, 3, 1))
+        NewSalesData.objects.filter(order_date=day).delete()
+        rollups.sales_changed([day])
+
+        self.assertFalse(SalesSketch.objects.filter(granularity='day', date=day).exists())
+        refreshed = SalesSketch.objects.get(dimension='customer', granularity='month', date=date(2017, 3, 1))
+        self.assertEqual(refreshed.pk, month.pk)
+        self.assertLess(refreshed.total, month.total)
+        self.assertWithinErrorBound(date(2017, 3, 1), date(2017, 3, 31))
+
+    def test_net_negative_days_are_answered_exactly(self):
+        day = date(2017, 3, 14)
+        customer = self.customers[0]
+        NewSalesData.objects.bulk_create([
+            _sale(day, customer, self.product, self.location, amount) for amount in (Decimal('5.00'), Decimal('-1e6'))
+        ])
+        rollups.sales_changed([day])
+
+        sketch = SalesSketch.objects.get(dimension='customer', granularity='day', date=day)
+        totals = self._exact(day, day)
+        self.assertLess(totals[customer.customer_name], 0)
+        self.assertNotIn(str(customer.pk), sketch.counters)
+        self.assertEqual(sketch.total, sum(int(total * 100) for total in totals.values() if total > 0))
+        self.assertIsNone(sketches.top('customer', 5, date(2017, 3, 1), date(2017, 3, 31)))
+        self.assertIsNone(sketches.top('customer', 5, day, day))
+        self.assertWithinErrorBound(date(2017, 3, 15), date(2017, 3, 31))
+
+        response = self.client.get('/api/get-top-customers/?days=31&end=2017-03-31&limit=5').json()
+        self.assertEqual((response['mode'], response['error_bound']), ('exact', 0))
+
+    def test_stale_or_missing_sketches_are_not_used(self):
+        SalesSketch.objects.filter(dimension='customer', granularity='day', date=date(2017, 1, 20)).delete()
+        self.assertIsNone(sketches.top('customer', 5, date(2017, 1, 15), date(2017, 1, 25)))
+        self.assertIsNone(sketches.top('customer', self.CAPACITY + 1, date(2017, 2, 1), date(2017, 2, 28)))
+
+    def test_windows_without_a_limit_and_the_dashboard_use_the_sketches(self):
+        with mock.patch.dict(sketches.CONFIG, DEFAULT_LIMIT=5):
+            response = self.client.get('/api/get-top-customers/?days=28&end=2017-02-28').json()
+        self.assertEqual((response['mode'], len(response['sales'])), ('sketch', 5))
+
+        with CaptureQueriesContext(connection) as queries:
+            stats = self.client.get('/api/dashboard-stats/').json()
+        self.assertFalse([query for query in queries if 'new_sales_data' in query['sql']])
+        ranked, _ = sketches.top('customer', dashboard.TOP_LIMIT, self.START, self.END)
+        self.assertEqual(
+            [(row['customer_name'], Decimal(str(row['total_purchases']))) for row in stats['top_customers']], ranked,
+        )
+
+    def test_endpoint_sketch_and_exact_modes(self):
+        url = '/api/get-top-customers/?days=28&end=2017-02-28&limit=5'
+        sketched = self.client.get(url).json()
+        self.assertEqual(sketched['mode'], 'sketch')
+        self.assertEqual((sketched['start'], sketched['end']), ('2017-02-01', '2017-02-28'))
+
+        exact = self.client.get(url + '&exact=true').json()
+        self.assertEqual(exact['mode'], 'exact')
+        self.assertEqual(exact['error_bound'], 0)
+        totals = self._exact(date(2017, 2, 1), date(2017, 2, 28))
+        for row in exact['sales']:
+            self.assertEqual(row['total_sales'], float(totals[row['customer_name']]))
+
+
+class DistinctCountTests(TestCase):
+    START = date(2017, 1, 1)
+    END = date(2017, 3, 31)
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(23)
+        locations = [
+            Location.objects.create(country='United States', city=city, state=state, postal_code=code, region=region)
+            for city, state, code, region in [
+                ('Austin', 'Texas', '78701', 'Central'), ('Houston', 'Texas', '77002', 'Central'),
+                ('Seattle', 'Washington', '98101', 'West'), ('Boston', 'Massachusetts', '02108', 'East'),
+            ]
+        ]
+        cls.customers = [
+            Customer.objects.create(customer_id=f'CU-{i}', customer_name=f'Customer {i}', segment=segment)
+            for i, segment in zip(range(600), ['Consumer', 'Corporate', 'Home Office'] * 200)
+        ]
+        products = [
+            SalesProduct.objects.create(product_id=f'PR-{i}', product_name=f'Product {i}', category=category,
+                                        sub_category='Misc')
+            for i, category in zip(range(90), ['Furniture', 'Office Supplies', 'Technology'] * 30)
+        ]
+        days = (cls.END - cls.START).days + 1
+        NewSalesData.objects.bulk_create([
+            _sale(cls.START + timedelta(days=rng.randrange(days)), rng.choice(cls.customers),
+                  rng.choice(products), rng.choice(locations), Decimal(rng.randint(100, 50000)) / 100)
+            for _ in range(2500)
+        ])
+        rollups.rebuild_daily_summary()
+
+    def assertCloseToExact(self, target, grouping, period, start, end):
+        estimated = distinct.counts(target, grouping, period, start, end)
+        exact = distinct.exact_counts(target, grouping, period, start, end)
+        self.assertEqual([row[:2] for row in estimated], [row[:2] for row in exact])
+        for (_, _, count), (_, _, true_count) in zip(estimated, exact):
+            # Three standard errors, and small counts nearly exact
+            self.assertLessEqual(abs(count - true_count), max(3 * distinct.relative_error() * true_count, 2))
+
+    def test_counts_are_close_to_exact(self):
+        for target in distinct.TARGETS:
+            for grouping in ('all', *distinct.GROUPINGS):
+                for period, start in (('day', date(2017, 3, 20)), ('week', date(2017, 2, 10)),
+                                      ('month', date(2017, 1, 15)), ('all', self.START)):
+                    with self.subTest(target=target, grouping=grouping, period=period):
+                        self.assertCloseToExact(target, grouping, period, start, self.END)
+
+    def test_refresh_after_a_write(self):
+        day = date(2017, 2, 14)
+        customer = Customer.objects.create(customer_id='CU-NEW', customer_name='New Customer', segment='Consumer')
+        sale = NewSalesData.objects.first()
+        NewSalesData.objects.create(
+            order_date=day, customer=customer, location=sale.location, product=sale.product,
+            sales=Decimal('10.00'), quantity=1, discount=0, profit=0,
+            avg_for_week=0, avg_for_month=0, week_sales=0, month_sales=0, day_sales=0,
+        )
+        rollups.sales_changed([day])
+        self.assertCloseToExact('customer', 'all', 'day', day, day)
+        self.assertCloseToExact('customer', 'region', 'month', self.START, self.END)
+
+    def _sketches(self):
+        """Every sketch, decoded, so that the order of groups in a row does not matter."""
+        return {
+            (row.target, row.grouping, row.granularity, row.date): (
+                {group: bytes(dense) for group, dense in distinct._decode(row.groups, row.registers, 12).items()},
+                row.orders,
+            )
+            for row in DistinctSketch.objects.all()
+        }
+
+    def assertMatchesRebuild(self):
+        refreshed = self._sketches()
+        distinct.rebuild()
+        self.assertEqual(refreshed, self._sketches())
+
+    def test_write_merges_the_day_into_the_month(self):
+        day = date(2017, 2, 14)
+        month = DistinctSketch.objects.get(
+            target='customer', grouping='all', granularity='month', date=date(2017, 2, 1),
+        )
+        sale = NewSalesData.objects.filter(order_date=day).first()
+        sale.pk = None
+        sale.save()
+        merged = mock.patch.object(distinct, '_merged_month', wraps=distinct._merged_month)
+        with CaptureQueriesContext(connection) as queries, merged as merged_month:
+            distinct.refresh([day])
+        merged_month.assert_not_called()
+        # Only the written day is read from the fact table
+        scans = [query['sql'] for query in queries if 'FROM "new_sales_data"' in query['sql']]
+        self.assertEqual(len(scans), 1)
+        self.assertIn('"order_date" IN', scans[0])
+        self.assertEqual(
+            DistinctSketch.objects.get(target='customer', grouping='all', granularity='month', date=month.date).pk,
+            month.pk,
+        )
+        self.assertMatchesRebuild()
+
+    def test_deleted_sales_are_merged_out_of_the_month(self):
+        moved = NewSalesData.objects.filter(order_date=date(2017, 2, 14)).first()
+        moved.order_date = date(2017, 3, 2)
+        moved.save()
+        NewSalesData.objects.filter(order_date=date(2017, 2, 20)).delete()
+        with mock.patch.object(distinct, '_merged_month', wraps=distinct._merged_month) as merged_month:
+            distinct.refresh([date(2017, 2, 14), date(2017, 2, 20), date(2017, 3, 2)])
+        self.assertEqual(merged_month.call_args_list, [mock.call(date(2017, 2, 1), 12)])
+        self.assertFalse(DistinctSketch.objects.filter(date=date(2017, 2, 20)).exists())
+        self.assertMatchesRebuild()
+
+    def test_refresh_at_another_precision_rebuilds_the_month(self):
+        day = date(2017, 2, 14)
+        with mock.patch.dict(distinct.CONFIG, PRECISION=10):
+            distinct.refresh([day])
+        months = dict(
+            DistinctSketch.objects.filter(target='customer', grouping='all', granularity='month')
+            .values_list('date', 'registers')
+        )
+        self.assertEqual((bytes(months[date(2017, 2, 1)])[1], bytes(months[date(2017, 3, 1)])[1]), (10, 12))
+
+    def test_stale_sketches_are_not_used(self):
+        NewSalesData.objects.filter(order_date=date(2017, 2, 14)).delete()
+        rollups.refresh_days([date(2017, 2, 14)])
+        self.assertIsNone(distinct.counts('customer', 'all', 'month', self.START, self.END))
+        self.assertIsNotNone(distinct.counts('customer', 'all', 'day', date(2017, 3, 1), self.END))
+
+    def test_endpoint_exact_flag(self):
+        url = '/api/distinct-counts/?count=products&by=category&period=all&days=90&end=2017-03-31'
+        estimated = self.client.get(url).json()
+        self.assertEqual(estimated['mode'], 'sketch')
+        self.assertEqual(len(estimated['results']), 3)
+
+        exact = self.client.get(url + '&exact=true').json()
+        self.assertEqual(exact['mode'], 'exact')
+        self.assertEqual(
+            [(row['group'], row['distinct']) for row in exact['results']],
+            [(group, count) for _, group, count in distinct.exact_counts(
+                'product', 'category', 'all', date(2017, 1, 1), date(2017, 3, 31))],
+        )
+        self.assertEqual(self.client.get('/api/distinct-counts/?by=city').status_code, 400)
+
+
+@skipUnless(connection.vendor == 'postgresql', "new_sales_data is only partitioned on PostgreSQL")
+class PartitionPruningTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        partitions.ensure(date(2017, 1, 1), date(2017, 6, 30))
+        rng = random.Random(24)
+        cls.location = Location.objects.create(
+            country='United States', city='Austin', state='Texas', postal_code='78701', region='Central',
+        )
+        cls.customer = Customer.objects.create(customer_id='CU-1', customer_name='Customer 1', segment='Consumer')
+        cls.product = SalesProduct.objects.create(
+            product_id='OFF-1', product_name='Stapler', category='Office Supplies',
+            sub_category='Fasteners',
+        )
+        NewSalesData.objects.bulk_create([
+            _sale(date(2017, 1, 1) + timedelta(days=rng.randrange(181)), cls.customer, cls.product, cls.location,
+                  Decimal(rng.randint(100, 50000)) / 100)
+            for _ in range(600)
+        ])
+        rollups.rebuild_daily_summary()
+
+    def _partitions_read(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql)
+            plan = cursor.fetchone()[0]
+        found, nodes = set(), [plan[0]['Plan']]
+        while nodes:
+            node = nodes.pop()
+            if node.get('Relation Name', '').startswith(partitions.TABLE):
+                found.add(node['Relation Name'])
+            nodes.extend(node.get('Plans', []))
+        return found
+
+    def partitionsReadBy(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        found = set()
+        for query in queries.captured_queries:
+            if f'"{partitions.TABLE}"' in query['sql']:
+                found |= self._partitions_read(query['sql'])
+        return found
+
+    def assertReadsOnly(self, url, *months):
+        self.assertEqual(self.partitionsReadBy(url), {partitions.partition_name(month) for month in months})
+
+    def test_quick_insights_reads_one_partition(self):
+        with mock.patch('django.utils.timezone.now', return_value=datetime(2017, 3, 16, 12, tzinfo=timezone.utc)):
+            self.assertReadsOnly('/api/quick-insights/', date(2017, 3, 1))
+
+    def test_30_day_endpoints_read_their_months(self):
+        self.assertReadsOnly('/api/get-top-customers/?days=30&end=2017-04-30&exact=true', date(2017, 4, 1))
+        self.assertReadsOnly('/api/get-top-products/?days=30&end=2017-04-30&exact=true', date(2017, 4, 1))
+        self.assertReadsOnly(
+            '/api/distinct-counts/?days=30&end=2017-05-15&by=region&exact=true', date(2017, 4, 1), date(2017, 5, 1),
+        )
+        self.assertReadsOnly('/api/sales/export/?start=2017-02-01&end=2017-02-28', date(2017, 2, 1))
+
+    def test_sales_pages_skip_old_partitions(self):
+        expected = list(NewSalesData.objects.order_by('-order_date', '-id').values_list('id', flat=True)[:60])
+        old = {partitions.partition_name(date(2017, month, 1)) for month in range(1, 5)}
+
+        url, ids = '/api/sales/?page_size=20', []
+        for _ in range(3):
+            self.assertFalse(self.partitionsReadBy(url) & old)
+            page = self.client.get(url).json()
+            ids += [row['id'] for row in page['results']]
+            url = page['next']
+        self.assertEqual(ids, expected)
+
+    def test_creating_a_partition_moves_rows_out_of_the_default_one(self):
+        sale = NewSalesData.objects.create(**{
+            field.name: getattr(_sale(date(2018, 2, 10), self.customer, self.product, self.location, Decimal('5')),
+                                field.name)
+            for field in NewSalesData._meta.concrete_fields if not field.primary_key
+        })
+
+        def partition_of(sale):
+            with connection.cursor() as cursor:
+                cursor.execute(f'SELECT tableoid::regclass::text FROM {partitions.TABLE} WHERE id = %s', [sale.pk])
+                return cursor.fetchone()[0]
+
+        self.assertEqual(partition_of(sale), partitions.DEFAULT_PARTITION)
+        self.assertTrue(partitions.create(date(2018, 2, 1)))
+        self.assertEqual(partition_of(sale), partitions.partition_name(date(2018, 2, 1)))
+        self.assertEqual(partitions.default_months(), [])
+
+    def test_old_months_are_detached_with_their_rollup(self):
+        january = NewSalesData.objects.filter(order_date__month=1).count()
+        mutations, version = columnar.get_mutation_count(), cache.get_data_version()
+        with (
+            mock.patch('django.utils.timezone.now', return_value=datetime(2017, 6, 15, tzinfo=timezone.utc)),
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            call_command('manage_partitions', '--retain-months', '4', stdout=StringIO())
+        # The columnar copy reloads and cached responses are dropped
+        self.assertGreater(columnar.get_mutation_count(), mutations)
+        self.assertNotEqual(cache.get_data_version(), version)
+
+        attached = partitions.partitions()
+        self.assertNotIn(date(2017, 1, 1), attached)
+        self.assertIn(date(2017, 2, 1), attached)
+        self.assertIn(date(2017, 9, 1), attached)
+        self.assertFalse(NewSalesData.objects.filter(order_date__month=1).exists())
+        self.assertFalse(DailySalesSummary.objects.filter(date__month=1).exists())
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {partitions.partition_name(date(2017, 1, 1))}')
+            self.assertEqual(cursor.fetchone()[0], january)
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(routers, 'replica', return_value='replica')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.factory = RequestFactory()
+
+    def route(self, request, write=False):
+        """The alias a view reads from during ``request``, and the response."""
+        seen = {}
+
+        def view(request):
+            if write:
+                router.db_for_write(NewSalesData)
+            seen['read'] = router.db_for_read(NewSalesData)
+            return HttpResponse()
+
+        response = routers.ReplicaMiddleware(view)(request)
+        return seen['read'], response
+
+    def test_api_gets_read_from_the_replica(self):
+        read, response = self.route(self.factory.get('/api/kpis/'))
+        self.assertEqual(read, 'replica')
+        self.assertNotIn(routers.CONFIG['COOKIE'], response.cookies)
+        self.assertEqual(router.db_for_read(NewSalesData), DEFAULT_DB_ALIAS)
+
+    def test_other_paths_read_from_the_primary(self):
+        read, _ = self.route(self.factory.get('/admin/'))
+        self.assertEqual(read, DEFAULT_DB_ALIAS)
+
+    def test_a_post_keeps_the_client_on_the_primary(self):
+        read, response = self.route(self.factory.post('/api/sales/'))
+        self.assertEqual(read, DEFAULT_DB_ALIAS)
+        cookie = response.cookies[routers.CONFIG['COOKIE']]
+        self.assertEqual(cookie['max-age'], routers.CONFIG['STICKY_SECONDS'])
+
+        self.factory.cookies[routers.CONFIG['COOKIE']] = cookie.value
+        read, _ = self.route(self.factory.get('/api/kpis/'))
+        self.assertEqual(read, DEFAULT_DB_ALIAS)
+
+    def test_reads_after_a_write_stay_on_the_primary(self):
+        read, response = self.route(self.factory.get('/api/kpis/'), write=True)
+        self.assertEqual(read, DEFAULT_DB_ALIAS)
+        self.assertIn(routers.CONFIG['COOKIE'], response.cookies)
+
+    def test_reads_inside_a_transaction_stay_on_the_primary(self):
+        with mock.patch.object(connections[DEFAULT_DB_ALIAS], 'in_atomic_block', True):
+            read, _ = self.route(self.factory.get('/api/kpis/'))
+        self.assertEqual(read, DEFAULT_DB_ALIAS)
+
+    def test_async_requests(self):
+        seen = {}
+
+        async def view(request):
+            seen['read'] = router.db_for_read(NewSalesData)
+            return HttpResponse()
+
+        async_to_sync(routers.ReplicaMiddleware(view))(self.factory.get('/api/async/dashboard-stats/'))
+        self.assertEqual(seen['read'], 'replica')
+
+    def test_replica_reads_scope(self):
+        with routers.replica_reads():
+            self.assertEqual(router.db_for_read(DailySalesSummary), 'replica')
+        self.assertEqual(router.db_for_read(DailySalesSummary), DEFAULT_DB_ALIAS)
+
+    def test_without_a_replica_everything_uses_the_primary(self):
+        with mock.patch.object(routers, 'replica', return_value=None):
+            read, _ = self.route(self.factory.get('/api/kpis/'))
+            _, response = self.route(self.factory.post('/api/sales/'))
+        self.assertEqual(read, DEFAULT_DB_ALIAS)
+        self.assertNotIn(routers.CONFIG['COOKIE'], response.cookies)
+
+    def test_migrations_skip_the_replica(self):
+        self.assertFalse(router.allow_migrate('replica', 'SalesApp'))
+        self.assertTrue(router.allow_migrate(DEFAULT_DB_ALIAS, 'SalesApp'))
+
+
+@skipUnless(routers.replica(), "needs a replica alias in DATABASES (SALESAPP_REPLICA_HOST)")
+class ReplicaReadTests(TransactionTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        location = Location.objects.create(
+            country='United States', city='Austin', state='Texas', postal_code='78701', region='Central',
+        )
+        customer = Customer.objects.create(customer_id='CU-1', customer_name='Customer 1', segment='Consumer')
+        product = SalesProduct.objects.create(
+            product_id='OFF-1', product_name='Stapler', category='Office Supplies',
+            sub_category='Fasteners',
+        )
+        self.sales = NewSalesData.objects.bulk_create([
+            _sale(date(2017, 3, day), customer, product, location, Decimal(day)) for day in range(1, 16)
+        ])
+        rollups.rebuild_daily_summary()
+
+    def get(self, url):
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(primary), len(replica)
+
+    def test_reads_follow_the_client_writes(self):
+        response, primary, replica = self.get('/api/kpis/?periods=month&date=2017-03-15')
+        self.assertEqual((primary, replica > 0), (0, True))
+        self.assertEqual(response.json()['kpis']['month']['current']['orders'], 15)
+
+        self.assertEqual(self.client.delete(f'/api/sales/{self.sales[0].pk}/').status_code, 204)
+        response, primary, replica = self.get('/api/kpis/?periods=month&date=2017-03-15')
+        self.assertEqual((primary > 0, replica), (True, 0))
+        self.assertEqual(response.json()['kpis']['month']['current']['orders'], 14)
+
+    def test_the_data_version_is_read_from_the_replica_with_the_data(self):
+        django_caches[cache.CACHE_ALIAS].clear()
+        self.assertEqual(Client().delete(f'/api/sales/{self.sales[0].pk}/').status_code, 204)
+        for _ in range(2):
+            response, primary, replica = self.get('/api/kpis/?periods=month&date=2017-03-15')
+            self.assertEqual((primary, replica > 0), (0, True))
+        self.assertEqual(response.json()['kpis']['month']['current']['orders'], 14)
+        self.assertEqual((cache.get_stats()['misses'], cache.get_stats()['hits']), (1, 1))
+
+    def test_exports_stream_from_the_replica(self):
+        response, primary, replica = self.get('/api/sales/export/?start=2017-03-01&end=2017-03-31')
+        with CaptureQueriesContext(connections['replica']) as streamed:
+            rows = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(rows), 16)
+        self.assertEqual(primary, 0)
+        self.assertTrue(streamed)
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     # Existing authentication endpoints
@@ -13,6 +13,9 @@ urlpatterns = [
         'post': 'create'
     }), name='sales-list-create'),
 
+    path('sales/bulk/', views.bulk_create_sales, name='sales-bulk-create'),
+    path('sales/export/', views.export_sales, name='sales-export'),
+
     path('sales/<int:pk>/', views.SalesDataViewSet.as_view({
         'get': 'retrieve',
         'put': 'update',
@@ -34,6 +37,12 @@ urlpatterns = [
     path('dashboard-stats/', views.get_dashboard_stats, name='dashboard-stats'),
     path('sales-trends/', views.get_sales_trends, name='sales-trends'),
     path('quick-insights/', views.get_quick_insights, name='quick-insights'),
+    path('kpis/', views.get_kpis, name='kpis'),
+    path('distinct-counts/', views.get_distinct_counts, name='distinct-counts'),
+    # Same responses, with independent queries run concurrently (ASGI)
+    path('async/dashboard-stats/', async_views.get_dashboard_stats, name='async-dashboard-stats'),
+    path('async/sales-trends/', async_views.get_sales_trends, name='async-sales-trends'),
+    path('async/quick-insights/', async_views.get_quick_insights, name='async-quick-insights'),
     path('new-product-data/', views.get_products, name='new-product-data'),
     # New endpoint for sales analysis
     path('sales-data/', views.get_sales_data, name='sales-data'),
@@ -42,9 +51,15 @@ urlpatterns = [
     path('customer-data/', views.get_sales_by_customer, name='customer-data'),
     path('get-top-customers/', views.get_top_customers, name='get-top-customers'),
     path('get-top-products/', views.get_top_products, name='get-top-products'),
+    path('cache-stats/', views.get_cache_stats, name='cache-stats'),
+    path('columnar-stats/', views.get_columnar_stats, name='columnar-stats'),
+    path('model-stats/', views.get_model_stats, name='model-stats'),
+    path('inference-stats/', views.get_inference_stats, name='inference-stats'),
+    path('metrics/', views.get_metrics, name='metrics'),
     path('predict-monthly-sales/', views.predict_monthly_sales, name='predict-monthly-sales'),
     path('predict-weekly-sales/', views.predict_weekly_sales, name='predict-weekly-sales'),
     path('predict-daily-sales/', views.predict_daily_sales, name='predict-daily-sales'),
     path('daily-sales-prediction/', views.daily_sales_prediction, name='daily-sales-prediction'),
     path('predict-sales-in-range/', views.predict_sales_in_range, name='predict-sales-in-range'),
+    path('predict-batch/', views.predict_batch, name='predict-batch'),
 ]
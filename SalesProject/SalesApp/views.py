@@ -1,35 +1,39 @@
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, parser_classes, permission_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
 from django.shortcuts import render
 from rest_framework import viewsets, status
 from django.contrib.auth.models import User
 from rest_framework.authtoken.models import Token
 from django.utils import timezone
-from datetime import timedelta
 from rest_framework.permissions import AllowAny
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.hashers import make_password
-import os
-from django.utils.timezone import now, timedelta
-from django.http import JsonResponse
-import pandas as pd
-import matplotlib.pyplot as plt
+from django.utils.timezone import now
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
 from django.conf import settings
-from .models import NewSalesData
-from .serializers import SalesDataSerializer
-from django.db.models import Sum, Count
-from django.db.models.functions import TruncMonth, TruncWeek
+from .models import NewSalesData, DailySalesSummary
+from .serializers import SALES_ROW_PATHS, SalesDataSerializer, sales_rows
+from . import columnar, dashboard, dimensions, distinct, exports, kpis, metrics, rollups, sketches
+from .cache import cached_response, get_stats as get_response_cache_stats
+from .pagination import IdKeysetPagination, SalesKeysetPagination, get_layout, get_limit, get_window
+from . import forecast_store, forecast_tasks, inference, retraining
+from .forecast_tasks import PredictionError
+from .parsers import CSVParser, NDJSONParser
+from django.db import transaction
 from datetime import datetime, timedelta
-import joblib 
-import pandas as pd
 import json
-import traceback
-from sklearn.preprocessing import StandardScaler
+import logging
 import numpy as np
 from .models import Product
 from .serializers import ProductSerializer
 
+logger = logging.getLogger(__name__)
+
 # Add this function for root URL
 def index(request):
     """
@@ -38,16 +42,142 @@ def index(request):
     return render(request, 'api/index.html')  # Make sure this template exists
 
 class SalesDataViewSet(viewsets.ModelViewSet):
-    queryset = NewSalesData.objects.all()
+    queryset = NewSalesData.objects.select_related('customer', 'location', 'product')
     serializer_class = SalesDataSerializer
+    pagination_class = SalesKeysetPagination
+
+    def list(self, request, *args, **kwargs):
+        # Pages are read with values() and built into the serializer's output
+        # directly; SalesDataSerializer would cost a Python call per field
+        queryset = self.filter_queryset(self.get_queryset()).values(*SALES_ROW_PATHS.values())
+        # Paginate only when asked to, existing clients expect a plain list
+        params = request.query_params
+        if self.paginator.cursor_query_param in params or self.paginator.page_size_query_param in params:
+            page = self.paginate_queryset(queryset)
+            return self.get_paginated_response(sales_rows(page))
+
+        queryset = queryset.order_by('-order_date', '-id')
+        limit = get_limit(request)
+        if limit is not None:
+            queryset = queryset[:limit]
+        return Response(sales_rows(queryset))
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            self.perform_create(serializer)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    # Keep the daily rollup in step with every write. The month locks are
+    # taken before the write: a refresh holding them may be about to update
+    # the bucket columns of the very row being written.
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            rollups.lock_months([serializer.validated_data['order_date']])
+            instance = serializer.save()
+            rollups.sales_changed([instance.order_date])
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            old_date = serializer.instance.order_date
+            rollups.lock_months({old_date, serializer.validated_data.get('order_date', old_date)})
+            instance = serializer.save()
+            rollups.sales_changed({old_date, instance.order_date})
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            order_date = instance.order_date
+            rollups.lock_months([order_date])
+            instance.delete()
+            rollups.sales_changed([order_date])
+
+BULK_MAX_ROWS = getattr(settings, 'SALESAPP_BULK_MAX_ROWS', 50000)
+BULK_BATCH_SIZE = 1000
+
+@api_view(['POST'])
+@parser_classes([JSONParser, NDJSONParser, CSVParser])
+def bulk_create_sales(request):
+    """
+    Validate and insert many sales rows in one transaction.
+
+    Accepts a JSON array (or {"records": [...]}), NDJSON or CSV. Invalid rows
+    are reported by index and skipped, unless ?atomic=true is given, in which
+    case any invalid row rejects the whole batch.
+    """
+    records = request.data
+    if isinstance(records, dict):
+        records = records.get('records')
+    if not isinstance(records, list):
+        return Response(
+            {"status": "error", "message": "Expected a list of records"}, status=status.HTTP_400_BAD_REQUEST,
+        )
+    if len(records) > BULK_MAX_ROWS:
+        return Response(
+            {"status": "error", "message": f"At most {BULK_MAX_ROWS} records per request"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    all_or_nothing = request.query_params.get('atomic', '').lower() in ('1', 'true', 'yes')
+
+    # One pass of field validation, reusing a single serializer instance
+    validator = SalesDataSerializer()
+    rows = []
+    errors = []
+    for index, record in enumerate(records):
+        try:
+            rows.append(dimensions.flatten(validator.run_validation(record)))
+        except ValidationError as e:
+            errors.append({'row': index, 'errors': e.detail})
+
+    if errors and (all_or_nothing or not rows):
+        return Response({
+            "status": "error",
+            "created": 0,
+            "errors": errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    with transaction.atomic():
+        rollups.lock_months({row['order_date'] for row in rows})
+        for start in range(0, len(rows), BULK_BATCH_SIZE):
+            facts = dimensions.resolve(rows[start:start + BULK_BATCH_SIZE])
+            NewSalesData.objects.bulk_create([NewSalesData(**values) for values in facts])
+        rollups.sales_changed({row['order_date'] for row in rows})
+
+    return Response({
+        "status": "partial" if errors else "success",
+        "created": len(rows),
+        "errors": errors
+    }, status=status.HTTP_201_CREATED)
+
+@api_view(['GET'])
+def export_sales(request):
+    """
+    Stream sales rows as CSV (default), Parquet or Arrow.
+
+    Query parameters: start/end (inclusive, YYYY-MM-DD), columns (comma-separated
+    field names) and output=csv|parquet|arrow.
+    """
+    start, end, columns, output = exports.parse_export_params(request)
+    if output != 'csv' and not exports.arrow_available():
+        return Response(
+            {"status": "error", "message": f"{output} export requires pyarrow"}, status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    queryset = exports.export_queryset(start, end)
+    if output == 'csv':
+        content = exports.stream_csv(queryset, columns)
+    else:
+        content = exports.stream_arrow(queryset, columns, output)
+    if isinstance(request._request, ASGIRequest):
+        content = exports.aiterate(content)
+
+    extension = {'csv': 'csv', 'parquet': 'parquet', 'arrow': 'arrows'}[output]
+    filename = f"sales-{start or 'all'}-{end or 'latest'}.{extension}"
+    response = StreamingHttpResponse(content, content_type=exports.CONTENT_TYPES[output])
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
 class ProductViewSet(viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
@@ -60,7 +190,15 @@ class ProductViewSet(viewsets.ModelViewSet):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['GET'])
+@cached_response
 def get_products(request):
+    # Paginate only when asked to, the products page expects a plain list
+    if 'cursor' in request.query_params or 'page_size' in request.query_params:
+        paginator = IdKeysetPagination()
+        page = paginator.paginate_queryset(Product.objects.all(), request)
+        serializer = ProductSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
     products = Product.objects.all()
     serializer = ProductSerializer(products, many=True)
     return Response(serializer.data)
@@ -88,6 +226,29 @@ def test_connection(request):
             'timestamp': timezone.now().isoformat()
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['GET'])
+def get_cache_stats(request):
+    """Hit/miss counters and current data version of the response cache"""
+    return Response({
+        'status': 'success',
+        'data': get_response_cache_stats()
+    })
+
+@api_view(['GET', 'POST'])
+def get_columnar_stats(request):
+    """Size and freshness of the columnar snapshot; POST rebuilds it now"""
+    if request.method == 'POST':
+        if not columnar.CONFIG['ENABLED']:
+            return Response({
+                'status': 'error',
+                'message': 'The columnar cache is disabled'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        columnar.build()
+    return Response({
+        'status': 'success',
+        'data': columnar.stats()
+    })
+
 @api_view(['GET'])
 def api_root(request):
     """
@@ -155,76 +316,34 @@ def login_user(request):
 
 
 @api_view(['GET'])
+@cached_response
 def get_dashboard_stats(request):
     """Get aggregated statistics for dashboard"""
-    total_sales = NewSalesData.objects.aggregate(total=Sum('sales'))
-    total_profit = NewSalesData.objects.aggregate(total=Sum('profit'))
-    
-    # Get top products
-    top_products = NewSalesData.objects.values('product_name')\
-        .annotate(total_sales=Sum('sales'))\
-        .order_by('-total_sales')[:5]
-    
-    # Get top customers
-    top_customers = NewSalesData.objects.values('customer_name')\
-        .annotate(total_purchases=Sum('sales'))\
-        .order_by('-total_purchases')[:5]
-    
-    return Response({
-        'total_sales': total_sales['total'],
-        'total_profit': total_profit['total'],
-        'top_products': list(top_products),
-        'top_customers': list(top_customers)
-    })
+    snapshot = columnar.get_snapshot()
+    if snapshot is not None:
+        return Response(dashboard.snapshot_stats(snapshot))
+    return Response(dashboard.stats(dashboard.run(dashboard.STATS_PARTS)))
 
 @api_view(['GET'])
+@cached_response
 def get_sales_trends(request):
-    """Get sales trends by month and week"""
-    monthly_trends = NewSalesData.objects.annotate(
-        month=TruncMonth('order_date')
-    ).values('month').annotate(
-        total_sales=Sum('sales')
-    ).order_by('month')
-
-    weekly_trends = NewSalesData.objects.annotate(
-        week=TruncWeek('order_date')
-    ).values('week').annotate(
-        total_sales=Sum('sales')
-    ).order_by('week')
-
-    return Response({
-        'monthly_trends': list(monthly_trends),
-        'weekly_trends': list(weekly_trends)
-    })
+    """Get sales trends by month and week, bucketed from the daily rollup"""
+    return Response(dashboard.run(dashboard.TRENDS_PARTS))
 
 @api_view(['GET'])
+@cached_response
 def get_quick_insights(request):
     try:
-        # Get yesterday's date
-        yesterday = timezone.now().date() - timedelta(days=1)
-        yesterday_start = timezone.make_aware(timezone.datetime.combine(yesterday, timezone.datetime.min.time()))
-        yesterday_end = timezone.make_aware(timezone.datetime.combine(yesterday, timezone.datetime.max.time()))
-
-        # Get yesterday's data
-        yesterday_data = NewSalesData.objects.filter(
-            order_date__range=(yesterday_start, yesterday_end)
-        )
-
-        # Calculate metrics
-        total_sales = yesterday_data.aggregate(Sum('sales'))['sales__sum'] or 0
-        total_orders = yesterday_data.count()
-        total_profit = yesterday_data.aggregate(Sum('profit'))['profit__sum'] or 0
-        avg_order_value = total_sales / total_orders if total_orders > 0 else 0
+        yesterday = dashboard.yesterday()
+        snapshot = columnar.get_snapshot()
+        if snapshot is not None:
+            totals = dashboard.snapshot_day_totals(snapshot, yesterday)
+        else:
+            totals = dashboard.day_orders(yesterday).aggregate(**dashboard.DAY_TOTALS)
 
         return Response({
             'status': 'success',
-            'data': {
-                'date': yesterday.strftime('%Y-%m-%d'),
-                'total_sales': float(total_sales),
-                'total_orders': total_orders,
-                'avg_order_value': float(avg_order_value),
-                'total_profit': float(total_profit)
-            }
+            'data': dashboard.insights(yesterday, totals)
         })
     except Exception as e:
         return Response({
@@ -233,19 +352,103 @@ def get_quick_insights(request):
         }, status=500)
     
 @api_view(['GET'])
+@cached_response
+def get_kpis(request):
+    """
+    Sales, profit, orders, quantity and average order value for each
+    requested period up to a day, against the same span of the period
+    before: ?periods=day,week,month,year (default all) &date=YYYY-MM-DD
+    (default today).
+    """
+    try:
+        periods = kpis.parse_periods(request.query_params.get('periods'))
+        value = request.query_params.get('date')
+        day = datetime.strptime(value, '%Y-%m-%d').date() if value else timezone.now().date()
+    except ValueError as e:
+        return Response({'status': 'error', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        return Response({
+            'status': 'success',
+            'date': day.isoformat(),
+            'kpis': kpis.compute(day, periods)
+        })
+    except Exception as e:
+        return Response({
+            'status': 'error',
+            'message': str(e)
+        }, status=500)
+
+def _choice(request, name, choices, default):
+    value = request.query_params.get(name) or default
+    if value not in choices:
+        raise ValueError(f"{name} must be one of: {', '.join(choices)}")
+    return value
+
+
+@api_view(['GET'])
+@cached_response
+def get_distinct_counts(request):
+    """
+    Unique customers or products per period and group over the last ?days=
+    (default 30) up to ?end=: ?count=customers|products
+    &by=region|state|category|segment (default overall)
+    &period=day|week|month|all (default month). Estimated from the
+    distinct-count sketches within about relative_error, or counted
+    exactly with ?exact=true.
+    """
+    window = get_window(request, default_days=30)
+    try:
+        target = _choice(request, 'count', ('customers', 'products'), 'customers')[:-1]
+        grouping = _choice(request, 'by', ('all', *distinct.GROUPINGS), 'all')
+        period = _choice(request, 'period', distinct.PERIODS, 'month')
+    except ValueError as e:
+        return Response({'status': 'error', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        start, end = window
+        exact = request.query_params.get('exact', '').lower() in ('1', 'true', 'yes')
+        rows = None if exact else distinct.counts(target, grouping, period, start, end)
+        if rows is not None:
+            mode, relative_error = 'sketch', round(distinct.relative_error(), 4)
+        else:
+            rows = distinct.exact_counts(target, grouping, period, start, end)
+            mode, relative_error = 'exact', 0
+        return Response({
+            'status': 'success',
+            'count': f'{target}s',
+            'by': grouping,
+            'period': period,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'mode': mode,
+            'relative_error': relative_error,
+            'results': [
+                {'period': label.isoformat(), 'group': group, 'distinct': count}
+                for label, group, count in rows
+            ],
+        })
+    except Exception as e:
+        return Response({
+            'status': 'error',
+            'message': str(e)
+        }, status=500)
+
+@api_view(['GET'])
+@cached_response
 def get_sales_data(request):
     """Fetch aggregated order_date and total sales for sales analysis."""
     try:
         thirty_days_ago = datetime.now() - timedelta(days=30)
         sales_data = (
-            NewSalesData.objects
-            .filter(order_date__gte=thirty_days_ago)
-            .values('order_date')
-            .annotate(total_sales=Sum('sales'))
-            .order_by('order_date')
+            DailySalesSummary.objects
+            .filter(date__gte=thirty_days_ago)
+            .values('date', 'total_sales')
+            .order_by('date')
         )
+        # Dates are formatted by the renderer
         sales_data_list = [
-            {'order_date': item['order_date'].strftime('%Y-%m-%d'), 'sales': item['total_sales']}
+            {'order_date': item['date'], 'sales': item['total_sales']}
             for item in sales_data
         ]
         
@@ -262,19 +465,19 @@ def get_sales_data(request):
 
 
 @api_view(['GET'])
+@cached_response
 def get_profit_data(request):
     """Fetch order_date and total profit for sales analysis"""
     try:
         thirty_days_ago = datetime.now() - timedelta(days=30)
         profit_data = (
-            NewSalesData.objects
-            .filter(order_date__gte=thirty_days_ago)
-            .values('order_date')
-            .annotate(total_profit=Sum('profit'))
-            .order_by('order_date')
+            DailySalesSummary.objects
+            .filter(date__gte=thirty_days_ago)
+            .values('date', 'total_profit')
+            .order_by('date')
         )
         profit_data_list = [
-            {'order_date': item['order_date'].strftime('%Y-%m-%d'), 'profit': item['total_profit']}
+            {'order_date': item['date'], 'profit': item['total_profit']}
             for item in profit_data
         ]
         
@@ -289,20 +492,30 @@ def get_profit_data(request):
             'message': str(e)
         }, status=500)
 
+def _named_totals(pairs, name_key, total_key, layout, convert=None):
+    """
+    ``[{name_key: name, total_key: total}, ...]`` from ``(name, total)``
+    pairs, or ``{name_key: [names], total_key: [totals]}`` for ``?layout=columns``.
+    """
+    if layout == 'columns':
+        names, totals = zip(*pairs) if pairs else ((), ())
+        return {name_key: list(names), total_key: list(totals if convert is None else map(convert, totals))}
+    if convert is None:
+        return [{name_key: name, total_key: total} for name, total in pairs]
+    return [{name_key: name, total_key: convert(total)} for name, total in pairs]
+
 @api_view(['GET'])
+@cached_response
 def get_sales_by_product(request):
     """Fetch product_name and total sales for sales by product analysis"""
+    layout = get_layout(request)
     try:
-        sales_by_product = (
-            NewSalesData.objects
-            .values('product_name')
-            .annotate(total_sales=Sum('sales'))
-            .order_by('product_name')
-        )
-        sales_by_product_list = [
-            {'product_name': item['product_name'], 'sales': item['total_sales']}
-            for item in sales_by_product
-        ]
+        snapshot = columnar.get_snapshot()
+        if snapshot is not None:
+            totals = snapshot.sum_by('product_name', order='name')
+        else:
+            totals = dimensions.ranked_by_name('product', order='name')
+        sales_by_product_list = _named_totals(totals, 'product_name', 'sales', layout)
         
         return Response({
             'status': 'success',
@@ -316,12 +529,19 @@ def get_sales_by_product(request):
         }, status=500)
 
 @api_view(['GET'])
+@cached_response
 def get_sales_by_customer(request):
-    """Fetch sales data aggregated by customer"""
+    """Fetch sales data aggregated by customer, optionally the first ?limit= by name"""
+    limit = get_limit(request)
+    layout = get_layout(request)
     try:
-        # Aggregate sales by customer using Django ORM's annotate and aggregation
-        sales_by_customer_data = NewSalesData.objects.values('customer_name').annotate(total_sales=Sum('sales'))
-        sales_by_customer_data_list = list(sales_by_customer_data)
+        snapshot = columnar.get_snapshot()
+        if snapshot is not None:
+            totals = snapshot.sum_by('customer_name', limit=limit, order='name')
+        else:
+            # Summed per customer key in SQL, named afterwards
+            totals = dimensions.ranked_by_name('customer', limit=limit, order='name')
+        sales_by_customer_data_list = _named_totals(totals, 'customer_name', 'total_sales', layout)
         
         return Response({
             'status': 'success',
@@ -334,21 +554,52 @@ def get_sales_by_customer(request):
             'message': str(e)
         }, status=500)
 
+def _top_in_window(request, dimension, name_key, limit, layout, window):
+    """
+    Top customers or products of a ``(start, end)`` window, from the sales
+    sketches when they can answer and from an exact group-by otherwise
+    (or with ?exact=true). Sketch totals are at most ``error_bound`` below
+    the exact ones.
+    """
+    start, end = window
+    exact = request.query_params.get('exact', '').lower() in ('1', 'true', 'yes')
+    answer = None if exact else sketches.top(dimension, limit, start, end)
+    if answer is not None:
+        (ranked, error_bound), mode = answer, 'sketch'
+    else:
+        ranked = dimensions.ranked_by_name(
+            dimension, limit=limit, queryset=NewSalesData.objects.filter(order_date__range=window),
+        )
+        error_bound, mode = 0, 'exact'
+    return {
+        'status': 'success',
+        'sales': _named_totals(ranked, name_key, 'total_sales', layout, convert=float),
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'mode': mode,
+        'error_bound': float(error_bound),
+    }
+
+
 @api_view(['GET'])
+@cached_response
 def get_top_customers(request):
-    """Fetch top customers sorted by total sales in descending order"""
+    """Fetch top customers sorted by total sales in descending order, up to ?limit=, optionally over the last ?days="""
+    window = get_window(request)
+    # A window is answered from the sketches, which need a limit
+    limit = get_limit(request, default=None if window is None else sketches.CONFIG['DEFAULT_LIMIT'])
+    layout = get_layout(request)
     try:
-        top_customers = (
-            NewSalesData.objects
-            .values('customer_name')
-            .annotate(total_sales=Sum('sales'))
-            .order_by('-total_sales')  # Descending order
-        )
+        if window is not None:
+            return Response(_top_in_window(request, 'customer', 'customer_name', limit, layout, window))
 
-        customer_data = [
-            {'customer_name': item['customer_name'], 'total_sales': float(item['total_sales'])}
-            for item in top_customers
-        ]
+        snapshot = columnar.get_snapshot()
+        if snapshot is not None:
+            top_customers = snapshot.sum_by('customer_name', limit=limit)
+        else:
+            top_customers = dimensions.ranked_by_name('customer', limit=limit)
+
+        customer_data = _named_totals(top_customers, 'customer_name', 'total_sales', layout, convert=float)
 
         return Response({
             'status': 'success',
@@ -361,20 +612,24 @@ def get_top_customers(request):
         }, status=500)
     
 @api_view(['GET'])
+@cached_response
 def get_top_products(request):
-    """Fetch top customers sorted by total sales in descending order"""
+    """Fetch top products sorted by total sales in descending order, up to ?limit=, optionally over the last ?days="""
+    window = get_window(request)
+    # A window is answered from the sketches, which need a limit
+    limit = get_limit(request, default=None if window is None else sketches.CONFIG['DEFAULT_LIMIT'])
+    layout = get_layout(request)
     try:
-        top_customers = (
-            NewSalesData.objects
-            .values('product_name')
-            .annotate(total_sales=Sum('sales'))
-            .order_by('-total_sales')  # Descending order
-        )
+        if window is not None:
+            return Response(_top_in_window(request, 'product', 'product_name', limit, layout, window))
 
-        product_data = [
-            {'product_name': item['product_name'], 'total_sales': float(item['total_sales'])}
-            for item in top_customers
-        ]
+        snapshot = columnar.get_snapshot()
+        if snapshot is not None:
+            top_products = snapshot.sum_by('product_name', limit=limit)
+        else:
+            top_products = dimensions.ranked_by_name('product', limit=limit)
+
+        product_data = _named_totals(top_products, 'product_name', 'total_sales', layout, convert=float)
 
         return Response({
             'status': 'success',
@@ -386,14 +641,37 @@ def get_top_products(request):
             'message': str(e)
         }, status=500)
     
-# Load the SARIMA model safely
-model_path = 'SalesApp/saved_models/sarima_monthly_sales_model.joblib'
-try:
-    sarima_model = joblib.load(model_path)  # Renamed from `model` to `sarima_model`
-    print("SARIMA Monthly Sales model loaded successfully")
-except Exception as e:
-    print(f"Error loading SARIMA Monthly Sales model: {e}")
-    sarima_model = None  # Prevent further errors
+# Forecasts run in the inference pool (SalesApp.inference), whose worker
+# processes load the models through SalesApp.model_registry and reload them
+# when an artifact changes, so importing this module costs nothing.
+
+@api_view(['GET'])
+def get_model_stats(request):
+    """Load time, resident size and version of each forecasting model, and their last refreshes"""
+    try:
+        models = inference.pool.run(forecast_tasks.model_stats)
+    except PredictionError as e:
+        return Response({'status': 'error', 'message': str(e)}, status=e.status_code)
+    return Response({
+        'status': 'success',
+        'models': models,
+        'retraining': retraining.status()
+    })
+
+@require_GET
+def get_metrics(request):
+    """Request, query, serialization and inference metrics in Prometheus text format"""
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@api_view(['GET'])
+def get_inference_stats(request):
+    """Queue depth, outcomes and execution times of the inference pool, and forecast table hits"""
+    return Response({
+        'status': 'success',
+        'inference': inference.pool.stats(),
+        'forecast_table': forecast_store.stats()
+    })
 
 @api_view(['POST'])
 def predict_monthly_sales(request):
@@ -405,49 +683,24 @@ def predict_monthly_sales(request):
         if not date:
             return Response({"status": "error", "message": "No date provided"}, status=status.HTTP_400_BAD_REQUEST)
 
-        if sarima_model is None:
-            return Response({"status": "error", "message": "SARIMA model not loaded"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-        # Convert input date
-        date = pd.to_datetime(date)
-
-        # Check if the model has a data attribute
-        if hasattr(sarima_model, "model") and hasattr(sarima_model.model, "data"):
-            last_train_date = sarima_model.model.data.dates[-1]
-        else:
-            return Response({"status": "error", "message": "SARIMA model missing training data"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-        # Ensure date is in the future
-        if date <= last_train_date:
-            return Response({"status": "error", "message": "Date must be in the future"}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Calculate forecast steps (months ahead)
-        forecast_steps = (date.year - last_train_date.year) * 12 + (date.month - last_train_date.month)
-        if forecast_steps <= 0:
-            return Response({"status": "error", "message": "Invalid forecast steps"}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Get forecast
-        forecast = sarima_model.get_forecast(steps=forecast_steps)
-        predicted_sales = forecast.predicted_mean.iloc[-1]
+        # Precomputed forecast if the date is in the table, else forecast in
+        # the inference pool (memoized per model and horizon)
+        forecast = forecast_store.forecast('monthly', date)
+        if forecast is None:
+            forecast = inference.pool.run(forecast_tasks.sarima_forecast, 'monthly_sarima', date)
+        date, predicted_sales = forecast
 
         return Response({
             "status": "success",
-            "date": date.strftime('%Y-%m-%d'),
-            "predicted_sales": round(predicted_sales, 2)
+            "date": date,
+            "predicted_sales": predicted_sales
         })
+    except PredictionError as e:
+        return Response({"status": "error", "message": str(e)}, status=e.status_code)
     except Exception as e:
-        print("Error in prediction:", traceback.format_exc())  # Print full error traceback
+        logger.exception("Error in prediction")
         return Response({"status": "error", "message": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    
-    
-# Load the SARIMA model safely
-w_model_path = 'SalesApp/saved_models/weekly_sales_model.joblib'
-try:
-    w_sarima_model = joblib.load(w_model_path)  # Renamed from `model` to `sarima_model`
-    print("SARIMA Weekly Sales model loaded successfully")
-except Exception as e:
-    print(f"Error loading SARIMA Weekly Sales model: {e}")
-    w_sarima_model = None  # Prevent further errors
+
 
 @api_view(['POST'])
 def predict_weekly_sales(request):
@@ -459,47 +712,24 @@ def predict_weekly_sales(request):
         if not date:
             return Response({"status": "error", "message": "No date provided"}, status=status.HTTP_400_BAD_REQUEST)
 
-        if w_sarima_model is None:
-            return Response({"status": "error", "message": "SARIMA model not loaded"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-        # Convert input date
-        date = pd.to_datetime(date)
-
-        # Check if the model has a data attribute
-        if hasattr(w_sarima_model, "model") and hasattr(w_sarima_model.model, "data"):
-            last_train_date = w_sarima_model.model.data.dates[-1]
-        else:
-            return Response({"status": "error", "message": "SARIMA model missing training data"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-        # Ensure date is in the future
-        if date <= last_train_date:
-            return Response({"status": "error", "message": "Date must be in the future"}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Calculate forecast steps (months ahead)
-        forecast_steps = (date.year - last_train_date.year) * 12 + (date.month - last_train_date.month)
-        if forecast_steps <= 0:
-            return Response({"status": "error", "message": "Invalid forecast steps"}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Get forecast
-        forecast = w_sarima_model.get_forecast(steps=forecast_steps)
-        predicted_sales = forecast.predicted_mean.iloc[-1]
+        # Precomputed forecast if the date is in the table, else forecast in
+        # the inference pool (memoized per model and horizon)
+        forecast = forecast_store.forecast('weekly', date)
+        if forecast is None:
+            forecast = inference.pool.run(forecast_tasks.sarima_forecast, 'weekly_sarima', date)
+        date, predicted_sales = forecast
 
         return Response({
             "status": "success",
-            "date": date.strftime('%Y-%m-%d'),
-            "predicted_sales": round(predicted_sales, 2)
+            "date": date,
+            "predicted_sales": predicted_sales
         })
+    except PredictionError as e:
+        return Response({"status": "error", "message": str(e)}, status=e.status_code)
     except Exception as e:
-        print("Error in prediction:", traceback.format_exc())  # Print full error traceback
+        logger.exception("Error in prediction")
         return Response({"status": "error", "message": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-       
-# Load the Prophet model
-d_model_path = 'SalesApp/saved_models/daily_sales_model.joblib'
-try:
-    d_model = joblib.load(d_model_path)
-    print("Prophet Daily Sales model loaded successfully")
-except Exception as e:
-    print(f"Error loading Prophet Daily Sales model: {e}")
+
 
 @api_view(['POST'])
 def predict_daily_sales(request):
@@ -511,36 +741,23 @@ def predict_daily_sales(request):
         if not date:
             return Response({"status": "error", "message": "No date provided"}, status=status.HTTP_400_BAD_REQUEST)
 
-        if d_model is None:
-            return Response({"status": "error", "message": "Prophet model not loaded"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-        # Convert input date
-        date = pd.to_datetime(date)
-
-        # Ensure date is in the future
-        last_train_date = d_model.history['ds'].max()
-        if date <= last_train_date:
-            return Response({"status": "error", "message": "Date must be in the future"}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Prepare future DataFrame
-        future = pd.DataFrame({"ds": [date]})
-
-        # Get forecast
-        forecast = d_model.predict(future)
-        predicted_sales = forecast['yhat'].iloc[0]
+        forecast = forecast_store.forecast('daily', date)
+        if forecast is None:
+            forecast = inference.pool.run(forecast_tasks.prophet_forecast, date)
+        date, predicted_sales = forecast
 
         return Response({
             "status": "success",
-            "date": date.strftime('%Y-%m-%d'),
-            "predicted_sales": round(predicted_sales, 2)
+            "date": date,
+            "predicted_sales": predicted_sales
         })
+    except PredictionError as e:
+        return Response({"status": "error", "message": str(e)}, status=e.status_code)
     except Exception as e:
-        print("Error in prediction:", traceback.format_exc())  # Print full error traceback
+        logger.exception("Error in prediction")
         return Response({"status": "error", "message": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-from datetime import timedelta
-
 @api_view(['POST'])
 def predict_sales_in_range(request):
     """Predict sales for each date in a specified range using the SARIMA model"""
@@ -550,66 +767,54 @@ def predict_sales_in_range(request):
         end_date = data.get("end_date")
 
         if not start_date or not end_date:
-            return Response({"status": "error", "message": "Both start_date and end_date are required"}, status=status.HTTP_400_BAD_REQUEST)
+            return Response(
+                {"status": "error", "message": "Both start_date and end_date are required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        if w_sarima_model is None:
-            return Response({"status": "error", "message": "SARIMA model not loaded"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-        # Convert the input dates to pandas datetime format
-        start_date = pd.to_datetime(start_date)
-        end_date = pd.to_datetime(end_date)
-
-        # Ensure the end date is after the start date
-        if end_date <= start_date:
-            return Response({"status": "error", "message": "End date must be after start date"}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Check if the model has training data
-        if hasattr(w_sarima_model, "model") and hasattr(w_sarima_model.model, "data"):
-            last_train_date = w_sarima_model.model.data.dates[-1]
-        else:
-            return Response({"status": "error", "message": "SARIMA model missing training data"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        # Weekly (Monday) predictions from one forecast out to the furthest date
+        predictions = inference.pool.run(forecast_tasks.sarima_range, 'weekly_sarima', start_date, end_date)
 
-        # Ensure the start date is after the last training date
-        if start_date <= last_train_date:
-            return Response({"status": "error", "message": "Start date must be after the last training date"}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Prepare to generate predictions for each week in the date range
-        date_range = pd.date_range(start=start_date, end=end_date, freq='W-MON')  # Weekly predictions (can adjust the frequency as needed)
-
-        predictions = []
-        for date in date_range:
-            # Calculate forecast steps (weeks/months ahead)
-            forecast_steps = (date.year - last_train_date.year) * 12 + (date.month - last_train_date.month)
-            if forecast_steps <= 0:
-                continue
+        return Response({
+            "status": "success",
+            "predictions": predictions
+        })
 
-            # Get forecast
-            forecast = w_sarima_model.get_forecast(steps=forecast_steps)
-            predicted_sales = forecast.predicted_mean.iloc[-1]
+    except PredictionError as e:
+        return Response({"status": "error", "message": str(e)}, status=e.status_code)
+    except Exception as e:
+        logger.exception("Error in prediction")
+        return Response({"status": "error", "message": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-            # Add the prediction to the list
-            predictions.append({
-                "date": date.strftime('%Y-%m-%d'),
-                "predicted_sales": round(predicted_sales, 2)
-            })
 
-        if not predictions:
-            return Response({"status": "error", "message": "No predictions could be generated."}, status=status.HTTP_400_BAD_REQUEST)
+@api_view(['POST'])
+def predict_batch(request):
+    """Predict sales for a list or range of dates at one granularity, returned as columns"""
+    try:
+        granularity, dates, intervals = forecast_store.parse_batch(request.data)
+
+        # From the forecast table when it covers every date, else one
+        # vectorized forecast in the inference pool
+        columns = forecast_store.batch(granularity, dates, intervals)
+        if columns is None:
+            if granularity == 'daily':
+                columns = inference.pool.run(forecast_tasks.prophet_batch, dates, intervals)
+            else:
+                model = forecast_store.GRANULARITIES[granularity]
+                columns = inference.pool.run(forecast_tasks.sarima_batch, model, dates, intervals)
 
         return Response({
             "status": "success",
-            "predictions": predictions
+            "granularity": granularity,
+            **columns
         })
-
+    except PredictionError as e:
+        return Response({"status": "error", "message": str(e)}, status=e.status_code)
     except Exception as e:
-        print("Error in prediction:", traceback.format_exc())  # Log error
+        logger.exception("Error in prediction")
         return Response({"status": "error", "message": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-# Load the saved model
-MODEL_PATH = os.path.join("SalesApp", "saved_models", "daily_sales_model.joblib")
-model = joblib.load(MODEL_PATH)
-
 @api_view(["GET"])
 def daily_sales_prediction(request):
     selected_date = request.GET.get("date")
@@ -618,27 +823,14 @@ def daily_sales_prediction(request):
         return JsonResponse({"error": "No date provided"}, status=400)
 
     try:
-        # Convert selected date to datetime object
-        end_date = datetime.strptime(selected_date, "%Y-%m-%d")
-        start_date = end_date - timedelta(days=30)  # One month before
-
-        # Generate date range
-        date_range = pd.date_range(start=start_date, end=end_date)
-
-        # Prepare dataframe for prediction
-        df = pd.DataFrame({"ds": date_range})  # Prophet uses 'ds' column for dates
-
-        # Make predictions
-        forecast = model.predict(df)
-
-        # Extract relevant predictions
-        sales_data = [
-            {"date": str(row["ds"].date()), "predicted_sales": round(row["yhat"], 2)}
-            for _, row in forecast.iterrows()
-        ]
+        # Predictions for the selected date and the month before it
+        sales_data = forecast_store.daily_window(selected_date)
+        if sales_data is None:
+            sales_data = inference.pool.run(forecast_tasks.prophet_window, selected_date)
 
         return JsonResponse({"sales_data": sales_data}, safe=False)
 
+    except PredictionError as e:
+        return JsonResponse({"error": str(e)}, status=e.status_code)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
-    
\ No newline at end of file
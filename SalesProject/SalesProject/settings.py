@@ -43,6 +43,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so the latency it records covers the whole middleware stack
+    'SalesApp.metrics.MetricsMiddleware',
+    # Before anything reads the database (sessions, authentication)
+    'SalesApp.routers.ReplicaMiddleware',
     # Add corsheaders middleware at the top
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -68,6 +72,11 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
+    # Same output as JSONRenderer, encoded with orjson when it is installed
+    'DEFAULT_RENDERER_CLASSES': [
+        'SalesApp.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 ROOT_URLCONF = 'SalesProject.urls'
@@ -91,15 +100,159 @@ TEMPLATES = [
 WSGI_APPLICATION = 'SalesProject.wsgi.application'
 
 # Your existing database configuration
-DATABASES = {
-    'default': {
+def _database(host, port, pool_size=None, **extra):
+    """
+    Connection settings of one alias. Connections are kept open for
+    CONN_MAX_AGE seconds and checked before they are reused. With
+    ``pool_size`` (psycopg 3 with psycopg[pool] installed), each process
+    keeps a pool of up to that many connections instead, which is also the
+    way to reuse connections under ASGI.
+    """
+    database = {
         'ENGINE': 'django.db.backends.postgresql',
         'NAME': 'salesdb',
         'USER': 'postgres',
         'PASSWORD': '!@#Post123',
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'HOST': host,
+        'PORT': port,
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        **extra,
     }
+    if pool_size:
+        # A pool replaces persistent connections
+        database['CONN_MAX_AGE'] = 0
+        database['OPTIONS'] = {'pool': {'min_size': 1, 'max_size': int(pool_size), 'timeout': 10}}
+    return database
+
+
+DATABASES = {
+    'default': _database('localhost', '5432', pool_size=os.environ.get('SALESAPP_DB_POOL_SIZE')),
+}
+
+# Optional streaming-replication replica of 'default'. The analytics GET
+# endpoints and the forecasting data pulls read from it (see
+# SalesApp/routers.py and SALESAPP_ROUTING below); tests run it as a mirror
+# of the test database.
+if os.environ.get('SALESAPP_REPLICA_HOST'):
+    DATABASES['replica'] = _database(
+        os.environ['SALESAPP_REPLICA_HOST'],
+        os.environ.get('SALESAPP_REPLICA_PORT', '5432'),
+        pool_size=os.environ.get('SALESAPP_REPLICA_POOL_SIZE', os.environ.get('SALESAPP_DB_POOL_SIZE')),
+        TEST={'MIRROR': 'default'},
+    )
+
+DATABASE_ROUTERS = ['SalesApp.routers.ReplicaRouter']
+
+# Reads stay on the primary for STICKY_SECONDS after a client's POST (or
+# any write), longer than the replica is expected to lag; only GET and
+# HEAD requests under PATHS read from the replica. Stickiness is a cookie,
+# so cross-origin clients must send credentials for it to work.
+SALESAPP_ROUTING = {
+    'REPLICA': 'replica',
+    'STICKY_SECONDS': 10,
+    'PATHS': ('/api/',),
+}
+
+# Response cache for the analytics endpoints (see SalesApp/cache.py). The
+# data version in its keys is a database row, so writes from any worker or
+# management command invalidate every process's entries. Local memory is
+# per process; point this at Redis or Memcached, e.g.
+# 'django.core.cache.backends.redis.RedisCache', to share the entries too.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'salesapp',
+    }
+}
+SALESAPP_CACHE_TIMEOUT = 60 * 60
+
+# Optional in-memory columnar copy of new_sales_data that the analytics views
+# aggregate over with NumPy instead of SQL (see SalesApp/columnar.py). It is
+# per process, like the local-memory cache; PRELOAD builds it at start-up.
+# RECHECK_IDS covers rows whose transaction commits after a later id's.
+SALESAPP_COLUMNAR = {
+    'ENABLED': False,
+    'PRELOAD': False,
+    'RECHECK_IDS': 10000,
+}
+
+# Forecasting runs in a process pool with the models preloaded (see
+# SalesApp/inference.py). Each server process gets its own pool; requests
+# beyond WORKERS + MAX_QUEUE get 503, results later than TIMEOUT seconds 504.
+SALESAPP_INFERENCE = {
+    'ENABLED': True,
+    'WORKERS': 2,
+    'MAX_QUEUE': 8,
+    'TIMEOUT': 30,
+}
+
+# `manage.py refresh_forecast_models` (run it hourly) appends new months to
+# the SARIMA models and refits them from scratch at most every
+# FULL_REFIT_DAYS; see SalesApp/retraining.py.
+SALESAPP_RETRAINING = {
+    'FULL_REFIT_DAYS': 7,
+    'KEEP_VERSIONS': 24,
+}
+
+# The prediction endpoints answer from the forecast_points table, filled by
+# `manage.py materialize_forecasts` (run it after refresh_forecast_models),
+# and only run a model for dates beyond HORIZON steps or when the model
+# changed since; see SalesApp/forecast_store.py.
+SALESAPP_FORECASTS = {
+    'ENABLED': True,
+    'HORIZON': {'daily': 365, 'weekly': 104, 'monthly': 36},
+}
+
+# Per-route latency, SQL, serialization and inference metrics at /api/metrics/
+# (Prometheus text format, per server process; see SalesApp/metrics.py).
+# Every request is counted and timed; SAMPLE_RATE of them also get the
+# query/serialization/inference breakdown. Lower it (e.g. 0.1) under load.
+SALESAPP_METRICS = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 1.0,
+}
+
+# Top-K sketches per day and month behind ?days= on get-top-customers and
+# get-top-products (see SalesApp/sketches.py) and the dashboard's top five.
+# Each holds at most CAPACITY counters; a reported total is at most total
+# sales / (CAPACITY + 1) below the true one. DEFAULT_LIMIT (at most
+# CAPACITY) applies to ?days= requests without ?limit=. Run
+# `manage.py rebuild_sketches` after changing CAPACITY.
+SALESAPP_SKETCHES = {
+    'ENABLED': True,
+    'CAPACITY': 256,
+    'DEFAULT_LIMIT': 10,
+}
+
+# HyperLogLog sketches per day and month behind /api/distinct-counts/ (see
+# SalesApp/distinct.py): 2 ** PRECISION registers each, estimates within
+# about 1.04 / sqrt(2 ** PRECISION) (1.6% at 12). Run
+# `manage.py rebuild_sketches` after changing PRECISION.
+SALESAPP_DISTINCT = {
+    'ENABLED': True,
+    'PRECISION': 12,
+}
+
+# Monthly partitions of new_sales_data on PostgreSQL (migration 0014, see
+# SalesApp/partitions.py), kept up by `manage.py manage_partitions`:
+# MONTHS_AHEAD months are created past the current one, and months more
+# than RETAIN_MONTHS before it are detached (None keeps every month). Each
+# partition adds to the planning time of queries not bounded by date.
+SALESAPP_PARTITIONS = {
+    'MONTHS_AHEAD': 3,
+    'RETAIN_MONTHS': None,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'SalesApp': {'handlers': ['console'], 'level': 'INFO'},
+    },
 }
 
 # Your existing password validators